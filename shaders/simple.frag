@@ -1,6 +1,6 @@
 #version 330 core
 
-#define NUM_LIGHTS 2
+// Shader variants, see simple.vert
 
 // Input variables
 in vec2 DiffuseTexCoord;
@@ -9,7 +9,12 @@ in vec2 CloudTexCoord;
 in vec3 Normal;
 in vec3 FragPos;
 in vec3 VertexPos;
-in vec3 LightPositions[NUM_LIGHTS];
+flat in vec3 Ka;
+flat in vec3 Kd;
+flat in vec3 Ks;
+flat in float Shininess;
+flat in float DiffuseLayer;
+flat in float NormalLayer;
 
 // Output variable
 out vec4 FragColor;
@@ -18,102 +23,114 @@ out vec4 FragColor;
 uniform sampler2D diffuseTexture;
 uniform sampler2D normalTexture;
 uniform sampler2D cloudTexture;
+uniform sampler2DArray diffuseTextures;
+uniform sampler2DArray normalTextures;
+uniform bool useTextureArrays;
 uniform float cloudAnimationTime;
-uniform bool isEarth;
 uniform vec3 sunPosition;
 uniform float sunRadius;
 uniform vec3 sunColor;
 uniform vec3 viewPos;
-uniform vec3 ka;
-uniform vec3 kd;
-uniform vec3 ks;
-uniform float shininess;
-uniform bool isSun;
 uniform float atmosphereThickness;
 uniform vec3 atmosphereColor;
-uniform bool isStarryBackground;
-uniform vec3 lightColors[NUM_LIGHTS];
-uniform vec3 lightPositions[NUM_LIGHTS];
-uniform float lightRadii[NUM_LIGHTS];
+uniform samplerBuffer lights; // per light: position and range, color
+uniform isamplerBuffer tileLights; // per tile: offset and count of its entries, then the entries, see TiledLights.py
+uniform int tileSize;
+uniform int tileCountX;
 
 void main() {
     // Sample the diffuse and normal textures
-    vec4 diffuseColor = texture(diffuseTexture, DiffuseTexCoord);
-    vec3 normal = texture(normalTexture, NormalTexCoord).rgb;
-    normal = normalize(normal);
-
-    if (isSun) {
-        // Sun: Always fully illuminated
-        FragColor = diffuseColor;
-    } else if (isStarryBackground) {
-        // Starry background: Always fully illuminated
-        FragColor = diffuseColor;
+    vec4 diffuseColor;
+    vec3 normal;
+    if (useTextureArrays) {
+        diffuseColor = texture(diffuseTextures, vec3(DiffuseTexCoord, DiffuseLayer));
+        normal = texture(normalTextures, vec3(NormalTexCoord, NormalLayer)).rgb;
     } else {
-        // Planets: Apply lighting calculations
-        vec3 norm = normalize(Normal);
-        norm = normalize(norm + normal);
+        diffuseColor = texture(diffuseTexture, DiffuseTexCoord);
+        normal = texture(normalTexture, NormalTexCoord).rgb;
+    }
+    normal = normalize(normal);
 
-        vec3 viewDir = normalize(viewPos - FragPos);
+#ifdef SHADE_UNLIT
+    // Sun and starry background: Always fully illuminated
+    FragColor = diffuseColor;
+#else
+    // Planets: Apply lighting calculations
+    vec3 norm = normalize(Normal);
+    norm = normalize(norm + normal);
+
+    vec3 viewDir = normalize(viewPos - FragPos);
+
+    vec3 result = vec3(0.0);
+
+    // Sun lighting with attenuation
+    float sunDistance = length(sunPosition - FragPos);
+    vec3 lightDir = normalize(sunPosition - FragPos);
+    float NdotL = max(dot(norm, lightDir), 0.0);
+    vec3 diffuse = Kd * NdotL * sunColor;
+    vec3 halfDir = normalize(lightDir + viewDir);
+    float NdotH = max(dot(norm, halfDir), 0.0);
+    vec3 specular = Ks * pow(NdotH, Shininess) * sunColor;
+    float sunAttenuation = 1.0 / (1.0 + 0.01 * sunDistance + 0.001 * sunDistance * sunDistance);
+    result += (diffuse + specular) * sunAttenuation;
+
+    // Emissive planets lighting, from the lights listed for the tile of the fragment
+    ivec2 tile = ivec2(gl_FragCoord.xy) / tileSize;
+    int tileIndex = tile.y * tileCountX + tile.x;
+    int firstEntry = texelFetch(tileLights, 2 * tileIndex).r;
+    int entryCount = texelFetch(tileLights, 2 * tileIndex + 1).r;
+    for (int entry = firstEntry; entry < firstEntry + entryCount; entry++) {
+        int light = texelFetch(tileLights, entry).r;
+        vec4 lightPositionRange = texelFetch(lights, 2 * light);
+        vec3 lightColor = texelFetch(lights, 2 * light + 1).rgb;
+
+        // Calculate the distance from the fragment to the light source, beyond its range it is left out
+        float distance = length(lightPositionRange.xyz - FragPos);
+        if (distance > lightPositionRange.w) {
+            continue;
+        }
 
-        vec3 result = vec3(0.0);
+        // Ambient lighting
+        vec3 ambient = Ka;
 
-        // Sun lighting with attenuation
-        float sunDistance = length(sunPosition - FragPos);
-        vec3 lightDir = normalize(sunPosition - FragPos);
+        // Diffuse lighting
+        vec3 lightDir = normalize(lightPositionRange.xyz - FragPos);
         float NdotL = max(dot(norm, lightDir), 0.0);
-        vec3 diffuse = kd * NdotL * sunColor;
+        vec3 diffuse = Kd * NdotL;
+
+        // Specular lighting
         vec3 halfDir = normalize(lightDir + viewDir);
         float NdotH = max(dot(norm, halfDir), 0.0);
-        vec3 specular = ks * pow(NdotH, shininess) * sunColor;
-        float sunAttenuation = 1.0 / (1.0 + 0.01 * sunDistance + 0.001 * sunDistance * sunDistance);
-        result += (diffuse + specular) * sunAttenuation;
-
-        // Emissive planets lighting
-        for (int i = 0; i < NUM_LIGHTS; i++) {
-            // Calculate the distance from the fragment to the light source
-            float distance = length(lightPositions[i] - FragPos);
-
-            // Ambient lighting
-            vec3 ambient = ka;
-
-            // Diffuse lighting
-            vec3 lightDir = normalize(lightPositions[i] - FragPos);
-            float NdotL = max(dot(norm, lightDir), 0.0);
-            vec3 diffuse = kd * NdotL;
+        vec3 specular = Ks * pow(NdotH, Shininess);
 
-            // Specular lighting
-            vec3 halfDir = normalize(lightDir + viewDir);
-            float NdotH = max(dot(norm, halfDir), 0.0);
-            vec3 specular = ks * pow(NdotH, shininess);
+        // Attenuation based on distance
+        float attenuation = 1.0 / (1.0 + 0.1 * distance + 0.01 * distance * distance);
 
-            // Attenuation based on distance
-            float attenuation = 1.0 / (1.0 + 0.1 * distance + 0.01 * distance * distance);
+        // Increase the intensity of the emissive planets
+        float emissiveIntensity = 0.5;
 
-            // Increase the intensity of the emissive planets
-            float emissiveIntensity = 0.5;
-
-            // Combine the lighting components
-            result += (ambient + diffuse + specular) * lightColors[i] * attenuation * emissiveIntensity;
-        }
-
-        if (isEarth) {
-            // Apply cloud texture for Earth
-            vec2 animatedCloudTexCoord = CloudTexCoord + vec2(cloudAnimationTime, 0.0);
-            vec4 cloudColor = texture(cloudTexture, animatedCloudTexCoord);
-            
-            // Blend the cloud color with the diffuse color based on the cloud alpha
-            float cloudAlpha = 0.5; // Adjust this value to control the transparency of the clouds
-            diffuseColor.rgb = mix(diffuseColor.rgb, cloudColor.rgb, cloudColor.a * cloudAlpha);
-        }
-
-        // Apply the lighting to the diffuse color
-        vec3 finalColor = result * diffuseColor.rgb;
-
-        // Gamma correction
-        const float gamma = 2.2;
-        vec3 gammaCorrectedColor = pow(finalColor, vec3(1.0 / gamma));
-
-        // Output the final color
-        FragColor = vec4(gammaCorrectedColor, diffuseColor.a);
+        // Combine the lighting components
+        result += (ambient + diffuse + specular) * lightColor * attenuation * emissiveIntensity;
     }
+
+#ifdef SHADE_EARTH
+    // Apply cloud texture for Earth
+    vec2 animatedCloudTexCoord = CloudTexCoord + vec2(cloudAnimationTime, 0.0);
+    vec4 cloudColor = texture(cloudTexture, animatedCloudTexCoord);
+    
+    // Blend the cloud color with the diffuse color based on the cloud alpha
+    float cloudAlpha = 0.5; // Adjust this value to control the transparency of the clouds
+    diffuseColor.rgb = mix(diffuseColor.rgb, cloudColor.rgb, cloudColor.a * cloudAlpha);
+#endif
+
+    // Apply the lighting to the diffuse color
+    vec3 finalColor = result * diffuseColor.rgb;
+
+    // Gamma correction
+    const float gamma = 2.2;
+    vec3 gammaCorrectedColor = pow(finalColor, vec3(1.0 / gamma));
+
+    // Output the final color
+    FragColor = vec4(gammaCorrectedColor, diffuseColor.a);
+#endif
 }
\ No newline at end of file
@@ -1,12 +1,27 @@
 #version 330 core
 
-#define NUM_LIGHTS 2
+// Shader variants, one of SHADE_EARTH, SHADE_SATURN_RING or SHADE_UNLIT may be defined when compiling, see GLWindow.py
+
+// Orbits in the buffer texture, see OrbitBuffer.py
+#define ORBIT_TEXELS 4
+#define MAX_ORBIT_DEPTH 4
+#define KEPLER_ITERATIONS 8
+#define PI 3.14159265359
 
 // Input variables
 layout (location = 0) in vec3 position;
 layout (location = 1) in vec2 texCoord;
 layout (location = 2) in vec3 normal;
 
+// Per-instance input variables, used when useInstancing is set
+layout (location = 3) in mat4 instanceModel;
+layout (location = 7) in mat3 instanceNormalMatrix;
+layout (location = 10) in vec3 instanceKa;
+layout (location = 11) in vec3 instanceKd;
+layout (location = 12) in vec3 instanceKs;
+layout (location = 13) in vec4 instanceParams; // shininess, diffuse layer, normal layer, flags
+layout (location = 14) in float instanceRow;
+
 // Output variables
 out vec2 DiffuseTexCoord;
 out vec2 NormalTexCoord;
@@ -15,51 +30,136 @@ out vec3 FragPos;
 out vec2 RingTexCoord;
 out vec3 VertexPos;
 out vec2 CloudTexCoord;
-out vec3 LightPositions[NUM_LIGHTS];
+flat out vec3 Ka;
+flat out vec3 Kd;
+flat out vec3 Ks;
+flat out float Shininess;
+flat out float DiffuseLayer;
+flat out float NormalLayer;
 
 // Uniform variables
 uniform mat4 model;
 uniform mat4 view;
 uniform mat4 projection;
 uniform mat3 normalMatrix;
-uniform bool isSaturnRing;
-uniform bool isStarryBackground;
-uniform bool isEarth;
 uniform bool invertNormals;
-uniform vec3 lightPositions[NUM_LIGHTS];
+uniform vec3 ka;
+uniform vec3 kd;
+uniform vec3 ks;
+uniform float shininess;
+uniform bool useInstancing;
+uniform int diffuseLayer;
+uniform int normalLayer;
+uniform bool useGpuOrbits;
+uniform float orbitTime; // since the epoch of the orbits
+uniform samplerBuffer orbitElements;
+
+// The position of a body relative to its parent at the orbit time, see KeplerOrbits.py
+vec3 orbitPosition(int row) {
+    vec4 p = texelFetch(orbitElements, row * ORBIT_TEXELS);
+    vec4 q = texelFetch(orbitElements, row * ORBIT_TEXELS + 1);
+    float meanAnomaly = mod(orbitTime * q.w + texelFetch(orbitElements, row * ORBIT_TEXELS + 2).x, 2.0 * PI);
+
+    // Newton's method on Kepler's equation, M = E - e * sin(E)
+    float eccentricity = p.w;
+    float eccentricAnomaly = eccentricity > 0.8 ? PI : meanAnomaly + eccentricity * sin(meanAnomaly);
+    for (int i = 0; i < KEPLER_ITERATIONS; i++) {
+        eccentricAnomaly -= (eccentricAnomaly - eccentricity * sin(eccentricAnomaly) - meanAnomaly) / (1.0 - eccentricity * cos(eccentricAnomaly));
+    }
+
+    return (cos(eccentricAnomaly) - eccentricity) * p.xyz + sin(eccentricAnomaly) * q.xyz;
+}
+
+// The model and normal matrices of a body from its orbit and the orbits of its parents, like SceneGraph.py
+void orbitTransforms(int row, out mat4 modelMatrix, out mat3 normalMat) {
+    float rotationSpeed = texelFetch(orbitElements, row * ORBIT_TEXELS + 2).y;
+    vec4 scale = texelFetch(orbitElements, row * ORBIT_TEXELS + 3); // scale, rotation angle at the epoch
+
+    // The body turns with the first orbit up the hierarchy, which is its own unless it is attached to its parent
+    vec3 position = vec3(0.0);
+    float angle = 0.0;
+    bool hasAngle = false;
+    int body = row;
+    for (int depth = 0; depth < MAX_ORBIT_DEPTH && body >= 0; depth++) {
+        vec4 elements = texelFetch(orbitElements, body * ORBIT_TEXELS + 2);
+        if (elements.w > 0.5) {
+            vec3 local = orbitPosition(body);
+            position += local;
+            if (!hasAngle) {
+                angle = atan(local.z, local.x);
+                hasAngle = true;
+            }
+        }
+        body = int(elements.z);
+    }
+    angle += scale.w + rotationSpeed * orbitTime;
+
+    // Ry(angle) * S(scale) * T(position), the columns are the rows of the matrices of Transforms.py
+    float c = cos(angle);
+    float s = sin(angle);
+    modelMatrix = mat4(vec4(c * scale.x, 0.0, s * scale.z, 0.0),
+                       vec4(0.0, scale.y, 0.0, 0.0),
+                       vec4(-s * scale.x, 0.0, c * scale.z, 0.0),
+                       vec4(position, 1.0));
+    normalMat = mat3(vec3(c / scale.x, 0.0, s / scale.z),
+                     vec3(0.0, 1.0 / scale.y, 0.0),
+                     vec3(-s / scale.x, 0.0, c / scale.z));
+}
 
 void main() {
+    // Select the per-instance or the per-draw transforms and material
+    mat4 modelMatrix;
+    mat3 normalMat;
+    if (useInstancing) {
+        if (useGpuOrbits) {
+            orbitTransforms(int(instanceRow + 0.5), modelMatrix, normalMat);
+        } else {
+            modelMatrix = instanceModel;
+            normalMat = instanceNormalMatrix;
+        }
+        Ka = instanceKa;
+        Kd = instanceKd;
+        Ks = instanceKs;
+        Shininess = instanceParams.x;
+        DiffuseLayer = instanceParams.y;
+        NormalLayer = instanceParams.z;
+    } else {
+        modelMatrix = model;
+        normalMat = normalMatrix;
+        Ka = ka;
+        Kd = kd;
+        Ks = ks;
+        Shininess = shininess;
+        DiffuseLayer = float(diffuseLayer);
+        NormalLayer = float(normalLayer);
+    }
+
     // Calculate the fragment position in world space
-    FragPos = vec3(model * vec4(position, 1.0));
+    FragPos = vec3(modelMatrix * vec4(position, 1.0));
     VertexPos = position;
 
-    if (isSaturnRing) {
-        // Calculate texture coordinates for Saturn's ring based on the angle around the ring
-        float angle = atan(position.z, position.x);
-        float radius = length(position.xz);
-        DiffuseTexCoord = vec2(radius / 2.0, angle / (2.0 * 3.14159265359));
-    } else {
-        // Use the UV coordinates from the model
-        DiffuseTexCoord = texCoord;
-        NormalTexCoord = texCoord;
+#ifdef SHADE_SATURN_RING
+    // Calculate texture coordinates for Saturn's ring based on the angle around the ring
+    float angle = atan(position.z, position.x);
+    float radius = length(position.xz);
+    DiffuseTexCoord = vec2(radius / 2.0, angle / (2.0 * 3.14159265359));
+#else
+    // Use the UV coordinates from the model
+    DiffuseTexCoord = texCoord;
+    NormalTexCoord = texCoord;
 
-        if (isEarth) {
-            CloudTexCoord = texCoord;
-        }
-    }
+#ifdef SHADE_EARTH
+    CloudTexCoord = texCoord;
+#endif
+#endif
 
     // Calculate the normal vector in world space
     if (invertNormals) {
-        Normal = -normalMatrix * normal;
+        Normal = -normalMat * normal;
     } else {
-        Normal = normalMatrix * normal;
-    }
-    
-    // Pass the light positions to the fragment shader
-    for (int i = 0; i < NUM_LIGHTS; i++) {
-        LightPositions[i] = vec3(view * vec4(lightPositions[i], 1.0));
+        Normal = normalMat * normal;
     }
 
     // Calculate the vertex position in clip space
-    gl_Position = projection * view * model * vec4(position, 1.0);
+    gl_Position = projection * view * modelMatrix * vec4(position, 1.0);
 }
\ No newline at end of file
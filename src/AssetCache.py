@@ -0,0 +1,128 @@
+import hashlib
+import os
+import struct
+
+class AssetCache:
+    # Every cache file starts with the same key (little endian):
+    #   magic (8 bytes), source size (uint64), source mtime in ns (int64), sha256 of the source (32 bytes)
+    # followed by the FIELDS of the subclass and zero padding up to DATA_OFFSET, where the payload starts.
+    KEY = struct.Struct("<8sQq32s")
+    DATA_OFFSET = 128
+
+    # Overridden by subclasses
+    MAGIC = b"SSASSET0"
+    FIELDS = struct.Struct("<")
+    EXTENSION = ".bin"
+
+    def __init__(self, cache_dir, rebuild=False):
+        """
+        Initialize a new AssetCache object.
+
+        Args:
+            cache_dir (str): The directory the cache files are stored in.
+            rebuild (bool, optional): Whether to ignore existing cache files and rebuild every entry. Defaults to False.
+        """
+        self.cache_dir = cache_dir
+        self.rebuild = rebuild
+
+    def cache_path(self, filename, variant=None):
+        """
+        Get the cache file used for a source file. Cache files are keyed by the absolute source path.
+
+        Args:
+            filename (str): The path to the source file.
+            variant (str, optional): The name of an asset derived from the source, cached in a file of its own.
+                Defaults to None.
+
+        Returns:
+            str: The path to the cache file.
+        """
+        source = os.path.abspath(filename)
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(source))[0]
+        if variant is not None:
+            name = f"{name}-{variant}"
+        return os.path.join(self.cache_dir, f"{name}-{digest}{self.EXTENSION}")
+
+    def read_fields(self, path, filename, stat):
+        """
+        Read the header of a cache file if the entry is still valid for its source.
+
+        An entry is valid when its source size and mtime match the file on disk. If only the mtime
+        differs, the source is hashed and the entry is kept (and its mtime refreshed) when the content
+        hash still matches. A different magic, ie. another format version, is never valid.
+
+        Args:
+            path (str): The path to the cache file.
+            filename (str): The path to the source file.
+            stat (os.stat_result): The current stat of the source file.
+
+        Returns:
+            tuple: The unpacked FIELDS, or None if the entry is missing or stale.
+        """
+        if self.rebuild:
+            return None
+
+        header_size = self.KEY.size + self.FIELDS.size
+        try:
+            with open(path, "rb") as f:
+                header = f.read(header_size)
+        except OSError:
+            return None
+
+        if len(header) != header_size:
+            return None
+
+        magic, size, mtime_ns, digest = self.KEY.unpack_from(header)
+        if magic != self.MAGIC or size != stat.st_size:
+            return None
+
+        if mtime_ns != stat.st_mtime_ns:
+            if digest != self.content_hash(filename):
+                return None
+            # Same content under a new mtime (eg. a fresh checkout), refresh the key
+            try:
+                with open(path, "r+b") as f:
+                    f.write(self.KEY.pack(magic, size, stat.st_mtime_ns, digest))
+            except OSError:
+                pass
+
+        return self.FIELDS.unpack_from(header, self.KEY.size)
+
+    def write_entry(self, path, filename, stat, fields, chunks):
+        """
+        Write a cache file. The file is written next to its final location and then renamed,
+        so a concurrent reader never sees a partial entry.
+
+        Args:
+            path (str): The path to the cache file.
+            filename (str): The path to the source file the payload was built from.
+            stat (os.stat_result): The stat of the source file when it was read.
+            fields (tuple): The values of FIELDS.
+            chunks (iterable): The payload, as bytes-like objects written one after another.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = self.KEY.pack(self.MAGIC, stat.st_size, stat.st_mtime_ns, self.content_hash(filename)) + self.FIELDS.pack(*fields)
+
+        temp_path = f"{path}.{os.getpid()}.{id(fields)}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header.ljust(self.DATA_OFFSET, b"\0"))
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, path)
+
+    def content_hash(self, filename):
+        """
+        Hash the contents of a source file.
+
+        Args:
+            filename (str): The path to the source file.
+
+        Returns:
+            bytes: The sha256 digest of the file.
+        """
+        digest = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.digest()
@@ -0,0 +1,241 @@
+import numpy as np
+
+class BarnesHut:
+    # Bits per axis of the Morton codes, which is also the deepest level of the tree
+    MAX_DEPTH = 21
+    # Number of bodies whose traversals are run together, which bounds the size of the frontier
+    CHUNK_BODIES = 2048
+
+    def __init__(self, theta=0.5, leaf_size=8):
+        """
+        Initialize a new BarnesHut object, an octree gravity solver.
+
+        The tree is stored as flat arrays with one entry per node instead of node objects. Bodies are
+        sorted along a Morton (Z-order) curve, so every node covers a contiguous range of the sorted bodies
+        and the children of a node are contiguous as well. The tree is rebuilt for every force evaluation,
+        one level at a time with vectorized NumPy operations.
+
+        Args:
+            theta (float, optional): The opening angle. A node is approximated by its center of mass when its
+                size is less than theta times its distance. Lower is more accurate and slower. Defaults to 0.5.
+            leaf_size (int, optional): Nodes with at most this many bodies are not subdivided. Defaults to 8.
+        """
+        self.theta = theta
+        self.leaf_size = leaf_size
+
+    @staticmethod
+    def spread_bits(values):
+        """
+        Spread the low 21 bits of integers two bits apart, so three of them interleave into a Morton code.
+
+        Args:
+            values (numpy.ndarray): The integers, as uint64.
+
+        Returns:
+            numpy.ndarray: The spread integers.
+        """
+        values = values & np.uint64(0x1FFFFF)
+        values = (values | (values << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+        values = (values | (values << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+        values = (values | (values << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+        values = (values | (values << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+        values = (values | (values << np.uint64(2))) & np.uint64(0x1249249249249249)
+        return values
+
+    def build(self, positions, masses):
+        """
+        Build the tree of a set of bodies.
+
+        Args:
+            positions (numpy.ndarray): The positions, shape (3, N).
+            masses (numpy.ndarray): The masses, shape (N,).
+        """
+        count = positions.shape[1]
+        low = positions.min(axis=1)
+        size = max(float((positions.max(axis=1) - low).max()), 1e-12) * (1.0 + 1e-9)
+
+        # Quantize the positions into the root cube and sort the bodies by their Morton codes
+        cells = ((positions - low[:, None]) * ((1 << self.MAX_DEPTH) / size)).astype(np.uint64)
+        codes = (self.spread_bits(cells[0]) << np.uint64(2)) | (self.spread_bits(cells[1]) << np.uint64(1)) | self.spread_bits(cells[2])
+        self.order = np.argsort(codes, kind="stable")
+        codes = codes[self.order]
+
+        sorted_masses = masses[self.order]
+        sorted_positions = positions[:, self.order]
+        weighted_positions = sorted_positions * sorted_masses
+
+        # Nodes are found level by level: a node is a run of bodies that share a code prefix.
+        # Only runs whose parent holds more than leaf_size bodies are kept.
+        starts, ends, levels = [], [], []
+        parent_counts = None
+        for level in range(self.MAX_DEPTH + 1):
+            prefixes = codes >> np.uint64(3 * (self.MAX_DEPTH - level))
+            boundaries = np.flatnonzero(prefixes[1:] != prefixes[:-1]) + 1
+            run_starts = np.concatenate(([0], boundaries))
+            run_ends = np.concatenate((boundaries, [count]))
+
+            keep = parent_counts[run_starts] > self.leaf_size if level > 0 else np.ones(1, dtype=bool)
+            if not keep.any():
+                break
+            starts.append(run_starts[keep])
+            ends.append(run_ends[keep])
+            levels.append(np.full(keep.sum(), level))
+
+            run_counts = run_ends - run_starts
+            parent_counts = np.repeat(run_counts, run_counts)
+
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        level = np.concatenate(levels)
+        self.size = size / (2.0 ** level)
+
+        # Children of a node are the nodes one level down within its body range
+        self.first_child = np.zeros(len(self.start), dtype=np.int64)
+        self.child_count = np.zeros(len(self.start), dtype=np.int64)
+        offset = 0
+        for parent_starts, parent_ends, child_starts in zip(starts, ends, starts[1:] + [None]):
+            parents = slice(offset, offset + len(parent_starts))
+            offset += len(parent_starts)
+            if child_starts is None:
+                break
+            first = np.searchsorted(child_starts, parent_starts)
+            last = np.searchsorted(child_starts, parent_ends)
+            self.first_child[parents] = offset + first
+            self.child_count[parents] = last - first
+
+        # Mass and center of mass of every node, massless nodes use their mean position
+        node_counts = self.end - self.start
+        self.mass = np.concatenate([self.range_sums(sorted_masses, *ranges) for ranges in zip(starts, ends)])
+        mean = np.concatenate([self.range_sums(sorted_positions, *ranges) for ranges in zip(starts, ends)], axis=1) / node_counts
+        with np.errstate(invalid="ignore", divide="ignore"):
+            center = np.concatenate([self.range_sums(weighted_positions, *ranges) for ranges in zip(starts, ends)], axis=1) / self.mass
+        self.center = np.where(self.mass > 0.0, center, mean)
+
+        self.sorted_positions = sorted_positions
+        self.sorted_masses = sorted_masses
+
+    @staticmethod
+    def range_sums(values, starts, ends):
+        """
+        Sum the values over ranges of their last axis.
+
+        Args:
+            values (numpy.ndarray): The values, shape (..., N).
+            starts (numpy.ndarray): The first index of each range, increasing.
+            ends (numpy.ndarray): The index after the last one of each range, at most the start of the next range.
+
+        Returns:
+            numpy.ndarray: The sums, shape (..., len(starts)).
+        """
+        # reduceat sums between consecutive indices, so the gaps between the ranges are summed too and dropped
+        padded = np.concatenate((values, np.zeros(values.shape[:-1] + (1,))), axis=-1)
+        indices = np.empty(2 * len(starts), dtype=np.int64)
+        indices[0::2] = starts
+        indices[1::2] = ends
+        return np.add.reduceat(padded, indices, axis=-1)[..., 0::2]
+
+    @staticmethod
+    def expand(counts):
+        """
+        Get the offsets that enumerate 0..count-1 for every entry of counts, for expanding pairs with np.repeat.
+
+        Args:
+            counts (numpy.ndarray): The number of items of each entry.
+
+        Returns:
+            numpy.ndarray: The offset of every item within its entry.
+        """
+        total = counts.sum()
+        return np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    def accelerations(self, positions, masses, G=1.0, softening=0.0, out=None):
+        """
+        Compute the gravitational acceleration of every body, approximating distant groups of bodies
+        by their centers of mass.
+
+        Every body walks the tree from the root. A (body, node) pair is approximated when the node does
+        not contain the body and is small enough for its distance, a leaf is summed body by body, and any
+        other node is replaced by its children. The walks of many bodies advance together as arrays of pairs.
+
+        Args:
+            positions (numpy.ndarray): The positions, shape (3, N).
+            masses (numpy.ndarray): The masses, shape (N,).
+            G (float, optional): The gravitational constant. Defaults to 1.0.
+            softening (float, optional): The softening length. Defaults to 0.0.
+            out (numpy.ndarray, optional): The array the accelerations are written to, shape (3, N).
+
+        Returns:
+            numpy.ndarray: The accelerations, shape (3, N).
+        """
+        self.build(positions, masses)
+
+        count = positions.shape[1]
+        out = np.empty_like(positions) if out is None else out
+        accelerations = np.zeros((3, count))
+        softening2 = softening * softening
+        theta2 = self.theta * self.theta
+        is_leaf = self.child_count == 0
+        node_counts = self.end - self.start
+        source_positions = self.sorted_positions
+
+        # Bodies are walked in Morton order, so the bodies of a chunk are close and open the same nodes
+        for chunk_start in range(0, count, self.CHUNK_BODIES):
+            chunk = slice(chunk_start, min(count, chunk_start + self.CHUNK_BODIES))
+            bodies = np.arange(chunk.start, chunk.stop)
+            nodes = np.zeros(len(bodies), dtype=np.int64)
+
+            while len(bodies):
+                dx = self.center[0, nodes] - source_positions[0, bodies]
+                dy = self.center[1, nodes] - source_positions[1, bodies]
+                dz = self.center[2, nodes] - source_positions[2, bodies]
+                distance2 = dx * dx + dy * dy + dz * dz
+
+                inside = (bodies >= self.start[nodes]) & (bodies < self.end[nodes])
+                accept = ~inside & (self.size[nodes] ** 2 < theta2 * distance2)
+
+                # Far nodes act as a single mass at their center of mass
+                weights = G * self.mass[nodes[accept]] * (distance2[accept] + softening2) ** -1.5
+                self.accumulate(accelerations[:, chunk], bodies[accept] - chunk_start, weights, dx[accept], dy[accept], dz[accept])
+
+                # Near leaves are summed body by body, without the body itself
+                leaf = ~accept & is_leaf[nodes]
+                leaf_counts = node_counts[nodes[leaf]]
+                targets = np.repeat(bodies[leaf], leaf_counts)
+                sources = np.repeat(self.start[nodes[leaf]], leaf_counts) + self.expand(leaf_counts)
+                other = targets != sources
+                targets, sources = targets[other], sources[other]
+                sx = source_positions[0, sources] - source_positions[0, targets]
+                sy = source_positions[1, sources] - source_positions[1, targets]
+                sz = source_positions[2, sources] - source_positions[2, targets]
+                weights = G * self.sorted_masses[sources] * (sx * sx + sy * sy + sz * sz + softening2) ** -1.5
+                self.accumulate(accelerations[:, chunk], targets - chunk_start, weights, sx, sy, sz)
+
+                # Every other node is opened
+                opened = ~accept & ~leaf
+                child_counts = self.child_count[nodes[opened]]
+                nodes = np.repeat(self.first_child[nodes[opened]], child_counts) + self.expand(child_counts)
+                bodies = np.repeat(bodies[opened], child_counts)
+
+        # Back from Morton order to the order of the bodies
+        out[:, self.order] = accelerations
+        return out
+
+    @staticmethod
+    def accumulate(accelerations, bodies, weights, dx, dy, dz):
+        """
+        Add pairwise accelerations to the bodies they act on.
+
+        Args:
+            accelerations (numpy.ndarray): The accelerations to add to, shape (3, N).
+            bodies (numpy.ndarray): The body of every pair, an index into accelerations.
+            weights (numpy.ndarray): G * mass / r^3 of every pair.
+            dx (numpy.ndarray): The X separation of every pair.
+            dy (numpy.ndarray): The Y separation of every pair.
+            dz (numpy.ndarray): The Z separation of every pair.
+        """
+        if len(bodies) == 0:
+            return
+        count = accelerations.shape[1]
+        accelerations[0] += np.bincount(bodies, weights * dx, minlength=count)
+        accelerations[1] += np.bincount(bodies, weights * dy, minlength=count)
+        accelerations[2] += np.bincount(bodies, weights * dz, minlength=count)
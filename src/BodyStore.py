@@ -0,0 +1,168 @@
+import numpy as np
+
+from Planet import Planet
+
+class BodyStore:
+    # Every column with its type and the shape of one entry
+    COLUMNS = (
+        # Orbit around the parent, or around the origin for bodies without one
+        ("distance", np.float64, ()),
+        ("speed", np.float64, ()),
+        ("eccentricity", np.float64, ()),
+        ("inclination", np.float64, ()),
+        ("ascending_node", np.float64, ()),
+        ("argument_of_periapsis", np.float64, ()),
+        ("mean_anomaly", np.float64, ()),
+        ("parent", np.int32, ()),
+        # Mass in solar masses, bodies with a mass take part in the gravity simulation
+        ("mass", np.float64, ()),
+        # Size and spin
+        ("radius", np.float32, ()),
+        ("scale", np.float32, (3,)),
+        ("rotation_speed", np.float64, ()),
+        ("angle", np.float64, ()),
+        ("rotation_angle", np.float64, ()),
+        # Material
+        ("ka", np.float32, (3,)),
+        ("kd", np.float32, (3,)),
+        ("ks", np.float32, (3,)),
+        ("shininess", np.float32, ()),
+        ("atmosphere_thickness", np.float32, ()),
+        ("atmosphere_color", np.float32, (3,)),
+        ("light_color", np.float32, (3,)),
+        # Texture IDs, or layers with texture arrays, -1 for none
+        ("diffuse_texture", np.int64, ()),
+        ("normal_texture", np.int64, ()),
+        ("flags", np.uint32, ()),
+    )
+    DEFAULTS = {"parent": -1, "diffuse_texture": -1, "normal_texture": -1}
+
+    def __init__(self, capacity=16):
+        """
+        Initialize a new BodyStore object, the attributes of every body as one contiguous array per column.
+
+        Rows are added one body at a time and the columns are read and written whole, eg. store.radius is
+        the radius of every body as a float32 array. Planet objects are views onto a single row. The
+        names and texture paths are kept in Python lists, they are only used while loading.
+
+        Args:
+            capacity (int, optional): The number of bodies to allocate the columns for. They grow as needed. Defaults to 16.
+        """
+        self.count = 0
+        self.names = []
+        self.diffuse_paths = []
+        self.normal_paths = []
+        self.arrays = {}
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        Allocate the columns, keeping the existing rows.
+
+        Args:
+            capacity (int): The number of bodies.
+        """
+        for name, dtype, shape in self.COLUMNS:
+            array = np.full((capacity,) + shape, self.DEFAULTS.get(name, 0), dtype=dtype)
+            if name in self.arrays:
+                array[:self.count] = self.arrays[name][:self.count]
+            self.arrays[name] = array
+        self.capacity = capacity
+
+    def __getattr__(self, name):
+        """
+        Get a column, as a view of its rows in use.
+
+        Args:
+            name (str): The name of the column.
+
+        Returns:
+            numpy.ndarray: The column, shape (count,) + the shape of one entry.
+        """
+        arrays = self.__dict__.get("arrays", {})
+        if name not in arrays:
+            raise AttributeError(name)
+        return arrays[name][:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def add(self, name, distance, radius, speed, rotation_speed, diffuse_path, normal_path, atmosphere_thickness=0.0,
+            atmosphere_color=[0.0, 0.0, 0.0], light_color=[0.0, 0.0, 0.0], **columns):
+        """
+        Add a body.
+
+        Args:
+            name (str): The name of the body.
+            distance (float): The distance of the body from its parent, the semi-major axis of its orbit.
+            radius (float): The radius of the body.
+            speed (float): The orbital speed of the body, its mean motion in radians per unit of time.
+            rotation_speed (float): The rotational speed of the body.
+            diffuse_path (str): The path to the diffuse texture of the body.
+            normal_path (str): The path to the normal texture of the body, or None.
+            atmosphere_thickness (float, optional): The thickness of the body's atmosphere. Defaults to 0.0.
+            atmosphere_color (list, optional): The color of the body's atmosphere. Defaults to [0.0, 0.0, 0.0].
+            light_color (list, optional): The color of the body's light. Defaults to [0.0, 0.0, 0.0].
+            **columns: Values of any other columns. The scale defaults to the radius along every axis.
+
+        Returns:
+            Planet: A view onto the new row.
+        """
+        if self.count == self.capacity:
+            self.allocate(2 * self.capacity)
+
+        index = self.count
+        self.count += 1
+        self.names.append(name)
+        self.diffuse_paths.append(diffuse_path)
+        self.normal_paths.append(normal_path)
+
+        columns = dict(distance=distance, radius=radius, speed=speed, rotation_speed=rotation_speed,
+                       atmosphere_thickness=atmosphere_thickness, atmosphere_color=atmosphere_color,
+                       light_color=light_color, **columns)
+        columns.setdefault("scale", (radius, radius, radius))
+        for column, value in columns.items():
+            if column not in self.arrays:
+                raise Exception(f"Unknown body attribute: {column}")
+            self.arrays[column][index] = value
+
+        return Planet(self, index)
+
+    def index(self, name):
+        """
+        Get the row of a body.
+
+        Args:
+            name (str): The name of the body.
+
+        Returns:
+            int: The row of the body.
+        """
+        return self.names.index(name)
+
+    def rows(self, flags):
+        """
+        Get the rows of the bodies with any of some flags set.
+
+        Args:
+            flags (int): The flags.
+
+        Returns:
+            numpy.ndarray: The rows.
+        """
+        return np.flatnonzero(self.flags & flags)
+
+    def depths(self):
+        """
+        Get how many parents up every body is from a body without a parent.
+
+        Returns:
+            numpy.ndarray: The depth of every body, 0 for bodies without a parent.
+        """
+        depths = np.zeros(self.count, dtype=np.int32)
+        ancestors = self.parent.copy()
+        while np.any(ancestors >= 0):
+            has_parent = ancestors >= 0
+            depths[has_parent] += 1
+            ancestors[has_parent] = self.parent[ancestors[has_parent]]
+        return depths
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+
+class CameraPath:
+    # The camera attributes of OpenGLWindow a keyframe can set, by their names in the file
+    FIELDS = {
+        "rotation_x": "camera_rotation_x",
+        "rotation_y": "camera_rotation_y",
+        "rotation_z": "camera_rotation_z",
+        "distance": "camera_distance",
+    }
+
+    def __init__(self, path):
+        """
+        Initialize a new CameraPath object, camera keyframes at animation times read from a JSON file.
+
+        The file holds a list of keyframes, eg.
+        {"keyframes": [{"time": 0.0, "distance": 40.0}, {"time": 0.6, "rotation_x": 0.5, "distance": 25.0}]}.
+        Every keyframe has a time and any of the FIELDS, the rotations in radians. A field that a keyframe
+        leaves out keeps its value from the keyframe before, and the camera is interpolated linearly between
+        the keyframes and held before the first and after the last.
+
+        Args:
+            path (str): The path to the JSON file.
+        """
+        with open(path, "r") as f:
+            keyframes = json.load(f)["keyframes"]
+        if len(keyframes) == 0:
+            raise Exception(f"The camera path has no keyframes: {path}")
+
+        keyframes = sorted(keyframes, key=lambda keyframe: keyframe["time"])
+        self.times = np.array([keyframe["time"] for keyframe in keyframes], dtype=np.float64)
+        self.values = {}
+        for field in self.FIELDS:
+            values = [keyframe.get(field) for keyframe in keyframes]
+            if all(value is None for value in values):
+                continue
+            # Fill the gaps forward, and the leading ones backward from the first keyframe that sets the field
+            first = next(value for value in values if value is not None)
+            last = first
+            for i, value in enumerate(values):
+                last = value if value is not None else last
+                values[i] = last
+            self.values[field] = np.array(values, dtype=np.float64)
+
+    @property
+    def start(self):
+        """
+        float: The time of the first keyframe.
+        """
+        return float(self.times[0])
+
+    @property
+    def end(self):
+        """
+        float: The time of the last keyframe.
+        """
+        return float(self.times[-1])
+
+    def apply(self, window, time):
+        """
+        Move the camera of a window to where the path has it at a time.
+
+        Args:
+            window (OpenGLWindow): The window.
+            time (float): The animation time.
+        """
+        for field, values in self.values.items():
+            setattr(window, self.FIELDS[field], float(np.interp(time, self.times, values)))
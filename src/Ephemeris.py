@@ -0,0 +1,194 @@
+import argparse
+import math
+import os
+import struct
+import warnings
+
+import numpy as np
+
+class Ephemeris:
+    # The header stores the magic, the body count and sample count (uint32 each), and the time of the first
+    # sample and the time between samples (float64 each), followed by the body names NAME_SIZE bytes each.
+    # The payload starts at the next multiple of 64 bytes: float64 (samples, 2, bodies, 3), the positions
+    # and then the velocities of every body at every sample, so the two samples of a segment are contiguous.
+    MAGIC = b"SSEPH001"
+    FIELDS = struct.Struct("<8sIIdd")
+    NAME_SIZE = 32
+    # Number of samples computed and written at once by build()
+    BUILD_CHUNK = 4096
+
+    def __init__(self, path):
+        """
+        Initialize a new Ephemeris object, a table of body positions that is memory mapped from a file.
+
+        Positions between the samples are interpolated with cubic Hermite segments, which go through the
+        positions of the two neighbouring samples with their velocities. A lookup is a handful of NumPy
+        operations for all bodies at once, however long the table is.
+
+        Args:
+            path (str): The path to the table file, written by build().
+        """
+        with open(path, "rb") as f:
+            header = f.read(self.FIELDS.size)
+            if len(header) != self.FIELDS.size:
+                raise Exception(f"Invalid ephemeris file: {path}")
+            magic, body_count, sample_count, self.start, self.step = self.FIELDS.unpack(header)
+            if magic != self.MAGIC:
+                raise Exception(f"Invalid ephemeris file: {path}")
+            names = f.read(body_count * self.NAME_SIZE)
+
+        self.names = [names[i:i + self.NAME_SIZE].rstrip(b"\0").decode("utf-8") for i in range(0, len(names), self.NAME_SIZE)]
+        self.indices = {name: index for index, name in enumerate(self.names)}
+        self.sample_count = sample_count
+        self.end = self.start + (sample_count - 1) * self.step
+
+        shape = (sample_count, 2, body_count, 3)
+        offset = self.data_offset(body_count)
+        if os.path.getsize(path) != offset + np.prod(shape) * 8:
+            raise Exception(f"Invalid ephemeris file: {path}")
+        self.table = np.memmap(path, dtype=np.float64, mode="r", offset=offset, shape=shape)
+
+    @classmethod
+    def data_offset(cls, body_count):
+        """
+        Get the offset of the payload in a table file.
+
+        Args:
+            body_count (int): The number of bodies.
+
+        Returns:
+            int: The offset in bytes.
+        """
+        return (cls.FIELDS.size + body_count * cls.NAME_SIZE + 63) // 64 * 64
+
+    def index(self, name):
+        """
+        Get the index of a body.
+
+        Args:
+            name (str): The name of the body.
+
+        Returns:
+            int: The index of the body in the result arrays.
+        """
+        return self.indices[name]
+
+    def positions(self, times):
+        """
+        Get the positions of all bodies at one or many times. Times outside the table are held at its ends.
+
+        Args:
+            times (float or numpy.ndarray): The times, any shape.
+
+        Returns:
+            numpy.ndarray: The positions, shape times.shape + (N, 3).
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if np.any(times < self.start) or np.any(times > self.end):
+            warnings.warn(f"WARNING: Time outside the ephemeris ({self.start} to {self.end}), holding the positions at its end")
+
+        # The segment of every time and the position within it
+        samples = np.clip((times - self.start) / self.step, 0.0, self.sample_count - 1)
+        first = np.minimum(samples.astype(np.int64), self.sample_count - 2)
+        s = samples - first
+
+        # Cubic Hermite basis functions, the weights of the first position and velocity, then the last
+        s2 = s * s
+        s3 = s2 * s
+        weights = np.stack([2.0 * s3 - 3.0 * s2 + 1.0, (s3 - 2.0 * s2 + s) * self.step,
+                            3.0 * s2 - 2.0 * s3, (s3 - s2) * self.step], axis=-1)
+
+        # Both samples of every segment with one gather, shape times.shape + (4, N, 3)
+        segments = self.table[first[..., None] + np.arange(2)].reshape(first.shape + (4,) + self.table.shape[2:])
+        return np.einsum("...k,...kij->...ij", weights, segments)
+
+    @classmethod
+    def build(cls, path, names, sample, start, end, step):
+        """
+        Write a table file. The file is written next to its final location and then renamed,
+        so a concurrent reader never sees a partial table.
+
+        Args:
+            path (str): The path to the table file.
+            names (list): The names of the bodies.
+            sample (callable): Called with consecutive, increasing arrays of sample times, returns the positions
+                and velocities of the bodies at those times, both of shape (len(times), N, 3).
+            start (float): The time of the first sample.
+            end (float): The time of the last sample, rounded up to a whole number of steps.
+            step (float): The time between samples.
+        """
+        sample_count = max(2, math.ceil((end - start) / step - 1e-9) + 1)
+        shape = (sample_count, 2, len(names), 3)
+        offset = cls.data_offset(len(names))
+
+        header = cls.FIELDS.pack(cls.MAGIC, len(names), sample_count, start, step)
+        header += b"".join(name.encode("utf-8")[:cls.NAME_SIZE].ljust(cls.NAME_SIZE, b"\0") for name in names)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header.ljust(offset, b"\0"))
+            f.truncate(offset + np.prod(shape) * 8)
+
+        table = np.memmap(temp_path, dtype=np.float64, mode="r+", offset=offset, shape=shape)
+        for first in range(0, sample_count, cls.BUILD_CHUNK):
+            chunk = slice(first, min(sample_count, first + cls.BUILD_CHUNK))
+            table[chunk, 0], table[chunk, 1] = sample(start + np.arange(chunk.start, chunk.stop) * step)
+        table.flush()
+        del table
+
+        os.replace(temp_path, path)
+
+def main():
+    """
+    Build an ephemeris table of the solar system, from the Kepler orbits or the gravity simulation.
+    """
+    from GLWindow import OpenGLWindow
+
+    parser = argparse.ArgumentParser(description="Precompute the positions of the planets into an ephemeris table")
+    parser.add_argument("output", nargs="?", default="./cache/ephemeris.eph", help="the table file to write")
+    parser.add_argument("--years", type=float, default=100.0, help="the time span of the table, in orbits of Earth")
+    parser.add_argument("--step", type=float, default=0.005, help="the time between samples")
+    parser.add_argument("--physics", action="store_true", help="run the N-body gravity simulation instead of solving the Kepler orbits")
+    parser.add_argument("--integrator", choices=["verlet", "wisdom-holman"], default="wisdom-holman",
+                        help="the integrator of the gravity simulation")
+    args = parser.parse_args()
+
+    window = OpenGLWindow(physics=args.physics, integrator=args.integrator)
+    window.init_planets()
+    end = args.years * 2.0 * math.pi / window.earth_speed
+
+    if window.physics is not None:
+        physics = window.physics
+        names = list(physics.names)
+
+        # The table holds the bodies relative to their parents, like the Kepler orbits
+        parents = window.physics_parent_indices[window.physics_rows]
+        relative = parents >= 0
+
+        def sample(times):
+            positions = np.empty((len(times), physics.count, 3))
+            velocities = np.empty((len(times), physics.count, 3))
+            for i, time in enumerate(times):
+                physics.advance(time - physics.time)
+                positions[i] = physics.positions.T
+                velocities[i] = physics.velocities.T
+            positions[:, relative] -= positions[:, parents[relative]]
+            velocities[:, relative] -= velocities[:, parents[relative]]
+            return positions, velocities
+    else:
+        orbits = window.orbits
+        names = list(orbits.names)
+
+        def sample(times):
+            return orbits.positions(times), orbits.velocities(times)
+
+    Ephemeris.build(args.output, names, sample, 0.0, end, args.step)
+    table = Ephemeris(args.output)
+    print(f"{args.output}: {len(table.names)} bodies, {table.sample_count} samples from {table.start} to {table.end}, "
+          f"{os.path.getsize(args.output) / (1 << 20):.1f} MiB")
+
+if __name__ == "__main__":
+    main()
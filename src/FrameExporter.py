@@ -0,0 +1,258 @@
+import argparse
+import multiprocessing
+import os
+import shlex
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+class FrameExporter:
+    # Encoder command for --video, fed raw RGB frames on its standard input
+    DEFAULT_ENCODER = ("ffmpeg -y -loglevel error -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - "
+                       "-pix_fmt yuv420p {output}")
+    # Number of frames per worker that may wait to be written before rendering waits for them
+    QUEUE_DEPTH = 2
+
+    def __init__(self, width, height, directory=None, image_format="png", video=None, encoder=DEFAULT_ENCODER, fps=60, max_workers=None):
+        """
+        Initialize a new FrameExporter object, which writes rendered frames to an image sequence or an encoder.
+
+        The frames are handed to a pool of worker threads, so compressing and writing them overlaps with
+        rendering the next ones. Images are written to directory/frame_NNNNN.format, numbered by their index
+        in the whole export. A video is written by piping the raw frames, in order, into an encoder process.
+
+        Args:
+            width (int): The width of the frames.
+            height (int): The height of the frames.
+            directory (str, optional): The directory of the image sequence. Defaults to None.
+            image_format (str, optional): The image file format, "png" or "jpg". Defaults to "png".
+            video (str, optional): The path of the video, instead of an image sequence. Defaults to None.
+            encoder (str, optional): The encoder command, with the {width}, {height}, {fps} and {output}
+                placeholders filled in. Defaults to DEFAULT_ENCODER.
+            fps (float, optional): The frame rate of the video. Defaults to 60.
+            max_workers (int, optional): The number of threads writing images. Defaults to the number of CPUs.
+        """
+        if (directory is None) == (video is None):
+            raise Exception("Export either an image sequence or a video")
+
+        self.width = width
+        self.height = height
+        self.directory = directory
+        self.image_format = image_format
+        self.encoder = None
+        self.written = 0
+
+        if video is not None:
+            # The frames have to reach the encoder in order, so a single thread writes them
+            command = shlex.split(encoder.format(width=width, height=height, fps=fps, output=shlex.quote(video)))
+            self.encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+            max_workers = 1
+        else:
+            os.makedirs(directory, exist_ok=True)
+            max_workers = max_workers or os.cpu_count() or 1
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame-export")
+        self.max_pending = self.QUEUE_DEPTH * max_workers
+        self.pending = []
+
+    def path(self, index):
+        """
+        Get the path of a frame of the image sequence.
+
+        Args:
+            index (int): The index of the frame.
+
+        Returns:
+            str: The path.
+        """
+        return os.path.join(self.directory, f"frame_{index:05d}.{self.image_format}")
+
+    def write(self, index, frame):
+        """
+        Queue a frame for writing. If too many frames are queued already, wait for the oldest.
+
+        Args:
+            index (int): The index of the frame in the export.
+            frame (numpy.ndarray): The frame, shape (height, width, 3) uint8.
+        """
+        if len(self.pending) >= self.max_pending:
+            self.pending.pop(0).result()
+        self.pending.append(self.executor.submit(self.write_frame, index, frame))
+        self.written += 1
+
+    def write_frame(self, index, frame):
+        """
+        Write a frame, on a worker thread.
+
+        Args:
+            index (int): The index of the frame in the export.
+            frame (numpy.ndarray): The frame, shape (height, width, 3) uint8.
+        """
+        if self.encoder is not None:
+            try:
+                self.encoder.stdin.write(np.ascontiguousarray(frame).data)
+            except BrokenPipeError:
+                raise Exception(f"The encoder exited with code {self.encoder.wait()} before frame {index}")
+        else:
+            Image.fromarray(frame).save(self.path(index))
+
+    def close(self):
+        """
+        Wait for the queued frames to be written and for the encoder to finish.
+
+        Returns:
+            int: The number of frames written.
+        """
+        for future in self.pending:
+            future.result()
+        self.pending = []
+        self.executor.shutdown()
+
+        if self.encoder is not None:
+            self.encoder.stdin.close()
+            if self.encoder.wait() != 0:
+                raise Exception(f"The encoder failed with exit code {self.encoder.returncode}")
+
+        return self.written
+
+def frame_time(options, index):
+    """
+    Get the animation time of a frame of the export.
+
+    Args:
+        options (dict): The export options.
+        index (int): The index of the frame.
+
+    Returns:
+        float: The animation time.
+    """
+    return options["start"] + index * options["step"]
+
+def render_frames(options, first, end):
+    """
+    Render and write a range of the frames of an export through a headless context of its own.
+
+    Every frame is rendered at its exact animation time, so the frames are the same however the export is
+    split. With physics the simulation is advanced through the frames before the range one frame at a time,
+    like a run from the first frame would be. The lights follow the bodies a frame late, so the frame before
+    the range is rendered too and thrown away.
+
+    Args:
+        options (dict): The export options, the parsed command-line arguments.
+        first (int): The index of the first frame.
+        end (int): The index after the last frame.
+
+    Returns:
+        int: The number of frames written.
+    """
+    from CameraPath import CameraPath
+    from GLWindow import OpenGLWindow
+
+    window = OpenGLWindow(max_texture_size=options["max_texture_size"], instancing=not options["no_instancing"],
+                          texture_arrays=options["texture_arrays"], physics=options["physics"],
+                          integrator=options["integrator"], ephemeris=options["ephemeris"], headless=options["backend"],
+                          lod=not options["no_lod"], gpu_orbits=options["gpu_orbits"])
+    window.initGL(options["width"], options["height"])
+    window.animation_running = False
+    camera_path = CameraPath(options["camera_path"]) if options["camera_path"] is not None else None
+
+    exporter = FrameExporter(options["width"], options["height"], options["output"], options["format"], options["video"],
+                             options["encoder"], options["fps"], options["workers"])
+
+    warm_up = max(first - 1, 0)
+    window.seek(options["start"])
+    if window.physics is not None:
+        for index in range(warm_up):
+            window.seek(frame_time(options, index))
+
+    # The frames come back in order, starting with the thrown away one
+    index = warm_up
+    for frame_index in range(warm_up, end):
+        time = frame_time(options, frame_index)
+        window.seek(time)
+        if camera_path is not None:
+            camera_path.apply(window, time)
+        frame = window.render()
+        frames = [frame] if frame is not None else []
+        if frame_index == end - 1:
+            frames += window.context.flush()
+        for frame in frames:
+            if index >= first:
+                exporter.write(index, frame)
+            index += 1
+
+    written = exporter.close()
+    window.cleanup()
+    return written
+
+def main():
+    """
+    Export a time range or camera path of the animation as an image sequence or a video, rendered offscreen.
+    """
+    parser = argparse.ArgumentParser(description="Render the solar system offline to an image sequence or a video")
+    parser.add_argument("output", nargs="?", default="./export", help="the directory of the image sequence")
+    parser.add_argument("--video", default=None, help="pipe the frames into an encoder writing this video instead of an image sequence")
+    parser.add_argument("--encoder", default=FrameExporter.DEFAULT_ENCODER,
+                        help="the encoder command, with {width}, {height}, {fps} and {output} placeholders")
+    parser.add_argument("--format", choices=["png", "jpg"], default="png", help="the image file format")
+    parser.add_argument("--start", type=float, default=None, help="the animation time of the first frame, defaults to 0 or the start of the camera path")
+    parser.add_argument("--frames", type=int, default=None, help="the number of frames, defaults to 600 or the length of the camera path")
+    parser.add_argument("--step", type=float, default=0.001, help="the animation time between frames, 0.001 like the live animation")
+    parser.add_argument("--camera-path", default=None, help="a JSON file of camera keyframes, see src/CameraPath.py")
+    parser.add_argument("--fps", type=float, default=60.0, help="the frame rate of the video")
+    parser.add_argument("--width", type=int, default=800, help="the width of the frames")
+    parser.add_argument("--height", type=int, default=600, help="the height of the frames")
+    parser.add_argument("--backend", choices=["egl", "osmesa"], default="egl", help="the headless OpenGL backend")
+    parser.add_argument("--processes", type=int, default=1, help="split the frames across this many rendering processes")
+    parser.add_argument("--workers", type=int, default=None, help="the number of image writing threads per process")
+    parser.add_argument("--max-texture-size", type=int, default=0, help="cap the texture width and height")
+    parser.add_argument("--no-instancing", action="store_true", help="draw every body with its own uniforms")
+    parser.add_argument("--no-lod", action="store_true", help="draw every body with the full sphere model")
+    parser.add_argument("--gpu-orbits", action="store_true", help="place the bodies in the vertex shader from the animation time")
+    parser.add_argument("--texture-arrays", action="store_true", help="pack the planet maps into array textures")
+    parser.add_argument("--physics", action="store_true", help="move the planets with the N-body gravity simulation")
+    parser.add_argument("--integrator", choices=["verlet", "wisdom-holman"], default="verlet", help="the integrator of the gravity simulation")
+    parser.add_argument("--ephemeris", default=None, help="interpolate the planet positions from an ephemeris table")
+    args = parser.parse_args()
+
+    if args.video is not None and args.processes > 1:
+        raise Exception("A video is written by a single process, use an image sequence to split the export")
+
+    # Without --video the frames go to the output directory
+    if args.video is not None:
+        args.output = None
+    if args.camera_path is not None:
+        from CameraPath import CameraPath
+        camera_path = CameraPath(args.camera_path)
+        if args.start is None:
+            args.start = camera_path.start
+        if args.frames is None:
+            args.frames = int(round((camera_path.end - args.start) / args.step)) + 1
+    args.start = 0.0 if args.start is None else args.start
+    args.frames = 600 if args.frames is None else args.frames
+    if args.workers is None:
+        args.workers = max(1, (os.cpu_count() or 1) // args.processes)
+
+    # PyOpenGL picks its platform when it is first imported, the worker processes inherit the environment
+    os.environ["PYOPENGL_PLATFORM"] = args.backend
+    if args.backend == "egl":
+        os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+    options = vars(args)
+    start = time.perf_counter()
+    if args.processes > 1:
+        # Spawned rather than forked, so every process creates its own context from scratch
+        bounds = np.linspace(0, args.frames, args.processes + 1).astype(int)
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            written = sum(pool.starmap(render_frames, [(options, first, end) for first, end in zip(bounds[:-1], bounds[1:])]))
+    else:
+        written = render_frames(options, 0, args.frames)
+    elapsed = time.perf_counter() - start
+
+    print(f"Exported {written} frames to {args.video or args.output} in {elapsed:.1f} s ({written / elapsed:.1f} frames per second)")
+
+if __name__ == "__main__":
+    main()
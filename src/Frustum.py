@@ -0,0 +1,37 @@
+import numpy as np
+
+class Frustum:
+    def __init__(self, view_matrix, projection):
+        """
+        Initialize a new Frustum object, the six planes bounding what the camera sees, in world space.
+
+        The planes are taken from the combined view and projection matrix (Gribb and Hartmann): a point p is
+        inside when -w <= x, y, z <= w for its clip coordinates, and each of those six inequalities is a plane
+        in world space. The matrices are row-major, p * view * projection, so a clip coordinate is p dotted
+        with a column of the product. The planes are normalized, so they give the signed distance of a point.
+
+        Args:
+            view_matrix (numpy.ndarray): The view matrix.
+            projection (numpy.ndarray): The projection matrix.
+        """
+        columns = (np.asarray(view_matrix, dtype=np.float64) @ np.asarray(projection, dtype=np.float64)).T
+        # Left, right, bottom, top, near and far, the normals pointing inwards
+        planes = np.array([columns[3] + columns[0], columns[3] - columns[0],
+                           columns[3] + columns[1], columns[3] - columns[1],
+                           columns[3] + columns[2], columns[3] - columns[2]])
+        self.planes = planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+    def visible(self, centers, radii):
+        """
+        Test a batch of bounding spheres against the planes. A sphere is culled when it lies entirely behind
+        any of them. Spheres near a corner of the frustum can pass without touching it, which only costs a draw.
+
+        Args:
+            centers (numpy.ndarray): The centers of the spheres, shape (N, 3).
+            radii (numpy.ndarray): The radii of the spheres, shape (N,).
+
+        Returns:
+            numpy.ndarray: Whether each sphere is at least partly inside the frustum, shape (N,) bool.
+        """
+        distances = centers @ self.planes[:, :3].T + self.planes[:, 3]
+        return np.all(distances >= -np.asarray(radii)[:, None], axis=1)
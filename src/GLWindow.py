@@ -1,17 +1,146 @@
 import pygame as pg
 from OpenGL.GL import *
-from OpenGL.GL.shaders import compileProgram, compileShader
 import numpy as np
 import pyrr
 import math
+import time
+import warnings
+from Ephemeris import Ephemeris
+from Frustum import Frustum
+from BodyStore import BodyStore
 from Geometry import Geometry
-from PIL import Image
+from GeometryCache import GeometryCache
+from HeadlessContext import HeadlessContext
+from InstanceBuffer import InstanceBuffer
+from KeplerOrbits import KeplerOrbits
+from OrbitBuffer import OrbitBuffer
+from Physics import Physics
 from Planet import Planet
+from ProgramCache import ProgramCache
+from SceneGraph import SceneGraph
+from ShaderProgram import ShaderProgram
+from SphereMesh import SphereMesh
+from Simulation import Simulation
+from TiledLights import TiledLights
+from TextureCache import TextureCache
+from TextureManager import TextureManager
 
 class OpenGLWindow:
-    def __init__(self):
+    # Shading flags of the bodies, they select the shader variants
+    BODY_SUN = 1
+    BODY_EARTH = 2
+    BODY_SATURN_RING = 4
+    BODY_STARRY_BACKGROUND = 8
+
+    # Shader variants compiled from simple.vert and simple.frag, with the macros defined for each and the shading
+    # flags of the bodies drawn with it. A body uses the first variant it has any of the flags of, or the last.
+    SHADER_VARIANTS = {
+        "unlit": (("SHADE_UNLIT",), BODY_SUN | BODY_STARRY_BACKGROUND),
+        "earth": (("SHADE_EARTH",), BODY_EARTH),
+        "ring": (("SHADE_SATURN_RING",), BODY_SATURN_RING),
+        "planet": ((), 0),
+    }
+
+    # Masses of the bodies in the physics simulation, relative to the sun. The sun's mass is chosen
+    # so that Earth orbits at the same angular speed as in the kinematic animation.
+    PLANET_MASSES = {
+        "Mercury": 1.66e-7,
+        "Venus": 2.45e-6,
+        "Earth": 3.00e-6,
+        "Mars": 3.23e-7,
+        "Jupiter": 9.55e-4,
+        "Saturn": 2.86e-4,
+        "Uranus": 4.37e-5,
+        "Neptune": 5.15e-5,
+    }
+
+    # Orbital elements of the planets at J2000: eccentricity, inclination, longitude of the ascending node,
+    # argument of periapsis and mean anomaly, the angles in degrees
+    ORBITAL_ELEMENTS = {
+        "Mercury": (0.2056, 7.005, 48.331, 29.125, 174.79),
+        "Venus": (0.0068, 3.395, 76.680, 54.85, 50.45),
+        "Earth": (0.0167, 0.0, 0.0, 102.94, 357.52),
+        "Mars": (0.0934, 1.850, 49.558, 286.50, 19.41),
+        "Jupiter": (0.0484, 1.303, 100.464, 273.87, 20.07),
+        "Saturn": (0.0539, 2.485, 113.665, 338.77, 317.51),
+        "Uranus": (0.0473, 0.773, 74.006, 96.95, 142.27),
+        "Neptune": (0.0086, 1.770, 131.784, 273.19, 259.91),
+    }
+
+    # Materials of the bodies: ambient, diffuse and specular reflection coefficients and shininess
+    MATERIALS = {
+        "Sun": ((0.2, 0.2, 0.2), (1.0, 1.0, 1.0), (1.0, 1.0, 1.0), 80.0),
+        "Mercury": ((0.1, 0.1, 0.1), (0.4, 0.4, 0.4), (0.2, 0.2, 0.2), 16.0),
+        "Venus": ((0.2, 0.2, 0.2), (0.8, 0.6, 0.4), (0.4, 0.3, 0.2), 32.0),
+        "Earth": ((0.1, 0.1, 0.1), (0.0, 0.5, 1.0), (0.3, 0.3, 0.3), 64.0),
+        "Mars": ((0.2, 0.1, 0.1), (0.8, 0.4, 0.1), (0.2, 0.2, 0.2), 32.0),
+        "Jupiter": ((0.2, 0.2, 0.2), (0.8, 0.6, 0.4), (0.4, 0.4, 0.4), 128.0),
+        "Saturn": ((0.2, 0.2, 0.2), (0.8, 0.7, 0.5), (0.5, 0.5, 0.5), 128.0),
+        "Uranus": ((0.1, 0.1, 0.1), (0.6, 0.8, 0.9), (0.4, 0.4, 0.4), 64.0),
+        "Neptune": ((0.1, 0.1, 0.1), (0.6, 0.6, 0.6), (0.1, 0.1, 0.1), 16.0),
+        "Saturn Ring": ((1.0, 1.0, 1.0), (0.8, 0.8, 0.8), (0.2, 0.2, 0.2), 100.0),
+        "Moon": ((0.1, 0.1, 0.1), (0.6, 0.6, 0.6), (0.1, 0.1, 0.1), 16.0),
+    }
+
+    # Steps per orbit of the innermost planet taken by the Wisdom-Holman integrator
+    WISDOM_HOLMAN_STEPS_PER_ORBIT = 20
+    SECONDS_PER_YEAR = 365.25 * 24 * 3600
+    # Animation time per second of the fixed steps of 0.001 (0.01 for the clouds) at 60 frames per second
+    ANIMATION_SPEED = 0.06
+    CLOUD_ANIMATION_SPEED = 0.6
+
+    # Texture units of the diffuse and normal map arrays, apart from the units of the 2D samplers
+    DIFFUSE_ARRAY_UNIT = 3
+    NORMAL_ARRAY_UNIT = 4
+    # Texture unit of the orbits the vertex shader places the bodies with
+    ORBIT_UNIT = 5
+    # Texture units of the lights and of the per-tile light lists
+    LIGHT_UNIT = 6
+    TILE_LIGHT_UNIT = 7
+
+    # Levels of detail of the sphere, in quads along the edge of each of its 6 faces (the model has 16). A body
+    # is drawn with the coarsest level whose silhouette is at most LOD_ERROR pixels inside the true sphere,
+    # and only drops to a coarser level once that one would be within LOD_HYSTERESIS of the limit.
+    SPHERE_LEVELS = (2, 4, 8, 16, 32)
+    LOD_ERROR = 0.5
+    LOD_HYSTERESIS = 0.6
+
+    def __init__(self, rebuild_cache=False, max_texture_size=0, stream_textures=False, texture_upload_budget=4 << 20, instancing=True,
+                 texture_arrays=False, physics=False, integrator="verlet", time_warp=None,
+                 ephemeris=None, sim_rate=None, headless=None, lod=True, gpu_orbits=False):
         """
         Initialize the OpenGL window.
+
+        Args:
+            rebuild_cache (bool, optional): Whether to ignore the on-disk asset caches and rebuild them. Defaults to False.
+            max_texture_size (int, optional): Cap on the texture width and height, 0 keeps the full resolution. Defaults to 0.
+            stream_textures (bool, optional): Whether to start with placeholder textures and stream the full resolution
+                levels in over the first frames. Defaults to False.
+            texture_upload_budget (int, optional): The number of texture bytes streamed per frame. Defaults to 4 MiB.
+            instancing (bool, optional): Whether to draw the bodies as instances of the sphere instead of
+                one draw call with its own uniforms each. Defaults to True.
+            texture_arrays (bool, optional): Whether to pack the diffuse and normal maps of the bodies into two
+                array textures that are bound once per frame. Maps are resampled to the most common size.
+                Defaults to False.
+            physics (bool, optional): Whether to move the planets with an N-body gravity simulation instead of
+                on fixed Kepler orbits. Defaults to False.
+            integrator (str, optional): The integrator of the physics simulation, "verlet" or "wisdom-holman".
+                Defaults to "verlet".
+            time_warp (float, optional): How many times faster than real time the animation runs, where one
+                orbit of Earth takes a year. Defaults to None, which advances the animation by a fixed step per frame.
+            ephemeris (str, optional): The path to an ephemeris table the planet positions are interpolated from,
+                instead of solving their orbits every frame. Defaults to None.
+            sim_rate (float, optional): Run the animation and physics on their own thread at this many fixed steps
+                per second, with the frames interpolated between the last two steps. Defaults to None, which
+                advances the animation once per frame.
+            headless (str, optional): Render offscreen through a HeadlessContext with this backend, "egl" or
+                "osmesa", instead of opening a window. render() then returns the frames. Defaults to None.
+            lod (bool, optional): Whether to draw every body with the sphere level of detail its size on screen
+                needs, instead of the full sphere model. Defaults to True.
+            gpu_orbits (bool, optional): Whether to upload the orbits once and have the vertex shader place and turn
+                the bodies from the animation time, instead of computing their transforms every frame. Only the
+                lights are placed on the CPU, and the bodies are culled and given their level of detail by the
+                spheres their orbits stay within. Needs instancing and Kepler orbits. Defaults to False.
         """
         self.clock = pg.time.Clock()
         self.animation_running = True
@@ -39,64 +168,248 @@ class OpenGLWindow:
         self.diffuse_textures = {}
         self.normal_textures = {}
         self.cloud_textures = {}
+        self.geometry_cache = GeometryCache(rebuild=rebuild_cache)
+        self.program_cache = ProgramCache(rebuild=rebuild_cache)
+        self.gl_calls = (0, 0)
+        self.instancing = instancing
+        self.texture_arrays = texture_arrays
+        if ephemeris is not None and physics:
+            warnings.warn("WARNING: The positions come from the ephemeris table, the physics simulation is not run")
+            physics = False
+        self.physics = Physics(integrator=integrator) if physics else None
+        self.ephemeris = Ephemeris(ephemeris) if ephemeris is not None else None
+        self.time_warp = time_warp
+        self.last_frame_time = None
+        self.sim_rate = sim_rate
+        self.headless = headless
+        self.lod = lod
+        if gpu_orbits and (physics or ephemeris is not None or not instancing):
+            warnings.warn("WARNING: The orbits are only evaluated on the GPU with instancing and without physics or an ephemeris")
+            gpu_orbits = False
+        self.gpu_orbits = gpu_orbits
+        self.triangle_count = 0
+        self.drawn_count = 0
+        self.culled_count = 0
+        self.simulation = None
+        if texture_arrays and stream_textures:
+            warnings.warn("WARNING: Texture streaming does not support texture arrays, loading the textures up front")
+            stream_textures = False
+        self.textures = TextureManager(TextureCache(max_size=max_texture_size, rebuild=rebuild_cache),
+                                       streaming=stream_textures, upload_budget=texture_upload_budget)
     
     def init_planets(self):
         """
-        Initialize the planets in the solar system.
+        Initialize the bodies of the solar system: the sun, the planets, Saturn's ring, the Moon and the
+        starry background, in the order they are drawn.
         """
+        self.bodies = bodies = BodyStore()
+        self.sun = bodies.add("Sun", 0.0, 2.0, 0.0, self.sun_rotation_speed, "./resources/sun/diffuse.png", "./resources/sun/normal.png",
+                              mass=1.0, flags=self.BODY_SUN)
         self.planets = [
-            Planet("Mercury", self.first_planet_distance, 0.2, 20.0, 10.0, "./resources/mercury/diffuse.png", "./resources/mercury/normal.png"),
-            Planet("Venus", self.first_planet_distance + 4, 0.4, 15.0, 8.0, "./resources/venus/diffuse.png", "./resources/venus/normal.png", 0.2, [0.8, 0.6, 0.2]),
-            Planet("Earth", self.first_planet_distance + 8, 0.5, 10.0, 20.0, "./resources/earth/diffuse.png", "./resources/earth/normal.png", 0.1, [0.0, 0.5, 1.0]),
-            Planet("Mars", self.first_planet_distance + 12, 0.3, 8.0, 12.0, "./resources/mars/diffuse.png", "./resources/mars/normal.png", 0.05, [0.8, 0.4, 0.1]),
-            Planet("Jupiter", self.first_planet_distance + 20, 1.5, 5.0, 5.0, "./resources/jupiter/diffuse.png", "./resources/jupiter/normal.png", 0.3, [0.8, 0.6, 0.4], [1.0, 0.6, 0.2]),
-            Planet("Saturn", self.first_planet_distance + 40, 1.2, 4.0, 4.0, "./resources/saturn/diffuse.png", "./resources/saturn/normal.png", 0.2, [0.8, 0.7, 0.5]),
-            Planet("Uranus", self.first_planet_distance + 60, 0.8, 3.0, 3.0, "./resources/uranus/diffuse.png", "./resources/uranus/normal.png", 0.15, [0.6, 0.8, 0.9], [0.2, 0.6, 1.0]),
-            Planet("Neptune", self.first_planet_distance + 70, 0.7, 2.0, 2.0, "./resources/neptune/diffuse.png", "./resources/neptune/normal.png", 0.1, [0.2, 0.4, 0.8])
+            bodies.add("Mercury", self.first_planet_distance, 0.2, 20.0, 10.0, "./resources/mercury/diffuse.png", "./resources/mercury/normal.png"),
+            bodies.add("Venus", self.first_planet_distance + 4, 0.4, 15.0, 8.0, "./resources/venus/diffuse.png", "./resources/venus/normal.png", 0.2, [0.8, 0.6, 0.2]),
+            bodies.add("Earth", self.first_planet_distance + 8, 0.5, 10.0, 20.0, "./resources/earth/diffuse.png", "./resources/earth/normal.png", 0.1, [0.0, 0.5, 1.0], flags=self.BODY_EARTH),
+            bodies.add("Mars", self.first_planet_distance + 12, 0.3, 8.0, 12.0, "./resources/mars/diffuse.png", "./resources/mars/normal.png", 0.05, [0.8, 0.4, 0.1]),
+            bodies.add("Jupiter", self.first_planet_distance + 20, 1.5, 5.0, 5.0, "./resources/jupiter/diffuse.png", "./resources/jupiter/normal.png", 0.3, [0.8, 0.6, 0.4], [1.0, 0.6, 0.2]),
+            bodies.add("Saturn", self.first_planet_distance + 40, 1.2, 4.0, 4.0, "./resources/saturn/diffuse.png", "./resources/saturn/normal.png", 0.2, [0.8, 0.7, 0.5]),
+            bodies.add("Uranus", self.first_planet_distance + 60, 0.8, 3.0, 3.0, "./resources/uranus/diffuse.png", "./resources/uranus/normal.png", 0.15, [0.6, 0.8, 0.9], [0.2, 0.6, 1.0]),
+            bodies.add("Neptune", self.first_planet_distance + 70, 0.7, 2.0, 2.0, "./resources/neptune/diffuse.png", "./resources/neptune/normal.png", 0.1, [0.2, 0.4, 0.8])
         ]
-        self.saturn_ring = Planet("Saturn Ring", self.first_planet_distance + 60, 2.0, 4.0, 0.0, "./resources/saturn/rings_diffuse.png", "./resources/saturn/rings_normal.png")
-        self.moon = Planet("Moon", 2, 0.1, 30.0, 10.0, "./resources/moon/diffuse.png", "./resources/moon/normal.png")
-
-    def load_textures(self):
+        for planet in self.planets:
+            planet.parent = self.sun.index
+            planet.mass = self.PLANET_MASSES.get(planet.name, 0.0)
+            (planet.eccentricity, planet.inclination, planet.ascending_node,
+             planet.argument_of_periapsis, planet.mean_anomaly) = self.ORBITAL_ELEMENTS.get(planet.name, (0.0, 0.0, 0.0, 0.0, 0.0))
+
+        # The ring turns with Saturn's orbit and the Moon orbits Earth
+        saturn, earth = bodies.index("Saturn"), bodies.index("Earth")
+        bodies.add("Saturn Ring", 0.0, 2.0, 0.0, 0.0, "./resources/saturn/rings_diffuse.png", "./resources/saturn/rings_normal.png",
+                   scale=(2.0, 0.1, 2.0), parent=saturn, flags=self.BODY_SATURN_RING)
+        bodies.add("Moon", 2, 0.1, 30.0, 10.0, "./resources/moon/diffuse.png", "./resources/moon/normal.png", parent=earth)
+
+        # A large sphere encompassing the scene for the starry background, it keeps whatever normal texture is bound
+        bodies.add("Starry Background", 0.0, 50.0, 0.0, 0.0, "./resources/starry_background.png", None, flags=self.BODY_STARRY_BACKGROUND)
+
+        for index, name in enumerate(bodies.names):
+            if name in self.MATERIALS:
+                bodies.ka[index], bodies.kd[index], bodies.ks[index], bodies.shininess[index] = self.MATERIALS[name]
+
+        self.light_rows = np.flatnonzero(np.any(bodies.light_color > 0.0, axis=1))
+        variant_flags = [flags for _, flags in self.SHADER_VARIANTS.values()]
+        self.body_variants = np.array([next((variant for variant, flags in enumerate(variant_flags) if body_flags & flags),
+                                            len(variant_flags) - 1) for body_flags in bodies.flags], dtype=np.int64)
+        self.sun_row = self.sun.index
+
+        # Where the position of every row comes from, as its index in the orbits, the ephemeris table and the
+        # physics simulation, -1 for the rows they do not cover. Later sources override earlier ones.
+        self.orbit_rows = np.flatnonzero(bodies.distance > 0.0)
+        self.orbits = KeplerOrbits(bodies, self.orbit_rows)
+        self.orbit_indices = np.full(len(bodies), -1, dtype=np.int64)
+        self.orbit_indices[self.orbit_rows] = np.arange(len(self.orbit_rows))
+
+        if self.ephemeris is not None:
+            self.ephemeris_indices = np.array([self.ephemeris.indices.get(name, -1) for name in bodies.names], dtype=np.int64)
+
+        if self.physics is not None:
+            self.init_physics()
+
+        self.scene = SceneGraph(bodies, self.physics_rows if self.physics is not None else None)
+        if self.gpu_orbits:
+            self.init_orbit_bounds()
+        self.scene.set_time(self.animation_time)
+        self.scene.update(self.local_positions)
+        self.body_positions = self.scene.world_positions
+        self.instance_order = None
+
+    def init_orbit_bounds(self):
         """
-        Load the textures for the planets, sun, and background.
+        Find the spheres the bodies stay within as they move along their orbits, for culling them and choosing
+        their levels of detail without their positions. Every body is at most its apoapsis distance from its
+        parent, and the roots of the hierarchy orbit the origin, so the spheres are centered on the origin and
+        reach out over the apoapses along the chain of parents.
         """
-        for planet in self.planets:
-            diffuse_texture, normal_texture, cloud_texture = self.load_texture(planet.diffuse_path, planet.normal_path)
-            self.diffuse_textures[planet.name] = diffuse_texture
-            self.normal_textures[planet.name] = normal_texture
+        bodies = self.bodies
+        apoapses = np.where(bodies.distance > 0.0, bodies.distance * (1.0 + bodies.eccentricity), 0.0)
+        self.orbit_reach = np.zeros(len(bodies))
+        for level, rows in enumerate(self.scene.levels):
+            self.orbit_reach[rows] = apoapses[rows] + (self.orbit_reach[bodies.parent[rows]] if level > 0 else 0.0)
+        self.orbit_centers = np.zeros((len(bodies), 3))
+
+    def init_physics(self):
+        """
+        Add the bodies with a mass to the physics simulation, every planet starting where its Kepler orbit
+        starts, with the velocity of an orbit of the same shape around the sun's mass. The Moon stays on its
+        kinematic orbit around Earth, it orbits too far out to be held by Earth's gravity at these scales.
+        """
+        bodies = self.bodies
+        earth = bodies.rows(self.BODY_EARTH)[0]
+        sun_mass = bodies.speed[earth] ** 2 * bodies.distance[earth] ** 3 / self.physics.G
+
+        self.physics_rows = np.flatnonzero(bodies.mass > 0.0)
+        orbit_positions = np.zeros((len(bodies), 3))
+        orbit_velocities = np.zeros((len(bodies), 3))
+        orbit_positions[self.orbit_rows] = self.orbits.positions(0.0)
+        orbit_velocities[self.orbit_rows] = self.orbits.velocities(0.0, self.physics.G * sun_mass)
+        self.physics.add_bodies(sun_mass * bodies.mass[self.physics_rows], orbit_positions[self.physics_rows].T,
+                                orbit_velocities[self.physics_rows].T, [bodies.names[row] for row in self.physics_rows])
+
+        self.physics.center_momentum()
+        self.physics_positions = self.physics.positions
+
+        # The simulation works in world space, the rows whose parent is simulated too are placed relative to it
+        self.physics_indices = np.full(len(bodies), -1, dtype=np.int64)
+        self.physics_indices[self.physics_rows] = np.arange(len(self.physics_rows))
+        self.physics_parent_indices = np.where(bodies.parent >= 0, self.physics_indices[bodies.parent], -1)
+
+        if self.physics.integrator == "wisdom-holman":
+            # The orbits around the sun are solved exactly, so the step only has to resolve the innermost orbit
+            innermost = bodies.distance[self.physics_rows][bodies.distance[self.physics_rows] > 0.0].min()
+            period = 2.0 * math.pi * math.sqrt(innermost ** 3 / (self.physics.G * sun_mass))
+            self.physics.max_step = period / self.WISDOM_HOLMAN_STEPS_PER_ORBIT
+
+    def local_positions(self, rows):
+        """
+        Get the positions of bodies relative to their parents at the animation time of the scene graph,
+        from their Kepler orbits, the ephemeris table or the physics simulation.
 
-            if planet.name == "Earth":
-                self.earth_cloud_texture = cloud_texture
+        Args:
+            rows (numpy.ndarray): The rows of the bodies.
 
-        self.diffuse_textures["Saturn Ring"], self.normal_textures["Saturn Ring"], _ = self.load_texture(self.saturn_ring.diffuse_path, self.saturn_ring.normal_path)
-        self.diffuse_textures["Moon"], self.normal_textures["Moon"], _ = self.load_texture(self.moon.diffuse_path, self.moon.normal_path)
+        Returns:
+            numpy.ndarray: The positions, shape (len(rows), 3).
+        """
+        time = self.scene.time
+        positions = np.zeros((len(rows), 3))
+
+        indices = self.orbit_indices[rows]
+        covered = indices >= 0
+        positions[covered] = self.orbits.positions(time, indices[covered])
+
+        if self.ephemeris is not None:
+            indices = self.ephemeris_indices[rows]
+            covered = indices >= 0
+            if np.any(covered):
+                positions[covered] = self.ephemeris.positions(time)[indices[covered]]
+
+        if self.physics is not None:
+            indices = self.physics_indices[rows]
+            covered = indices >= 0
+            positions[covered] = self.physics_positions[:, indices[covered]].T
+            parents = self.physics_parent_indices[rows]
+            relative = covered & (parents >= 0)
+            positions[relative] -= self.physics_positions[:, parents[relative]].T
+
+        return positions
+
+    def orbit_world_positions(self, rows, time):
+        """
+        Get the positions of bodies on their Kepler orbits in world space, adding up the orbits of their parents.
 
-        self.sun_diffuse_texture, self.sun_normal_texture, _ = self.load_texture("./resources/sun/diffuse.png", "./resources/sun/normal.png")
-        self.starry_background_texture, _, _ = self.load_texture("./resources/starry_background.png")
+        Args:
+            rows (numpy.ndarray): The rows of the bodies.
+            time (float): The animation time.
 
+        Returns:
+            numpy.ndarray: The positions, shape (len(rows), 3).
+        """
+        positions = np.zeros((len(rows), 3))
+        chain = np.array(rows, dtype=np.int64)
+        while np.any(chain >= 0):
+            linked = np.flatnonzero(chain >= 0)
+            indices = self.orbit_indices[chain[linked]]
+            orbiting = indices >= 0
+            positions[linked[orbiting]] += self.orbits.positions(time, indices[orbiting])
+            chain[linked] = self.bodies.parent[chain[linked]]
+        return positions
 
-    def load_shader_program(self, vertex_shader_path, fragment_shader_path):
+    def load_textures(self):
         """
-        Load and compile the shader program.
+        Load the textures of every body into its texture columns.
+        """
+        if self.texture_arrays:
+            self.load_texture_arrays()
+            return
 
-        Args:
-            vertex_shader_path (str): The path to the vertex shader file.
-            fragment_shader_path (str): The path to the fragment shader file.
+        bodies = self.bodies
+        for index, (diffuse_path, normal_path) in enumerate(zip(bodies.diffuse_paths, bodies.normal_paths)):
+            diffuse_texture, normal_texture, cloud_texture = self.load_texture(diffuse_path, normal_path)
+            bodies.diffuse_texture[index] = diffuse_texture if diffuse_texture is not None else -1
+            bodies.normal_texture[index] = normal_texture if normal_texture is not None else -1
 
-        Returns:
-            int: The shader program ID.
+            if cloud_texture is not None:
+                self.earth_cloud_texture = cloud_texture
+
+    def load_texture_arrays(self):
+        """
+        Load the diffuse and normal maps of every body into two array textures.
+        The texture columns then hold the layer of each map in its array instead of a texture ID.
         """
-        with open(vertex_shader_path, 'r') as f:
-            vertex_src = f.readlines()
+        bodies = self.bodies
+        normal_rows = [index for index, path in enumerate(bodies.normal_paths) if path is not None]
 
-        with open(fragment_shader_path, 'r') as f:
-            fragment_src = f.readlines()
+        try:
+            self.diffuse_array, diffuse_layers = self.textures.load_array(bodies.diffuse_paths)
+            self.normal_array, normal_layers = self.textures.load_array([bodies.normal_paths[index] for index in normal_rows])
+            self.earth_cloud_texture = self.textures.load("./resources/earth/clouds.png")
+        except Exception as e:
+            print(f"Error loading texture: {str(e)}")
+            return
 
-        shader = compileProgram(compileShader(vertex_src, GL_VERTEX_SHADER),
-                                compileShader(fragment_src, GL_FRAGMENT_SHADER))
+        bodies.diffuse_texture[:] = diffuse_layers
+        bodies.normal_texture[normal_rows] = normal_layers
 
-        return shader
+    def texture_paths(self):
+        """
+        Get the paths of every texture used by the scene.
+
+        Returns:
+            list: The texture file paths.
+        """
+        paths = []
+        for diffuse_path, normal_path in zip(self.bodies.diffuse_paths, self.bodies.normal_paths):
+            paths += [diffuse_path] + ([normal_path] if normal_path is not None else [])
+        paths += ["./resources/earth/clouds.png"]
+        return paths
 
     def initGL(self, screen_width=800, screen_height=600):
         """
@@ -106,64 +419,142 @@ class OpenGLWindow:
             screen_width (int, optional): The width of the screen. Defaults to 800.
             screen_height (int, optional): The height of the screen. Defaults to 600.
         """
-        pg.init()
-        pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
-        pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 3)
-        pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 2)
-        pg.display.set_mode((screen_width, screen_height), pg.OPENGL | pg.DOUBLEBUF)
+        # Decode the textures on worker threads while the window, shaders and geometry are created
+        self.init_planets()
+        self.textures.prefetch(self.texture_paths())
+
+        if self.headless is not None:
+            self.context = HeadlessContext(screen_width, screen_height, self.headless)
+            self.context.create()
+        else:
+            pg.init()
+            pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
+            pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 3)
+            pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 2)
+            pg.display.set_mode((screen_width, screen_height), pg.OPENGL | pg.DOUBLEBUF)
+        self.screen_height = screen_height
 
         glEnable(GL_DEPTH_TEST)
         glClearColor(0, 0, 0, 1)
 
-        self.init_planets()
-        self.load_textures()
-
-        # Set up the light sources
-        self.light_colors = np.array([[2, 2, 2]], dtype=np.float32)  # Sun color
-
         self.vao = glGenVertexArrays(1)
         glBindVertexArray(self.vao)
 
-        self.shader = self.load_shader_program("./shaders/simple.vert", "./shaders/simple.frag")
-        glUseProgram(self.shader)
+        # Every variant is compiled at once, or loaded from the program cache
+        programs = ShaderProgram.compile_variants("./shaders/simple.vert", "./shaders/simple.frag",
+                                                  {name: defines for name, (defines, _) in self.SHADER_VARIANTS.items()},
+                                                  self.program_cache)
+        self.programs = [programs[name] for name in self.SHADER_VARIANTS]
+        self.program = self.programs[-1]
+        self.program.use()
+        self.frame_uniforms = {}
+
+        self.sphere = Geometry('./resources/sphere.obj', self.geometry_cache)
+        self.init_sphere_levels('./resources/sphere.obj')
+        if self.instancing:
+            self.instances = InstanceBuffer()
+        if self.gpu_orbits:
+            self.orbit_buffer = OrbitBuffer(self.bodies, self.orbits, self.orbit_indices)
+
+        # Upload the decoded textures as they become ready (when streaming, this happens over the first frames)
+        if not self.texture_arrays:
+            self.textures.upload_pending()
+        self.load_textures()
 
-        self.sphere = Geometry('./resources/sphere.obj')
+        # Set up the light sources, every emissive body lights the tiles of the screen within its range
+        self.light_positions = self.body_positions[self.light_rows]
+        self.light_colors = self.bodies.light_color[self.light_rows]
+        self.light_ranges = TiledLights.ranges(self.light_colors)
+        self.tiled_lights = TiledLights(screen_width, screen_height)
 
-        # Load the textures for each planet
-        for planet in self.planets:
-            diffuse_texture, normal_texture, cloud_texture = self.load_texture(planet.diffuse_path, planet.normal_path)
-            self.diffuse_textures[planet.name] = diffuse_texture
-            self.normal_textures[planet.name] = normal_texture
-            
-            if planet.name == "Earth":
-                self.earth_cloud_texture = cloud_texture
+        # Loading the textures changed the texture bindings behind the shadowed state
+        ShaderProgram.invalidate_bindings()
 
-        # Load the textures for Saturn's ring and the Moon
-        self.diffuse_textures["Saturn Ring"], self.normal_textures["Saturn Ring"], _ = self.load_texture(self.saturn_ring.diffuse_path, self.saturn_ring.normal_path)
-        self.diffuse_textures["Moon"], self.normal_textures["Moon"], _ = self.load_texture(self.moon.diffuse_path, self.moon.normal_path)
+        if self.sim_rate is not None:
+            self.start_simulation()
 
-        # Load the Sun's textures
-        self.sun_diffuse_texture, self.sun_normal_texture, _ = self.load_texture("./resources/sun/diffuse.png", "./resources/sun/normal.png")
+        self.textures.report()
+        print("Setup complete!")
+    
+    def init_sphere_levels(self, filename):
+        """
+        Create the geometry of every level of detail of the sphere, generated from the sphere model and
+        cached with it. The level with the model's subdivisions is the model itself.
 
-        self.starry_background_texture, _, _ = self.load_texture("./resources/starry_background.png")
+        Args:
+            filename (str): The path to the sphere model.
+        """
+        mesh = SphereMesh(self.sphere.vertices, self.sphere.indices)
+        self.sphere_levels = []
+        for subdivisions in self.SPHERE_LEVELS:
+            if subdivisions == mesh.subdivisions:
+                self.sphere_levels.append(self.sphere)
+            else:
+                self.sphere_levels.append(Geometry(filename, self.geometry_cache, lambda _, subdivisions=subdivisions: mesh.build(subdivisions),
+                                                   f"lod{subdivisions}"))
 
-        # Set up the light sources
-        self.light_positions = []
-        self.light_colors = []
+        subdivisions = np.array(self.SPHERE_LEVELS)
+        self.full_level = int(np.argmin(np.abs(subdivisions - mesh.subdivisions)))
+        self.level_triangles = np.array([level.indexCount // 3 for level in self.sphere_levels])
+        # How far the middle of an edge of the silhouette sits inside the sphere, relative to its radius
+        self.level_errors = 1.0 - np.cos(np.pi / (4.0 * subdivisions))
+        self.body_levels = np.full(len(self.bodies), self.full_level, dtype=np.int64)
 
-        for planet in self.planets:
-            if np.any(planet.light_color > 0.0):
-                self.light_positions.append(planet.distance * np.array([math.cos(planet.angle), 0.0, math.sin(planet.angle)], dtype=np.float32))
-                self.light_colors.append(planet.light_color)
+    def select_levels(self, centers, view_matrix, fov, reach=0.0):
+        """
+        Choose the level of detail of every body from its radius on screen, going to a finer level as soon as
+        the current one is too coarse, but only to a coarser one once it is well within the limit, so bodies
+        near a threshold do not switch back and forth. The camera is inside the starry background, which
+        always uses the full model.
 
-        self.light_positions = np.array(self.light_positions, dtype=np.float32)
-        self.light_colors = np.array(self.light_colors, dtype=np.float32)
+        Args:
+            centers (numpy.ndarray): The position of each body, shape (N, 3).
+            view_matrix (numpy.ndarray): The view matrix.
+            fov (float): The vertical field of view in degrees.
+            reach (numpy.ndarray or float, optional): How far each body may be from its position, the body is
+                sized as if it were that much closer. Defaults to 0.0.
+        """
+        bodies = self.bodies
+        if not self.lod:
+            self.body_levels[:] = self.full_level
+        else:
+            depths = -(np.hstack((centers, np.ones((len(centers), 1)))) @ view_matrix)[:, 2] - reach
+            world_radii = self.sphere.radius * bodies.scale.max(axis=1)
+            screen_radii = np.where(depths > world_radii,
+                                    world_radii * self.screen_height / (2.0 * np.maximum(depths, 1e-6) * math.tan(math.radians(fov) / 2.0)),
+                                    float(self.screen_height))
+
+            errors = screen_radii[:, None] * self.level_errors
+            last = len(self.sphere_levels) - 1
+            finer = np.where(np.any(errors <= self.LOD_ERROR, axis=1), np.argmax(errors <= self.LOD_ERROR, axis=1), last)
+            relaxed = errors <= self.LOD_ERROR * self.LOD_HYSTERESIS
+            coarser = np.where(np.any(relaxed, axis=1), np.argmax(relaxed, axis=1), last)
+
+            levels = self.body_levels
+            levels[:] = np.where(finer > levels, finer, np.where(coarser < levels, coarser, levels))
+            levels[bodies.rows(self.BODY_STARRY_BACKGROUND)] = self.full_level
+
+    def cull(self, centers, view_matrix, projection, reach=0.0):
+        """
+        Find the bodies whose bounding spheres are at least partly inside the view frustum, all at once, and
+        count the drawn and culled bodies and the triangles drawn this frame.
+
+        Args:
+            centers (numpy.ndarray): The position of each body, shape (N, 3).
+            view_matrix (numpy.ndarray): The view matrix.
+            projection (numpy.ndarray): The projection matrix.
+            reach (numpy.ndarray or float, optional): How far each body may be from its position, added to
+                its bounding sphere. Defaults to 0.0.
+        """
+        radii = self.sphere.radius * self.bodies.scale.max(axis=1) + reach
+        self.visible = Frustum(view_matrix, projection).visible(centers, radii)
+        self.drawn_count = int(np.count_nonzero(self.visible))
+        self.culled_count = len(self.visible) - self.drawn_count
+        self.triangle_count = int(self.level_triangles[self.body_levels[self.visible]].sum())
 
-        print("Setup complete!")
-    
     def load_texture(self, diffuse_path, normal_path=None):
         """
-        Load a texture from file.
+        Load a texture from file. Files that were already loaded reuse their existing texture.
 
         Args:
             diffuse_path (str): The path to the diffuse texture file.
@@ -173,87 +564,16 @@ class OpenGLWindow:
             tuple: A tuple containing the diffuse texture ID, normal texture ID (if provided), and cloud texture ID (if applicable).
         """
         try:
-            # Load the diffuse texture
-            diffuse_texture = glGenTextures(1)
-            glBindTexture(GL_TEXTURE_2D, diffuse_texture)
-
-            # Set the texture wrapping and filtering parameters for the diffuse texture
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-
-            # Load the diffuse image using PIL
-            diffuse_image = Image.open(diffuse_path)
-            diffuse_data = np.array(list(diffuse_image.getdata()), np.uint8)
-
-            # Determine the color format based on the number of channels
-            if diffuse_image.mode == 'RGB':
-                diffuse_format = GL_RGB
-            elif diffuse_image.mode == 'RGBA':
-                diffuse_format = GL_RGBA
-            else:
-                raise Exception(f"Unsupported image mode: {diffuse_image.mode}")
-
-            # Bind the diffuse texture data to the texture object
-            glTexImage2D(GL_TEXTURE_2D, 0, diffuse_format, diffuse_image.width, diffuse_image.height, 0, diffuse_format, GL_UNSIGNED_BYTE, diffuse_data)
-            glGenerateMipmap(GL_TEXTURE_2D)
+            diffuse_texture = self.textures.load(diffuse_path)
 
             normal_texture = None
             if normal_path is not None:
-                # Load the normal texture
-                normal_texture = glGenTextures(1)
-                glBindTexture(GL_TEXTURE_2D, normal_texture)
-
-                # Set the texture wrapping and filtering parameters for the normal texture
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-
-                # Load the normal image using PIL
-                normal_image = Image.open(normal_path)
-                normal_data = np.array(list(normal_image.getdata()), np.uint8)
-
-                # Determine the color format based on the number of channels
-                if normal_image.mode == 'RGB':
-                    normal_format = GL_RGB
-                elif normal_image.mode == 'RGBA':
-                    normal_format = GL_RGBA
-                else:
-                    raise Exception(f"Unsupported image mode: {normal_image.mode}")
-
-                # Bind the normal texture data to the texture object
-                glTexImage2D(GL_TEXTURE_2D, 0, normal_format, normal_image.width, normal_image.height, 0, normal_format, GL_UNSIGNED_BYTE, normal_data)
-                glGenerateMipmap(GL_TEXTURE_2D)
+                normal_texture = self.textures.load(normal_path)
 
             cloud_texture = None
             if diffuse_path == "./resources/earth/diffuse.png":
                 # Load the cloud texture only for Earth
-                cloud_texture = glGenTextures(1)
-                glBindTexture(GL_TEXTURE_2D, cloud_texture)
-                
-                # Set the texture wrapping and filtering parameters for the cloud texture
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-                
-                # Load the cloud image using PIL
-                cloud_image = Image.open("./resources/earth/clouds.png")
-                cloud_data = np.array(list(cloud_image.getdata()), np.uint8)
-                
-                # Determine the color format based on the number of channels
-                if cloud_image.mode == 'RGB':
-                    cloud_format = GL_RGB
-                elif cloud_image.mode == 'RGBA':
-                    cloud_format = GL_RGBA
-                else:
-                    raise Exception(f"Unsupported image mode: {cloud_image.mode}")
-                
-                # Bind the cloud texture data to the texture object
-                glTexImage2D(GL_TEXTURE_2D, 0, cloud_format, cloud_image.width, cloud_image.height, 0, cloud_format, GL_UNSIGNED_BYTE, cloud_data)
-                glGenerateMipmap(GL_TEXTURE_2D)
+                cloud_texture = self.textures.load("./resources/earth/clouds.png")
 
             return diffuse_texture, normal_texture, cloud_texture
 
@@ -286,13 +606,44 @@ class OpenGLWindow:
         Toggle the animation on/off.
         """
         self.animation_running = not self.animation_running
+        if self.simulation is not None:
+            self.simulation.running = self.animation_running
+
+    def start_simulation(self):
+        """
+        Start advancing the animation and physics on the simulation thread, at sim_rate steps per second.
+        From then on the physics state belongs to that thread, and the frames only read its snapshots.
+        """
+        interval = 1.0 / self.sim_rate
+        if self.time_warp is None:
+            animation_step = self.ANIMATION_SPEED * interval
+        else:
+            animation_step = interval * self.time_warp * (2.0 * math.pi / self.earth_speed) / self.SECONDS_PER_YEAR
+
+        self.simulation = Simulation(self.sim_rate, animation_step, self.CLOUD_ANIMATION_SPEED * interval, self.physics,
+                                     self.animation_time, self.cloud_animation_time)
+        self.simulation.running = self.animation_running
+        self.simulation.start()
 
     def render(self):
         """
         Render the scene.
+
+        Returns:
+            numpy.ndarray: When headless, the oldest frame whose readback has finished, shape (height, width, 3),
+                or None while the first readbacks are in flight. Otherwise None.
         """
+        ShaderProgram.begin_frame()
+        self.gl_calls = ShaderProgram.last_frame_calls
+
+        if self.textures.update():
+            ShaderProgram.invalidate_bindings()
+
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glUseProgram(self.shader)
+
+        # The uniforms of the whole frame, given to the program of every shader variant when it is first used
+        uniforms = self.frame_uniforms = {}
+        self.current_variant = None
 
         # Set up the projection matrix
         aspect_ratio = 640.0 / 480.0
@@ -301,8 +652,7 @@ class OpenGLWindow:
         fov = 45.0
 
         projection = pyrr.matrix44.create_perspective_projection(fov, aspect_ratio, near_plane, far_plane)
-        projection_loc = glGetUniformLocation(self.shader, "projection")
-        glUniformMatrix4fv(projection_loc, 1, GL_FALSE, projection)
+        uniforms["projection"] = projection
 
         # Set up the view matrix based on camera rotation angles
         view_matrix = pyrr.matrix44.create_identity()
@@ -311,8 +661,7 @@ class OpenGLWindow:
         view_matrix = pyrr.matrix44.multiply(view_matrix, pyrr.matrix44.create_from_z_rotation(self.camera_rotation_z))
         view_matrix = pyrr.matrix44.multiply(view_matrix, pyrr.matrix44.create_from_translation(pyrr.Vector3([0.0, 0.0, -self.camera_distance])))
 
-        view_loc = glGetUniformLocation(self.shader, "view")
-        glUniformMatrix4fv(view_loc, 1, GL_FALSE, view_matrix)
+        uniforms["view"] = view_matrix
 
         # Calculate the camera position based on the rotation angles
         camera_position = pyrr.Vector3([
@@ -322,15 +671,24 @@ class OpenGLWindow:
         ])
 
         # Set the camera position as the viewPos uniform
-        glUniform3fv(glGetUniformLocation(self.shader, "viewPos"), 1, camera_position)
+        uniforms["viewPos"] = camera_position
 
 
-        # Update the animation time if the animation is running
-        if self.animation_running:
-            self.animation_time += 0.001
-            self.cloud_animation_time += 0.01
+        # Update the animation time if the animation is running, or take it from the simulation thread
+        if self.simulation is not None:
+            self.animation_time, self.cloud_animation_time, positions = self.simulation.interpolate()
+            if positions is not None:
+                self.physics_positions = positions
+        else:
+            animation_step = self.animation_step()
+            if self.animation_running:
+                self.animation_time += animation_step
+                self.cloud_animation_time += 0.01
+                if self.physics is not None:
+                    self.physics.advance(animation_step)
+                    self.physics_positions = self.physics.positions
 
-        glUniform1f(glGetUniformLocation(self.shader, "cloudAnimationTime"), self.cloud_animation_time)
+        uniforms["cloudAnimationTime"] = self.cloud_animation_time
 
         # Calculate the Earth and Moon angles based on the animation time
         self.earth_angle = self.earth_speed * self.animation_time
@@ -341,183 +699,263 @@ class OpenGLWindow:
         self.earth_rotation_angle = self.earth_rotation_speed * self.animation_time
         self.moon_rotation_angle = self.moon_rotation_speed * self.animation_time
 
-        # Bind the Sun textures
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, self.sun_diffuse_texture)
-        glUniform1i(glGetUniformLocation(self.shader, "diffuseTexture"), 0)
-
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_2D, self.sun_normal_texture)
-        glUniform1i(glGetUniformLocation(self.shader, "normalTexture"), 1)
-
-        sun_ka = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-        sun_kd = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-        sun_ks = np.array([1.0, 1.0, 1.0], dtype=np.float32)
-        sun_shininess = 80.0
-
-        sun_position = pyrr.Vector3([0.0, 0.0, 0.0])
-        sun_radius = 2.0
-        sun_color = np.array([2, 2, 2], dtype=np.float32)
-        
-        glUniform3fv(glGetUniformLocation(self.shader, "sunPosition"), 1, sun_position)
-        glUniform1f(glGetUniformLocation(self.shader, "sunRadius"), sun_radius)
-        glUniform3fv(glGetUniformLocation(self.shader, "sunColor"), 1, sun_color)
-
-        # Draw the Sun
-        sun_model = pyrr.matrix44.create_identity()
-        sun_model = pyrr.matrix44.multiply(sun_model, pyrr.matrix44.create_from_y_rotation(self.sun_rotation_angle))
-        sun_model = pyrr.matrix44.multiply(sun_model, pyrr.matrix44.create_from_translation(sun_position))
-        sun_model = pyrr.matrix44.multiply(sun_model, pyrr.matrix44.create_from_scale(pyrr.Vector3([sun_radius, sun_radius, sun_radius])))
-        self.draw_object(self.sphere, sun_model, sun_ka, sun_kd, sun_ks, sun_shininess, is_sun=True)
-
-        # Draw the Planets
-        for planet in self.planets:
-            planet.angle = planet.speed * self.animation_time
-            planet.rotation_angle = planet.rotation_speed * self.animation_time
-
-            # Bind the planet textures
-            glActiveTexture(GL_TEXTURE0)
-            glBindTexture(GL_TEXTURE_2D, self.diffuse_textures[planet.name])
-            glUniform1i(glGetUniformLocation(self.shader, "diffuseTexture"), 0)
-
-            glActiveTexture(GL_TEXTURE1)
-            glBindTexture(GL_TEXTURE_2D, self.normal_textures[planet.name])
-            glUniform1i(glGetUniformLocation(self.shader, "normalTexture"), 1)
-
-            if planet.name == "Mercury":
-                planet_ka = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-                planet_kd = np.array([0.4, 0.4, 0.4], dtype=np.float32)
-                planet_ks = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-                planet_shininess = 16.0
-            elif planet.name == "Venus":
-                planet_ka = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-                planet_kd = np.array([0.8, 0.6, 0.4], dtype=np.float32)
-                planet_ks = np.array([0.4, 0.3, 0.2], dtype=np.float32)
-                planet_shininess = 32.0
-            elif planet.name == "Earth":
-                planet_ka = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-                planet_kd = np.array([0.0, 0.5, 1.0], dtype=np.float32)
-                planet_ks = np.array([0.3, 0.3, 0.3], dtype=np.float32)
-                planet_shininess = 64.0
-            elif planet.name == "Mars":
-                planet_ka = np.array([0.2, 0.1, 0.1], dtype=np.float32)
-                planet_kd = np.array([0.8, 0.4, 0.1], dtype=np.float32)
-                planet_ks = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-                planet_shininess = 32.0
-            elif planet.name == "Jupiter":
-                planet_ka = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-                planet_kd = np.array([0.8, 0.6, 0.4], dtype=np.float32)
-                planet_ks = np.array([0.4, 0.4, 0.4], dtype=np.float32)
-                planet_shininess = 128.0
-            elif planet.name == "Saturn":
-                planet_ka = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-                planet_kd = np.array([0.8, 0.7, 0.5], dtype=np.float32)
-                planet_ks = np.array([0.5, 0.5, 0.5], dtype=np.float32)
-                planet_shininess = 128.0
-            elif planet.name == "Uranus":
-                planet_ka = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-                planet_kd = np.array([0.6, 0.8, 0.9], dtype=np.float32)
-                planet_ks = np.array([0.4, 0.4, 0.4], dtype=np.float32)
-                planet_shininess = 64.0
-            elif planet.name == "Neptune":
-                planet_ka = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-                planet_kd = np.array([0.6, 0.6, 0.6], dtype=np.float32)
-                planet_ks = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-                planet_shininess = 16.0
-
-            planet_model = pyrr.matrix44.create_from_y_rotation(planet.angle)
-            planet_model = pyrr.matrix44.multiply(planet_model, pyrr.matrix44.create_from_y_rotation(planet.rotation_angle))
-            planet_model = pyrr.matrix44.multiply(planet_model, pyrr.matrix44.create_from_scale(pyrr.Vector3([planet.radius, planet.radius, planet.radius])))
-            planet_model = pyrr.matrix44.multiply(planet_model, pyrr.matrix44.create_from_translation(pyrr.Vector3([planet.distance * math.cos(planet.angle), 0.0, planet.distance * math.sin(planet.angle)])))
-
-            if planet.name == "Earth":
-                self.draw_object(self.sphere, planet_model, planet_ka, planet_kd, planet_ks, planet_shininess, planet=planet)
+        # The positions, angles and model and normal matrices of every body are kept by the scene graph,
+        # which only recomputes the bodies that changed, all of them at once. With the orbits on the GPU the
+        # scene graph keeps the transforms of time 0, which the shader does not read.
+        bodies = self.bodies
+        if self.gpu_orbits:
+            uniforms["orbitTime"] = self.orbit_buffer.update(self.animation_time)
+            updated = np.empty(0, dtype=np.int64)
+        else:
+            self.scene.set_time(self.animation_time)
+            updated = self.scene.update(self.local_positions)
+        self.body_positions = self.scene.world_positions
+        models, normal_matrices = self.scene.models, self.scene.normal_matrices
+
+        sun_position = self.body_positions[self.sun_row]
+        uniforms["sunPosition"] = sun_position
+        uniforms["sunRadius"] = bodies.radius[self.sun_row]
+        uniforms["sunColor"] = np.array([2, 2, 2], dtype=np.float32)
+
+        if self.gpu_orbits:
+            self.select_levels(self.orbit_centers, view_matrix, fov, self.orbit_reach)
+            self.cull(self.orbit_centers, view_matrix, projection, self.orbit_reach)
+        else:
+            # The translation sits in the last row of the (row-major) model matrices
+            self.select_levels(models[:, 3, :3], view_matrix, fov)
+            self.cull(models[:, 3, :3], view_matrix, projection)
+
+        if self.textures.streaming:
+            for index, model in enumerate(models):
+                textures = [bodies.diffuse_texture[index], bodies.normal_texture[index]]
+                if bodies.flags[index] & self.BODY_EARTH:
+                    textures.append(self.earth_cloud_texture)
+                self.stream_textures([int(texture) for texture in textures if texture >= 0], model, bodies.radius[index], view_matrix, fov)
+
+        uniforms["diffuseTexture"] = 0
+        uniforms["normalTexture"] = 1
+        uniforms["cloudTexture"] = 2
+        uniforms["diffuseTextures"] = self.DIFFUSE_ARRAY_UNIT
+        uniforms["normalTextures"] = self.NORMAL_ARRAY_UNIT
+        uniforms["orbitElements"] = self.ORBIT_UNIT
+        uniforms["useTextureArrays"] = 1 if self.texture_arrays else 0
+
+        # The lights shade the frame from where they were at the end of the last one
+        self.tiled_lights.update(self.light_positions, self.light_ranges, self.light_colors, view_matrix, projection)
+        uniforms["lights"] = self.LIGHT_UNIT
+        uniforms["tileLights"] = self.TILE_LIGHT_UNIT
+        uniforms["tileSize"] = self.tiled_lights.tile_size
+        uniforms["tileCountX"] = self.tiled_lights.tile_counts[0]
+        ShaderProgram.bind_texture(self.LIGHT_UNIT, self.tiled_lights.light_texture, GL_TEXTURE_BUFFER)
+        ShaderProgram.bind_texture(self.TILE_LIGHT_UNIT, self.tiled_lights.tile_texture, GL_TEXTURE_BUFFER)
+
+        if self.texture_arrays:
+            ShaderProgram.bind_texture(self.DIFFUSE_ARRAY_UNIT, self.diffuse_array, GL_TEXTURE_2D_ARRAY)
+            ShaderProgram.bind_texture(self.NORMAL_ARRAY_UNIT, self.normal_array, GL_TEXTURE_2D_ARRAY)
+
+        if self.instancing:
+            self.draw_instanced(models, normal_matrices, updated)
+        else:
+            self.draw_bodies(models, normal_matrices)
+
+        # Update the light positions based on the planet positions, for the next frame
+        if self.gpu_orbits:
+            self.light_positions = self.orbit_world_positions(self.light_rows, self.animation_time)
+        elif len(updated):
+            self.light_positions = self.body_positions[self.light_rows]
+
+        if self.headless is not None:
+            return self.context.read_frame()
+        pg.display.flip()
+
+    def seek(self, animation_time):
+        """
+        Jump the animation to a time, for rendering frames at exact times with the animation paused. The cloud
+        animation time follows at its usual rate. The physics simulation can only be advanced to the time.
+
+        Args:
+            animation_time (float): The animation time.
+        """
+        self.animation_time = animation_time
+        self.cloud_animation_time = animation_time * self.CLOUD_ANIMATION_SPEED / self.ANIMATION_SPEED
+        if self.physics is not None:
+            if animation_time < self.physics.time:
+                warnings.warn("WARNING: The physics simulation cannot go back in time, it stays where it is")
+            self.physics.advance(animation_time - self.physics.time)
+            self.physics_positions = self.physics.positions
+
+    def animation_step(self):
+        """
+        Get the animation time that passes in this frame.
+
+        Returns:
+            float: The fixed step of 0.001, or with a time warp, the wall clock time since the last frame
+                scaled to animation time (Earth's orbit, 2 pi / earth_speed, being a year).
+        """
+        now = time.perf_counter()
+        elapsed = 0.0 if self.last_frame_time is None else min(now - self.last_frame_time, 0.1)
+        self.last_frame_time = now
+
+        if self.time_warp is None:
+            return 0.001
+
+        year = 2.0 * math.pi / self.earth_speed
+        return elapsed * self.time_warp * year / self.SECONDS_PER_YEAR
+
+    def stream_textures(self, textures, model, radius, view_matrix, fov):
+        """
+        Tell the texture streamer how large an object is on screen, so its textures are streamed in by size.
+
+        Args:
+            textures (tuple): The texture IDs used by the object.
+            model (numpy.ndarray): The model matrix of the object.
+            radius (float): The scale the sphere geometry is drawn at.
+            view_matrix (numpy.ndarray): The view matrix.
+            fov (float): The vertical field of view in degrees.
+        """
+        if not self.textures.streaming:
+            return
+
+        # The translation sits in the last row of the (row-major) model matrix
+        center = np.append(model[3, :3], 1.0) @ view_matrix
+        depth = -center[2]
+        world_radius = radius * self.sphere.radius
+
+        if depth <= world_radius:
+            # The camera is inside (or right next to) the object, it fills the screen
+            screen_radius = float(self.screen_height)
+        else:
+            screen_radius = world_radius * self.screen_height / (2.0 * depth * math.tan(math.radians(fov) / 2.0))
+
+        for texture in textures:
+            self.textures.prioritize(texture, screen_radius)
+
+    def use_variant(self, variant):
+        """
+        Make the program of a shader variant current, giving it the uniforms of the frame it does not hold yet.
+
+        Args:
+            variant (int): The index of the variant.
+        """
+        if variant == self.current_variant:
+            return
+        self.current_variant = variant
+        self.program = self.programs[variant]
+        self.program.use()
+        self.program.set_all(self.frame_uniforms)
+
+    def draw_bodies(self, models, normal_matrices):
+        """
+        Draw the visible bodies one at a time, setting their transforms and materials as uniforms. The bodies
+        are drawn by shader variant, so every program is used once.
+
+        Args:
+            models (numpy.ndarray): The model matrix of each body.
+            normal_matrices (numpy.ndarray): The normal matrix of each body.
+        """
+        self.frame_uniforms["useInstancing"] = 0
+
+        bodies = self.bodies
+        visible = np.flatnonzero(self.visible)
+        for index in visible[np.argsort(self.body_variants[visible], kind="stable")]:
+            self.use_variant(self.body_variants[index])
+            model, normal_matrix = models[index], normal_matrices[index]
+            diffuse_texture, normal_texture, flags = int(bodies.diffuse_texture[index]), int(bodies.normal_texture[index]), int(bodies.flags[index])
+            if self.texture_arrays:
+                self.program.set("diffuseLayer", diffuse_texture)
+                if normal_texture >= 0:
+                    self.program.set("normalLayer", normal_texture)
             else:
-                self.draw_object(self.sphere, planet_model, planet_ka, planet_kd, planet_ks, planet_shininess)
-    
+                ShaderProgram.bind_texture(0, diffuse_texture)
+                if normal_texture >= 0:
+                    ShaderProgram.bind_texture(1, normal_texture)
 
-        # Draw Saturn's Ring
-        saturn = next((planet for planet in self.planets if planet.name == "Saturn"), None)
-        if saturn:
-            # Bind Saturn's Ring textures
-            glActiveTexture(GL_TEXTURE0)
-            glBindTexture(GL_TEXTURE_2D, self.diffuse_textures["Saturn Ring"])
-            glUniform1i(glGetUniformLocation(self.shader, "diffuseTexture"), 0)
-
-            glActiveTexture(GL_TEXTURE1)
-            glBindTexture(GL_TEXTURE_2D, self.normal_textures["Saturn Ring"])
-            glUniform1i(glGetUniformLocation(self.shader, "normalTexture"), 1)
-
-            ring_ka = np.array([1, 1, 1], dtype=np.float32)
-            ring_kd = np.array([0.8, 0.8, 0.8], dtype=np.float32)
-            ring_ks = np.array([0.2, 0.2, 0.2], dtype=np.float32)
-            ring_shininess = 100.0
-
-            ring_model = pyrr.matrix44.create_from_y_rotation(saturn.angle)
-            ring_model = pyrr.matrix44.multiply(ring_model, pyrr.matrix44.create_from_scale(pyrr.Vector3([self.saturn_ring.radius, 0.1, self.saturn_ring.radius])))
-            ring_model = pyrr.matrix44.multiply(ring_model, pyrr.matrix44.create_from_translation(pyrr.Vector3([saturn.distance * math.cos(saturn.angle), 0.0, saturn.distance * math.sin(saturn.angle)])))
-
-            self.draw_object(self.sphere, ring_model, ring_ka, ring_kd, ring_ks, ring_shininess, is_saturn_ring=True)
-
-        # Draw the Moon relative to Earth
-        earth = next((planet for planet in self.planets if planet.name == "Earth"), None)
-        if earth:
-            moon_angle = self.moon.speed * self.animation_time
-            moon_rotation_angle = self.moon.rotation_speed * self.animation_time
-
-           # Bind the Moon textures
-            glActiveTexture(GL_TEXTURE0)
-            glBindTexture(GL_TEXTURE_2D, self.diffuse_textures["Moon"])
-            glUniform1i(glGetUniformLocation(self.shader, "diffuseTexture"), 0)
-
-            glActiveTexture(GL_TEXTURE1)
-            glBindTexture(GL_TEXTURE_2D, self.normal_textures["Moon"])
-            glUniform1i(glGetUniformLocation(self.shader, "normalTexture"), 1)
-
-            moon_ka = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-            moon_kd = np.array([0.6, 0.6, 0.6], dtype=np.float32)
-            moon_ks = np.array([0.1, 0.1, 0.1], dtype=np.float32)
-            moon_shininess = 16.0
-
-            moon_position = earth.distance * np.array([math.cos(earth.angle), 0.0, math.sin(earth.angle)], dtype=np.float32)
-            moon_orbit_position = self.moon.distance * np.array([math.cos(moon_angle), 0.0, math.sin(moon_angle)], dtype=np.float32)
-
-            moon_model = pyrr.matrix44.create_from_y_rotation(moon_angle)
-            moon_model = pyrr.matrix44.multiply(moon_model, pyrr.matrix44.create_from_y_rotation(moon_rotation_angle))
-            moon_model = pyrr.matrix44.multiply(moon_model, pyrr.matrix44.create_from_scale(pyrr.Vector3([self.moon.radius, self.moon.radius, self.moon.radius])))
-            moon_model = pyrr.matrix44.multiply(moon_model, pyrr.matrix44.create_from_translation(moon_position + moon_orbit_position))
-
-            self.draw_object(self.sphere, moon_model, moon_ka, moon_kd, moon_ks, moon_shininess)
-
-        # Bind the starry background texture
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, self.starry_background_texture)
-        glUniform1i(glGetUniformLocation(self.shader, "diffuseTexture"), 0)
-
-        # Create a large sphere encompassing the scene
-        background_radius = 50
-        background_model = pyrr.matrix44.create_identity()
-        background_model = pyrr.matrix44.multiply(background_model, pyrr.matrix44.create_from_translation(pyrr.Vector3([0.0, 0.0, 0.0])))
-        background_model = pyrr.matrix44.create_from_scale(pyrr.Vector3([background_radius, background_radius, background_radius]))
-
-        # Draw the starry background sphere
-        self.draw_object(self.sphere, background_model, None, None, None, None, is_starry_background=True)
-
-        # Update the light positions based on the planet positions
-        self.light_positions = []
-        for planet in self.planets:
-            if np.any(planet.light_color > 0.0):
-                planet_position = planet.distance * np.array([math.cos(planet.angle), 0.0, math.sin(planet.angle)], dtype=np.float32)
-                self.light_positions.append(planet_position)
-        self.light_positions = np.array(self.light_positions, dtype=np.float32)
+            self.draw_object(self.sphere_levels[self.body_levels[index]], model, bodies.ka[index], bodies.kd[index], bodies.ks[index], bodies.shininess[index], normal_matrix,
+                             is_starry_background=bool(flags & self.BODY_STARRY_BACKGROUND),
+                             planet=Planet(bodies, index) if flags & self.BODY_EARTH else None)
 
-        # Set the shader uniform variables for the light sources
-        glUniform3fv(glGetUniformLocation(self.shader, "lightPositions"), len(self.light_positions), self.light_positions)
-        glUniform3fv(glGetUniformLocation(self.shader, "lightColors"), len(self.light_colors), self.light_colors)
+    def draw_instanced(self, models, normal_matrices, updated):
+        """
+        Draw the bodies as instances of the sphere. The transforms and materials of every body are kept in
+        one buffer, filled a column at a time, and only the records of the bodies that changed are
+        rewritten. The bodies are ordered by shader variant, so every program is used once, and the visible
+        bodies sharing the same variant, textures and level of detail are drawn with one call. With texture
+        arrays every body selects its own layers, so only the variant, the level of detail and the culled
+        bodies split the calls.
 
-        pg.display.flip()
+        Args:
+            models (numpy.ndarray): The model matrix of each body.
+            normal_matrices (numpy.ndarray): The normal matrix of each body.
+            updated (numpy.ndarray): The rows of the bodies that changed since the last frame.
+        """
+        bodies = self.bodies
+        count = len(bodies)
 
-    def draw_object(self, obj, model, ka, kd, ks, shininess, is_sun=False, is_saturn_ring=False, is_starry_background=False, planet=None):
+        # The draw order, the bodies grouped by their shader variants and textures, is fixed once the textures are loaded
+        if self.instance_order is None:
+            if self.texture_arrays:
+                self.instance_order = np.argsort(self.body_variants, kind="stable")
+            else:
+                self.instance_order = np.lexsort((np.maximum(bodies.normal_texture, 0), bodies.diffuse_texture, self.body_variants))
+            self.instance_slots = np.empty(count, dtype=np.int64)
+            self.instance_slots[self.instance_order] = np.arange(count)
+            self.instance_data = np.zeros(count, dtype=InstanceBuffer.DTYPE)
+            updated = np.arange(count)
+
+        if len(updated):
+            slots = self.instance_slots[updated]
+            data = self.instance_data
+            data["model"][slots] = models[updated]
+            data["normal_matrix"][slots] = normal_matrices[updated]
+            data["ka"][slots] = bodies.ka[updated]
+            data["kd"][slots] = bodies.kd[updated]
+            data["ks"][slots] = bodies.ks[updated]
+            data["params"][slots, 0] = bodies.shininess[updated]
+            if self.texture_arrays:
+                data["params"][slots, 1] = bodies.diffuse_texture[updated]
+                data["params"][slots, 2] = np.maximum(bodies.normal_texture[updated], 0)
+            data["params"][slots, 3] = bodies.flags[updated]
+            data["row"][slots, 0] = updated
+
+            # A few records are overwritten in place, most of the buffer is respecified to get fresh storage
+            first, end = slots.min(), slots.max() + 1
+            if 2 * (end - first) < count:
+                self.instances.update(data[first:end], first)
+            else:
+                self.instances.upload(data)
+
+        uniforms = self.frame_uniforms
+        for index in bodies.rows(self.BODY_EARTH):
+            uniforms["atmosphereThickness"] = bodies.atmosphere_thickness[index]
+            uniforms["atmosphereColor"] = bodies.atmosphere_color[index]
+
+        uniforms["useInstancing"] = 1
+        uniforms["useGpuOrbits"] = 1 if self.gpu_orbits else 0
+        ShaderProgram.bind_texture(2, self.earth_cloud_texture)
+        if self.gpu_orbits:
+            ShaderProgram.bind_texture(self.ORBIT_UNIT, self.orbit_buffer.texture, GL_TEXTURE_BUFFER)
+
+        order = self.instance_order
+        variants = self.body_variants[order]
+        levels = self.body_levels[order]
+        visible = self.visible[order]
+        changes = (variants[1:] != variants[:-1]) | (levels[1:] != levels[:-1]) | (visible[1:] != visible[:-1])
+        if not self.texture_arrays:
+            diffuse_textures = bodies.diffuse_texture[order]
+            normal_textures = bodies.normal_texture[order]
+            changes |= (diffuse_textures[1:] != diffuse_textures[:-1]) | (normal_textures[1:] != normal_textures[:-1])
+        starts = np.concatenate(([0], np.flatnonzero(changes) + 1, [count]))
+        for first, end in zip(starts[:-1], starts[1:]):
+            if not visible[first]:
+                continue
+            self.use_variant(variants[first])
+            if not self.texture_arrays:
+                ShaderProgram.bind_texture(0, int(diffuse_textures[first]))
+                if normal_textures[first] >= 0:
+                    ShaderProgram.bind_texture(1, int(normal_textures[first]))
+            self.instances.draw(self.sphere_levels[levels[first]], int(first), int(end - first))
+
+    def draw_object(self, obj, model, ka, kd, ks, shininess, normal_matrix=None, is_starry_background=False, planet=None):
         """
         Draw an object using the provided model matrix and material properties.
 
@@ -528,61 +966,48 @@ class OpenGLWindow:
             kd (numpy.ndarray): The diffuse reflection coefficient.
             ks (numpy.ndarray): The specular reflection coefficient.
             shininess (float): The shininess exponent.
-            is_sun (bool, optional): Whether the object is the sun. Defaults to False.
-            is_saturn_ring (bool, optional): Whether the object is Saturn's ring. Defaults to False.
+            normal_matrix (numpy.ndarray, optional): The normal matrix, computed from the model matrix if not given. Defaults to None.
             is_starry_background (bool, optional): Whether the object is the starry background. Defaults to False.
             planet (Planet, optional): The planet object, if applicable. Defaults to None.
         """
-        model_loc = glGetUniformLocation(self.shader, "model")
-        glUniformMatrix4fv(model_loc, 1, GL_FALSE, model)
+        self.program.set("model", model)
 
         if planet is not None:
-            atmosphere_thickness_loc = glGetUniformLocation(self.shader, "atmosphereThickness")
-            glUniform1f(atmosphere_thickness_loc, planet.atmosphere_thickness)
-
-            atmosphere_color_loc = glGetUniformLocation(self.shader, "atmosphereColor")
-            glUniform3fv(atmosphere_color_loc, 1, planet.atmosphere_color)
+            self.program.set("atmosphereThickness", planet.atmosphere_thickness)
+            self.program.set("atmosphereColor", planet.atmosphere_color)
 
-        normal_matrix = pyrr.matrix33.create_from_matrix44(pyrr.matrix44.inverse(model.T))
-        glUniformMatrix3fv(glGetUniformLocation(self.shader, "normalMatrix"), 1, GL_FALSE, normal_matrix)
+        if normal_matrix is None:
+            normal_matrix = pyrr.matrix33.create_from_matrix44(pyrr.matrix44.inverse(model.T))
+        self.program.set("normalMatrix", normal_matrix)
 
         if not is_starry_background:
-            ka_loc = glGetUniformLocation(self.shader, "ka")
-            glUniform3fv(ka_loc, 1, ka)
+            self.program.set("ka", ka)
+            self.program.set("kd", kd)
+            self.program.set("ks", ks)
+            self.program.set("shininess", shininess)
 
-            kd_loc = glGetUniformLocation(self.shader, "kd")
-            glUniform3fv(kd_loc, 1, kd)
-
-            ks_loc = glGetUniformLocation(self.shader, "ks")
-            glUniform3fv(ks_loc, 1, ks)
-
-            shininess_loc = glGetUniformLocation(self.shader, "shininess")
-            glUniform1f(shininess_loc, shininess)
-
-        is_sun_loc = glGetUniformLocation(self.shader, "isSun")
-        glUniform1i(is_sun_loc, 1 if is_sun else 0)
-
-        is_saturn_ring_loc = glGetUniformLocation(self.shader, "isSaturnRing")
-        glUniform1i(is_saturn_ring_loc, 1 if is_saturn_ring else 0)
-
-        is_starry_background_loc = glGetUniformLocation(self.shader, "isStarryBackground")
-        glUniform1i(is_starry_background_loc, 1 if is_starry_background else 0)
-
-        if planet is not None and planet.name == "Earth":
-            glActiveTexture(GL_TEXTURE2)
-            glBindTexture(GL_TEXTURE_2D, self.earth_cloud_texture)
-            glUniform1i(glGetUniformLocation(self.shader, "cloudTexture"), 2)
-            
-            glUniform1i(glGetUniformLocation(self.shader, "isEarth"), 1)
-        else:
-            glUniform1i(glGetUniformLocation(self.shader, "isEarth"), 0)
+        if planet is not None and planet.flags & self.BODY_EARTH:
+            ShaderProgram.bind_texture(2, self.earth_cloud_texture)
 
-        glDrawArrays(GL_TRIANGLES, 0, obj.vertexCount)
+        obj.bind()
+        glDrawElements(GL_TRIANGLES, obj.indexCount, GL_UNSIGNED_INT, ctypes.c_void_p(0))
 
     def cleanup(self):
         """
         Clean up the OpenGL resources.
         """
-        self.sphere.cleanup()
-        glDeleteProgram(self.shader)
-        glDeleteVertexArrays(1, (self.vao,))
\ No newline at end of file
+        if self.simulation is not None:
+            self.simulation.stop()
+        for level in self.sphere_levels:
+            level.cleanup()
+        if self.instancing:
+            self.instances.cleanup()
+        if self.gpu_orbits:
+            self.orbit_buffer.cleanup()
+        self.tiled_lights.cleanup()
+        self.textures.cleanup()
+        for program in self.programs:
+            program.cleanup()
+        glDeleteVertexArrays(1, (self.vao,))
+        if self.headless is not None:
+            self.context.cleanup()
\ No newline at end of file
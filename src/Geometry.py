@@ -1,24 +1,63 @@
 import numpy as np
 import warnings
 
+from itertools import chain
 from OpenGL.GL import *
 
 class Geometry:
-    def __init__(self, filename):
-        # Vertices stores all of the model data per face in the following format:
+    # The geometry the vertex attributes and element buffer of the vertex array object point at
+    bound = None
+
+    def __init__(self, filename, cache=None, parse=None, variant=None):
+        # Vertices stores the deduplicated model data per vertex in the following format:
         # vertex_x, vertex_y, vertex_z, texture_s, texture_t, normal_x, normal_y, normal_z
         # Each value is a 32bit float
         # This means that if you wanted to get all of the vertex data:
         # Your start index would be 0, size would be 3 (x, y , x) and your stride would be 32
-
-        self.vertices = self.LoadFile(filename)
+        #
+        # Indices stores three 32bit unsigned vertex indices per triangle, so vertices shared
+        # between faces are only stored (and uploaded) once.
+        #
+        # When a GeometryCache is given, unchanged files are memory mapped from the cache
+        # and handed straight to glBufferData instead of being parsed again.
+        #
+        # A model can also be generated from the file by parse, called with the filename in place
+        # of LoadFile, and is cached under its variant name.
+
+        parse = parse or self.LoadFile
+        if cache is not None:
+            self.vertices, self.indices = cache.load(filename, parse, variant)
+        else:
+            self.vertices, self.indices = parse(filename)
         self.vertexCount = len(self.vertices) // 8
-        self.vertices = np.array(self.vertices, dtype=np.float32)
+        self.indexCount = len(self.indices)
+
+        # Radius of the bounding sphere around the model origin
+        self.radius = float(np.linalg.norm(self.vertices.reshape(-1, 8)[:, :3], axis=1).max())
 
         self.vbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
         glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
 
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+
+        Geometry.bound = None
+        self.bind()
+
+    def bind(self):
+        """
+        Point the vertex attributes and the element buffer of the currently bound vertex array object
+        at this geometry, unless they already do.
+        """
+        if Geometry.bound is self:
+            return
+
+        # The element buffer binding is stored in the currently bound vertex array object
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+
         # Create Vertex Attributes Pointers Here
         # Note that you will need to use ctypes.c_void_p(i) to specify the starting index
         # when using glVertexAttribPointer
@@ -32,50 +71,25 @@ class Geometry:
         # normal
         glEnableVertexAttribArray(2)
         glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+        Geometry.bound = self
 
     def LoadFile(self, filename):
 
-        # raw, unassembled data
-        v = []
-        vt = []
-        vn = []
-        faces = []
-
-        # final, assembled and packed result
-        vertices = []
+        # raw, unassembled data, bucketed by the flag at the start of each line
+        records = {"v": [], "vt": [], "vn": [], "f": []}
 
-        # open the obj file and read the data
+        # open the obj file and read the data in one go
         with open(filename, 'r') as f:
-            line = f.readline()
-            while line:
-                firstSpace = line.find(" ")
-                flag = line[0:firstSpace]
-                if flag == "v":
-                    # vertex
-                    line = line.replace("v ", "")
-                    line = line.split()  # This accounts for '  ' spacing instead of ' ' spacing
-                    l = [float(x) for x in line]
-                    v.append(l)
-                elif flag == "vt":
-                    # texture coordinate
-                    line = line.replace("vt ", "")
-                    line = line.split()
-                    l = [float(x) for x in line]
-                    vt.append(l)
-                elif flag == "vn":
-                    # normal
-                    line = line.replace("vn ", "")
-                    line = line.split()
-                    l = [float(x) for x in line]
-                    vn.append(l)
-                elif flag == "f":
-                    # face, three or more vertices in v/vt/vn form
-                    line = line.replace("f ", "")
-                    line = line.replace("\n", "")
-                    faces.append(line)
-                line = f.readline()
-
-        # Now we use the face data to setup the vertex ordering
+            for line in f.read().splitlines():
+                flag, _, rest = line.partition(" ")
+                bucket = records.get(flag)
+                if bucket is not None:
+                    bucket.append(rest)
+
+        # convert every bucket with a single numpy call instead of one float at a time
+        v = self.parseFloats(records["v"], 3)
+        vt = self.parseFloats(records["vt"], 2)
+        vn = self.parseFloats(records["vn"], 3)
 
         hasNormals = len(vn) > 0
         hasTextureCoords = len(vt) > 0
@@ -86,79 +100,125 @@ class Geometry:
         if not hasTextureCoords:
             warnings.warn("WARNING: Model has no texture coordinates.")
 
-        for face in faces:
-            # get the individual vertices for each line
-            line = face.split()
-            faceVertices = []
-            faceTextures = []
-            faceNormals = []
-
-            if not hasNormals:
-                cNorms = self.calcNormals(line, v, hasTextureCoords)
-
-            for i in range(len(line)):
-                # break out into [v,vt,vn],
-                # correct for 0 based indexing.
-                l = line[i].split("/")
-                position = int(l[0]) - 1
-                faceVertices.append(v[position])
-                if hasTextureCoords:
-                    texture = int(l[1]) - 1
-                    faceTextures.append(vt[texture])
-                else:
-                    faceTextures.append([0.0, 0.0])  # UV Coordinate of (0,0)
-
-                if hasNormals:
-                    normal = int(l[2]) - 1
-                    faceNormals.append(vn[normal])
-                else:
-                    faceNormals.append(cNorms)
-
-            # obj file uses triangle fan format for each face individually.
-            # unpack each face
-            triangles_in_face = len(line) - 2
-
-            vertex_order = []
-            """
-                eg. 0,1,2,3 unpacks to vertices: [0,1,2,0,2,3]
-            """
-            for i in range(triangles_in_face):
-                vertex_order.append(0)
-                vertex_order.append(i + 1)
-                vertex_order.append(i + 2)
-            for i in vertex_order:
-                for x in faceVertices[i]:
-                    vertices.append(x)
-                for x in faceTextures[i]:
-                    vertices.append(x)
-                for x in faceNormals[i]:
-                    vertices.append(x)
-
-        return vertices
-
-    def calcNormals(self, face, vertices, hasTexCoords):
-
-        # Convert vertex positions into numpy matrix
-        if hasTexCoords:
-            vertex_positions = np.array([
-                vertices[int(vi.split('/')[0]) - 1] for vi in face
-            ])
+        # face, three or more vertices in v/vt/vn form
+        faceTokens = [face.split() for face in records["f"]]
+        counts = np.fromiter(map(len, faceTokens), dtype=np.int64, count=len(faceTokens))
+        corners = self.parseCorners(list(chain.from_iterable(faceTokens)), (len(v), len(vt), len(vn)))
+        faceStarts = np.cumsum(counts) - counts
+        cornerFaces = np.repeat(np.arange(len(counts)), counts)
+
+        if not hasNormals:
+            # Every corner of a face shares the computed face normal, so key the normal on the face
+            faceNormals = self.calcNormals(v, corners[:, 0], faceStarts)
+            corners[:, 2] = cornerFaces
+
+        # Deduplicate identical v/vt/vn corners, keeping the order in which they first appear
+        _, first, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        cornerVertex = rank[inverse.reshape(-1)]
+        uniqueCorners = corners[first[order]]
+
+        positions = v[uniqueCorners[:, 0]]
+        if hasTextureCoords:
+            textures = vt[uniqueCorners[:, 1]]
+        else:
+            textures = np.zeros((len(uniqueCorners), 2), dtype=np.float32)  # UV Coordinate of (0,0)
+        if hasNormals:
+            normals = vn[uniqueCorners[:, 2]]
         else:
-            vertex_positions = np.array([
-                vertices[int(vi) - 1] for vi in face
-            ])
+            normals = faceNormals[uniqueCorners[:, 2]]
+
+        vertices = np.hstack((positions, textures, normals)).astype(np.float32).reshape(-1)
+
+        # obj file uses triangle fan format for each face individually.
+        # unpack each face
+        """
+            eg. 0,1,2,3 unpacks to vertices: [0,1,2,0,2,3]
+        """
+        trianglesInFace = counts - 2
+        triangleFaces = np.repeat(np.arange(len(counts)), trianglesInFace)
+        triangleStarts = np.cumsum(trianglesInFace) - trianglesInFace
+        fanOffsets = np.arange(len(triangleFaces)) - np.repeat(triangleStarts, trianglesInFace)
+        fanRoots = faceStarts[triangleFaces]
+        triangles = np.stack((fanRoots, fanRoots + fanOffsets + 1, fanRoots + fanOffsets + 2), axis=1)
+
+        indices = cornerVertex[triangles].astype(np.uint32).reshape(-1)
+
+        return vertices, indices
+
+    def parseFloats(self, rows, width):
+        """
+        Convert the text of a list of obj records into an (n, width) float32 array.
+
+        Args:
+            rows (list): The record text of each line, without the leading flag.
+            width (int): The number of components to keep per record.
+
+        Returns:
+            numpy.ndarray: The parsed records.
+        """
+        if not rows:
+            return np.zeros((0, width), dtype=np.float32)
+
+        values = np.array(" ".join(rows).split(), dtype=np.float32)
+        if values.size == len(rows) * width:
+            return values.reshape(-1, width)
+
+        # Records with optional extra components (eg. "vt u v w"), keep the first width of each
+        return np.array([row.split()[:width] for row in rows], dtype=np.float32)
+
+    def parseCorners(self, corners, counts):
+        """
+        Convert face corners in v, v/vt, v//vn or v/vt/vn form into an (n, 3) array of 0 based indices.
+
+        Args:
+            corners (list): The corner tokens of every face, in file order.
+            counts (tuple): The number of positions, texture coordinates and normals in the file,
+                used to resolve negative (relative) indices.
+
+        Returns:
+            numpy.ndarray: The v, vt and vn index of each corner. Missing components are 0.
+        """
+        if not corners:
+            return np.zeros((0, 3), dtype=np.int64)
+
+        width = corners[0].count("/") + 1
+        text = " ".join(corners).replace("//", "/0/").replace("/", " ")
+        parsed = np.array(text.split(), dtype=np.int64).reshape(-1, width)
+
+        indices = np.zeros((len(parsed), 3), dtype=np.int64)
+        indices[:, :width] = parsed
+
+        # correct for 1 based (and negative, relative) indexing
+        for column, count in enumerate(counts):
+            values = indices[:, column]
+            values[values < 0] += count + 1
+            values[values > 0] -= 1
+
+        return indices
+
+    def calcNormals(self, vertices, positions, faceStarts):
+
+        # Gather the first three vertex positions of every face
+        A = vertices[positions[faceStarts]]
+        B = vertices[positions[faceStarts + 1]]
+        C = vertices[positions[faceStarts + 2]]
 
         # We now calculate a face normal by taken the normalized cross product of (v[1]-v[0] x v[2] - [v0])
         # which the cross product of the tangent and the bi-tangent (which gives us the normal vector)
         # Note this assumes clockwise defined vertex positions
 
-        BA = vertex_positions[1] - vertex_positions[0]
-        CA = vertex_positions[2] - vertex_positions[0]
+        BA = B - A
+        CA = C - A
 
         N = np.cross(BA, CA)
-        normalized_N = N / np.linalg.norm(N)
+        normalized_N = N / np.linalg.norm(N, axis=1, keepdims=True)
 
-        return normalized_N.tolist()
+        return normalized_N.astype(np.float32)
 
     def cleanup(self):
-        glDeleteBuffers(1, (self.vbo,))
\ No newline at end of file
+        if Geometry.bound is self:
+            Geometry.bound = None
+        glDeleteBuffers(2, (self.vbo, self.ebo))
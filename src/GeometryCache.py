@@ -0,0 +1,81 @@
+import os
+import struct
+import warnings
+
+import numpy as np
+
+from AssetCache import AssetCache
+
+class GeometryCache(AssetCache):
+    # After the common key, the header stores the vertex float count and the index count (uint64 each).
+    # The payload is the packed float32 vertices followed by the uint32 indices. Both arrays start
+    # on 4 byte boundaries so they can be memory mapped in place.
+    MAGIC = b"SSGEOM02"
+    FIELDS = struct.Struct("<QQ")
+    EXTENSION = ".geom"
+
+    def __init__(self, cache_dir="./cache/geometry", rebuild=False):
+        """
+        Initialize a new GeometryCache object.
+
+        Args:
+            cache_dir (str, optional): The directory the cache files are stored in. Defaults to "./cache/geometry".
+            rebuild (bool, optional): Whether to ignore existing cache files and re-parse every source. Defaults to False.
+        """
+        super().__init__(cache_dir, rebuild)
+
+    def load(self, filename, parse, variant=None):
+        """
+        Load the packed vertices and indices of a model, parsing the source only when the cache is stale.
+
+        Args:
+            filename (str): The path to the source model file.
+            parse (callable): Called with filename on a cache miss, returns the (vertices, indices) arrays.
+            variant (str, optional): The name of a model derived from the source, eg. a level of detail,
+                which is cached separately and rebuilt when the source changes. Defaults to None.
+
+        Returns:
+            tuple: The float32 vertices and uint32 indices. Cache hits are read only memory maps.
+        """
+        path = self.cache_path(filename, variant)
+        stat = os.stat(filename)
+
+        cached = self.read(path, filename, stat)
+        if cached is not None:
+            return cached
+
+        vertices, indices = parse(filename)
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+
+        try:
+            self.write_entry(path, filename, stat, (vertices.size, indices.size), (vertices.tobytes(), indices.tobytes()))
+        except OSError as e:
+            warnings.warn(f"WARNING: Could not write geometry cache {path}: {e}")
+
+        return vertices, indices
+
+    def read(self, path, filename, stat):
+        """
+        Memory map a cache file if it is still valid for its source.
+
+        Args:
+            path (str): The path to the cache file.
+            filename (str): The path to the source model file.
+            stat (os.stat_result): The current stat of the source file.
+
+        Returns:
+            tuple: The mapped (vertices, indices), or None if the entry is missing or stale.
+        """
+        fields = self.read_fields(path, filename, stat)
+        if fields is None:
+            return None
+
+        vertex_count, index_count = fields
+        if os.path.getsize(path) != self.DATA_OFFSET + 4 * (vertex_count + index_count):
+            return None
+
+        vertices = np.memmap(path, dtype=np.float32, mode="r", offset=self.DATA_OFFSET, shape=(vertex_count,))
+        indices = np.memmap(path, dtype=np.uint32, mode="r", offset=self.DATA_OFFSET + vertices.nbytes, shape=(index_count,))
+
+        return vertices, indices
@@ -0,0 +1,201 @@
+import collections
+import ctypes
+
+import numpy as np
+
+from OpenGL.GL import *
+
+class HeadlessContext:
+    # Number of pixel buffer objects frames are read back through
+    READBACK_BUFFERS = 3
+
+    def __init__(self, width, height, backend="egl", readback_buffers=READBACK_BUFFERS):
+        """
+        Initialize a new HeadlessContext object, an offscreen OpenGL 3.3 core context without a display.
+
+        The scene is rendered into a framebuffer object. Every frame is copied into the next of a ring of
+        pixel buffer objects and only mapped once the GPU has signalled a fence placed after the copy, so
+        reading frames back never waits for the frame that was just drawn. read_frame() therefore returns
+        the frames readback_buffers - 1 calls late, flush() returns the ones still in flight.
+
+        PyOpenGL picks its platform when it is first imported, so PYOPENGL_PLATFORM must be set to the
+        backend ("egl" or "osmesa") before any OpenGL module is imported.
+
+        Args:
+            width (int): The width of the frames.
+            height (int): The height of the frames.
+            backend (str, optional): "egl" for a surfaceless EGL context or "osmesa" for Mesa's off-screen
+                renderer. Defaults to "egl".
+            readback_buffers (int, optional): The number of pixel buffer objects in the ring. Defaults to 3.
+        """
+        if backend not in ("egl", "osmesa"):
+            raise Exception(f"Unknown headless backend: {backend}")
+
+        self.width = width
+        self.height = height
+        self.backend = backend
+        self.readback_buffers = readback_buffers
+        self.frame_size = width * height * 4
+        self.display = None
+        self.context = None
+
+    def create(self):
+        """
+        Create the context and make it current, then create the framebuffer object and the pixel buffer objects.
+        """
+        if self.backend == "egl":
+            self.create_egl()
+        else:
+            self.create_osmesa()
+
+        # The color and depth attachments the scene is drawn into
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        self.color_buffer, self.depth_buffer = glGenRenderbuffers(2)
+        for renderbuffer, internal_format, attachment in ((self.color_buffer, GL_RGBA8, GL_COLOR_ATTACHMENT0),
+                                                          (self.depth_buffer, GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)):
+            glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+            glRenderbufferStorage(GL_RENDERBUFFER, internal_format, self.width, self.height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, renderbuffer)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise Exception("The headless framebuffer is incomplete")
+        glViewport(0, 0, self.width, self.height)
+
+        # The ring of pixel buffer objects, with the fences of the readbacks still in flight
+        self.pbos = np.atleast_1d(glGenBuffers(self.readback_buffers))
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frame_size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.next_pbo = 0
+        self.pending = collections.deque()
+
+        version = glGetString(GL_VERSION).decode()
+        renderer = glGetString(GL_RENDERER).decode()
+        print(f"Headless {self.backend} context: {renderer}, OpenGL {version}, {self.width}x{self.height}")
+
+    def create_egl(self):
+        """
+        Create a surfaceless EGL context. Mesa picks the surfaceless platform when EGL_PLATFORM is "surfaceless".
+        """
+        from OpenGL import EGL
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if self.display == EGL.EGL_NO_DISPLAY or not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise Exception("Failed to initialize EGL")
+
+        # Without a surface type eglChooseConfig only looks at window configs, which surfaceless displays lack
+        config_attributes = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE,
+                                             EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+        config, config_count = EGL.EGLConfig(), EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, config_attributes, ctypes.pointer(config), 1, ctypes.pointer(config_count)) or config_count.value == 0:
+            raise Exception("No EGL config supports desktop OpenGL")
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context_attributes = (EGL.EGLint * 7)(EGL.EGL_CONTEXT_MAJOR_VERSION, 3, EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                                              EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                                              EGL.EGL_NONE)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, context_attributes)
+        if self.context == EGL.EGL_NO_CONTEXT:
+            raise Exception("Failed to create an OpenGL 3.3 core EGL context")
+        if not EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.context):
+            raise Exception("Failed to make the EGL context current")
+
+    def create_osmesa(self):
+        """
+        Create an OSMesa context. Its own color buffer is never drawn to, the framebuffer object is.
+        """
+        from OpenGL import osmesa
+
+        attributes = np.array([osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA, osmesa.OSMESA_DEPTH_BITS, 0,
+                               osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+                               osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3, osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3, 0], dtype=np.int32)
+        self.context = osmesa.OSMesaCreateContextAttribs(attributes, None)
+        if not self.context:
+            raise Exception("Failed to create an OpenGL 3.3 core OSMesa context")
+
+        self.osmesa_buffer = np.zeros((1, 1, 4), dtype=np.uint8)
+        if not osmesa.OSMesaMakeCurrent(self.context, self.osmesa_buffer, GL_UNSIGNED_BYTE, 1, 1):
+            raise Exception("Failed to make the OSMesa context current")
+
+    def read_frame(self):
+        """
+        Start reading back the frame that was just drawn and get the oldest frame whose readback has finished.
+        Only when all the pixel buffer objects are in flight does this wait, for the oldest of them.
+
+        Returns:
+            numpy.ndarray: The oldest finished frame, shape (height, width, 3) uint8 with the top row first,
+                or None if no readback has finished yet.
+        """
+        frame = self.collect(wait=True) if len(self.pending) == len(self.pbos) else None
+
+        pbo = self.pbos[self.next_pbo]
+        self.next_pbo = (self.next_pbo + 1) % len(self.pbos)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.pending.append((pbo, glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)))
+        glFlush()
+
+        return frame if frame is not None else self.collect(wait=False)
+
+    def flush(self):
+        """
+        Wait for the readbacks still in flight.
+
+        Returns:
+            list: Their frames, oldest first.
+        """
+        frames = []
+        while self.pending:
+            frames.append(self.collect(wait=True))
+        return frames
+
+    def collect(self, wait):
+        """
+        Map the oldest pixel buffer object in flight and copy its frame out, if its fence has been signalled.
+
+        Args:
+            wait (bool): Whether to wait for the fence instead of returning None while it is unsignalled.
+
+        Returns:
+            numpy.ndarray: The frame, or None.
+        """
+        if not self.pending:
+            return None
+
+        pbo, fence = self.pending[0]
+        status = glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, GL_TIMEOUT_IGNORED if wait else 0)
+        if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+            return None
+        self.pending.popleft()
+        glDeleteSync(fence)
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        address = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.frame_size, GL_MAP_READ_BIT)
+        pixels = np.ctypeslib.as_array((ctypes.c_ubyte * self.frame_size).from_address(address))
+        frame = pixels.reshape(self.height, self.width, 4)[::-1, :, :3].copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frame
+
+    def cleanup(self):
+        """
+        Delete the buffers and destroy the context.
+        """
+        for _, fence in self.pending:
+            glDeleteSync(fence)
+        self.pending.clear()
+        glDeleteBuffers(len(self.pbos), self.pbos)
+        glDeleteRenderbuffers(2, (self.color_buffer, self.depth_buffer))
+        glDeleteFramebuffers(1, (self.fbo,))
+
+        if self.backend == "egl":
+            from OpenGL import EGL
+            EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroyContext(self.display, self.context)
+            EGL.eglTerminate(self.display)
+        else:
+            from OpenGL import osmesa
+            osmesa.OSMesaDestroyContext(self.context)
@@ -0,0 +1,104 @@
+import numpy as np
+
+from OpenGL.GL import *
+
+class InstanceBuffer:
+    # Per-instance data, one record per body:
+    #   model and normal_matrix are row-major like the pyrr matrices uploaded as uniforms, so
+    #   row i of the numpy matrix feeds column i of the GLSL matrix.
+    #   params holds the shininess, the diffuse and normal texture layers and the shading flags.
+    #   row is the body's row in the BodyStore, where the shader finds its orbit in the OrbitBuffer.
+    DTYPE = np.dtype([
+        ("model", np.float32, (4, 4)),
+        ("normal_matrix", np.float32, (3, 3)),
+        ("ka", np.float32, 3),
+        ("kd", np.float32, 3),
+        ("ks", np.float32, 3),
+        ("params", np.float32, 4),
+        ("row", np.float32, (1,)),
+    ])
+
+    def __init__(self, first_location=3):
+        """
+        Create the instance buffer and its per-instance vertex attributes. The vertex array object
+        the attributes belong to must be bound.
+
+        Args:
+            first_location (int, optional): The attribute location of the first column of the model matrix. Defaults to 3.
+        """
+        self.vbo = glGenBuffers(1)
+        self.first = None
+
+        # (location, components, byte offset) of every attribute, matrices take one location per column
+        self.attributes = []
+        location = first_location
+        for name in self.DTYPE.names:
+            field_type, offset = self.DTYPE.fields[name][:2]
+            shape = field_type.shape
+            columns, components = shape if len(shape) == 2 else (1, shape[0])
+            for column in range(columns):
+                self.attributes.append((location, components, offset + 4 * components * column))
+                location += 1
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        for location, _, _ in self.attributes:
+            glEnableVertexAttribArray(location)
+            glVertexAttribDivisor(location, 1)
+        self.point_at(0)
+
+    def point_at(self, first):
+        """
+        Point the per-instance attributes at a record, so the next instanced draw starts there.
+
+        Args:
+            first (int): The index of the first instance record.
+        """
+        if first == self.first:
+            return
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        stride = self.DTYPE.itemsize
+        for location, components, offset in self.attributes:
+            glVertexAttribPointer(location, components, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(first * stride + offset))
+        self.first = first
+
+    def upload(self, instances):
+        """
+        Replace the contents of the buffer. Respecifying the whole buffer lets the driver hand out
+        fresh storage instead of waiting for draws that still read the previous frame.
+
+        Args:
+            instances (numpy.ndarray): The instance records, with dtype DTYPE.
+        """
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+
+    def update(self, instances, first):
+        """
+        Overwrite a range of the records in the buffer, keeping the rest.
+
+        Args:
+            instances (numpy.ndarray): The new records, with dtype DTYPE.
+            first (int): The index of the first record to overwrite.
+        """
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, first * self.DTYPE.itemsize, instances.nbytes, instances)
+
+    def draw(self, geometry, first, count):
+        """
+        Draw a range of instances of a geometry.
+
+        Args:
+            geometry (Geometry): The geometry to draw.
+            first (int): The index of the first instance record.
+            count (int): The number of instances.
+        """
+        geometry.bind()
+        self.point_at(first)
+        glDrawElementsInstanced(GL_TRIANGLES, geometry.indexCount, GL_UNSIGNED_INT, ctypes.c_void_p(0), count)
+
+    def cleanup(self):
+        """
+        Delete the buffer.
+        """
+        glDeleteBuffers(1, (self.vbo,))
@@ -0,0 +1,126 @@
+import numpy as np
+
+class KeplerOrbits:
+    # Iteration cap and tolerance, in radians, of the Newton solver of Kepler's equation
+    NEWTON_ITERATIONS = 16
+    NEWTON_TOLERANCE = 1e-12
+
+    def __init__(self, bodies, rows):
+        """
+        Initialize a new KeplerOrbits object, the elliptic orbits of a batch of bodies around their parents.
+
+        Every body moves on a fixed ellipse given by its orbital elements. The elements are taken from the
+        columns once, including the two axes of every orbit (P towards periapsis and Q 90 degrees ahead of it,
+        both scaled to the semi-axes), so a position is a solve of Kepler's equation and two multiply-adds.
+
+        The reference plane of the elements is the XZ plane of the scene, with the reference direction
+        along +X and the orbits running from +X towards +Z like the circular orbits, so an orbit with no
+        eccentricity or inclination is the circle distance * (cos(speed * t), 0, sin(speed * t)).
+
+        Args:
+            bodies (BodyStore): The bodies, whose distance is the semi-major axis and speed the mean motion.
+            rows (numpy.ndarray): The rows of the bodies to solve the orbits of.
+        """
+        self.names = [bodies.names[row] for row in rows]
+        self.eccentricity = bodies.eccentricity[rows]
+        self.mean_motion = bodies.speed[rows]
+        self.mean_anomaly = np.radians(bodies.mean_anomaly[rows])
+        self.semi_major_axis = bodies.distance[rows]
+
+        inclination = np.radians(bodies.inclination[rows])
+        node = np.radians(bodies.ascending_node[rows])
+        periapsis = np.radians(bodies.argument_of_periapsis[rows])
+
+        # The perifocal axes in the ecliptic frame (X, Y, Z), with Y the direction of motion at the node
+        cos_node, sin_node = np.cos(node), np.sin(node)
+        cos_periapsis, sin_periapsis = np.cos(periapsis), np.sin(periapsis)
+        cos_inclination, sin_inclination = np.cos(inclination), np.sin(inclination)
+        p = np.array([cos_node * cos_periapsis - sin_node * sin_periapsis * cos_inclination,
+                      sin_node * cos_periapsis + cos_node * sin_periapsis * cos_inclination,
+                      sin_periapsis * sin_inclination])
+        q = np.array([-cos_node * sin_periapsis - sin_node * cos_periapsis * cos_inclination,
+                      -sin_node * sin_periapsis + cos_node * cos_periapsis * cos_inclination,
+                      cos_periapsis * sin_inclination])
+
+        # Ecliptic (X, Y, Z) to scene (X, -Z, Y), a rotation that keeps the orbits running from +X to +Z
+        semi_minor_axis = self.semi_major_axis * np.sqrt(1.0 - self.eccentricity ** 2)
+        self.p = np.stack([p[0], -p[2], p[1]], axis=-1) * self.semi_major_axis[:, None]
+        self.q = np.stack([q[0], -q[2], q[1]], axis=-1) * semi_minor_axis[:, None]
+
+    def index(self, name):
+        """
+        Get the index of a body.
+
+        Args:
+            name (str): The name of the body.
+
+        Returns:
+            int: The index of the body in the result arrays.
+        """
+        return self.names.index(name)
+
+    def eccentric_anomalies(self, times, indices=None):
+        """
+        Solve Kepler's equation, M = E - e * sin(E), for every body at every time.
+
+        Newton's method converges in a few iterations for planetary eccentricities. It starts from
+        E = M + e * sin(M), or from pi for very eccentric orbits, and stops when every anomaly has converged
+        or after NEWTON_ITERATIONS iterations.
+
+        Args:
+            times (float or numpy.ndarray): The times, any shape.
+            indices (numpy.ndarray, optional): The indices of the bodies to solve for. Defaults to all of them.
+
+        Returns:
+            numpy.ndarray: The eccentric anomalies, shape times.shape + (N,).
+        """
+        bodies = slice(None) if indices is None else indices
+        eccentricity = self.eccentricity[bodies]
+        mean_anomaly = np.remainder(np.multiply.outer(times, self.mean_motion[bodies]) + self.mean_anomaly[bodies], 2.0 * np.pi)
+
+        eccentric_anomaly = np.where(eccentricity > 0.8, np.pi, mean_anomaly + eccentricity * np.sin(mean_anomaly))
+        for _ in range(self.NEWTON_ITERATIONS):
+            delta = (eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly) - mean_anomaly) / (1.0 - eccentricity * np.cos(eccentric_anomaly))
+            eccentric_anomaly -= delta
+            if np.all(np.abs(delta) <= self.NEWTON_TOLERANCE):
+                break
+
+        return eccentric_anomaly
+
+    def positions(self, times, indices=None):
+        """
+        Get the positions of all bodies relative to their parents at one or many times.
+
+        Args:
+            times (float or numpy.ndarray): The times, any shape.
+            indices (numpy.ndarray, optional): The indices of the bodies to get the positions of. Defaults to all of them.
+
+        Returns:
+            numpy.ndarray: The positions, shape times.shape + (N, 3).
+        """
+        bodies = slice(None) if indices is None else indices
+        eccentric_anomaly = self.eccentric_anomalies(times, indices)
+        along = (np.cos(eccentric_anomaly) - self.eccentricity[bodies])[..., None]
+        across = np.sin(eccentric_anomaly)[..., None]
+        return along * self.p[bodies] + across * self.q[bodies]
+
+    def velocities(self, times, mu=None):
+        """
+        Get the velocities of all bodies relative to their parents at one or many times.
+
+        Args:
+            times (float or numpy.ndarray): The times, any shape.
+            mu (float, optional): G times the mass of the parent, for the speeds of a gravitational orbit of the
+                same shape. Defaults to None, which uses the mean motions of the bodies.
+
+        Returns:
+            numpy.ndarray: The velocities, shape times.shape + (N, 3).
+        """
+        mean_motion = self.mean_motion if mu is None else np.sqrt(mu / self.semi_major_axis ** 3)
+        eccentric_anomaly = self.eccentric_anomalies(times)
+
+        # dE/dt = n / (1 - e * cos(E))
+        rate = mean_motion / (1.0 - self.eccentricity * np.cos(eccentric_anomaly))
+        along = (-np.sin(eccentric_anomaly) * rate)[..., None]
+        across = (np.cos(eccentric_anomaly) * rate)[..., None]
+        return along * self.p + across * self.q
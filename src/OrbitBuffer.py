@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+
+from OpenGL.GL import *
+
+class OrbitBuffer:
+    # RGBA32F texels per body in the buffer texture
+    TEXELS = 4
+    # Largest angle, in radians, the shader moves an orbit or a spin on from the epoch, which keeps the float32
+    # angles precise however long the animation runs
+    MAX_PHASE = 64.0
+
+    def __init__(self, bodies, orbits, orbit_indices):
+        """
+        Create a buffer texture with the orbit of every body, for the vertex shader to place the bodies itself.
+
+        The buffer holds one record of TEXELS texels per row of the BodyStore:
+            0: the P axis of the orbit and its eccentricity
+            1: the Q axis of the orbit and its mean motion
+            2: the mean anomaly at the epoch, the rotation speed, the parent row (-1 for none) and whether the body orbits
+            3: the scale and the rotation angle at the epoch
+        See KeplerOrbits for the axes. With these the shader solves the orbits of a body and its parents at the
+        time since the epoch and builds the same model and normal matrices as the scene graph, so animating
+        the bodies only takes a uniform per frame. The epoch is only moved, and the angles at it uploaded
+        again, once the animation has run MAX_PHASE radians away from it.
+
+        Args:
+            bodies (BodyStore): The bodies.
+            orbits (KeplerOrbits): The orbits of the bodies that have one.
+            orbit_indices (numpy.ndarray): The index of every row in the orbits, -1 for bodies without one.
+        """
+        count = len(bodies)
+        self.rows = np.flatnonzero(orbit_indices >= 0)
+        indices = orbit_indices[self.rows]
+        self.mean_anomaly = orbits.mean_anomaly[indices]
+        self.mean_motion = orbits.mean_motion[indices]
+        self.rotation_speed = bodies.rotation_speed.copy()
+        self.max_rate = max(np.abs(self.mean_motion).max(initial=0.0), np.abs(self.rotation_speed).max(initial=0.0))
+
+        self.elements = np.zeros((count, self.TEXELS, 4), dtype=np.float32)
+        self.elements[self.rows, 0, :3] = orbits.p[indices]
+        self.elements[self.rows, 0, 3] = orbits.eccentricity[indices]
+        self.elements[self.rows, 1, :3] = orbits.q[indices]
+        self.elements[self.rows, 1, 3] = self.mean_motion
+        self.elements[self.rows, 2, 3] = 1.0
+        self.elements[:, 2, 1] = self.rotation_speed
+        self.elements[:, 2, 2] = bodies.parent
+        self.elements[:, 3, :3] = bodies.scale
+        self.epoch = None
+
+        self.buffer = glGenBuffers(1)
+        self.texture = glGenTextures(1)
+        self.update(0.0)
+        glBindTexture(GL_TEXTURE_BUFFER, self.texture)
+        glTexBuffer(GL_TEXTURE_BUFFER, GL_RGBA32F, self.buffer)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+
+    def update(self, time):
+        """
+        Move the epoch to a time if the animation has run too far from it, and upload the angles at the new epoch.
+
+        Args:
+            time (float): The animation time.
+
+        Returns:
+            float: The time since the epoch, for the shader.
+        """
+        if self.epoch is None or abs(time - self.epoch) * self.max_rate > self.MAX_PHASE:
+            self.epoch = time
+            self.elements[self.rows, 2, 0] = np.remainder(self.mean_anomaly + self.mean_motion * time, 2.0 * math.pi)
+            self.elements[:, 3, 3] = np.remainder(self.rotation_speed * time, 2.0 * math.pi)
+
+            glBindBuffer(GL_TEXTURE_BUFFER, self.buffer)
+            glBufferData(GL_TEXTURE_BUFFER, self.elements.nbytes, self.elements, GL_STATIC_DRAW)
+            glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+        return time - self.epoch
+
+    def cleanup(self):
+        """
+        Delete the texture and the buffer.
+        """
+        glDeleteTextures(1, (self.texture,))
+        glDeleteBuffers(1, (self.buffer,))
@@ -0,0 +1,293 @@
+import math
+
+import numpy as np
+
+from BarnesHut import BarnesHut
+from WisdomHolman import WisdomHolman
+
+class Physics:
+    # Number of body pairs evaluated at once by the pairwise kernels, which bounds their scratch memory
+    BLOCK_PAIRS = 1 << 18
+    # Body count from which the "auto" solver switches from direct summation to Barnes-Hut
+    BARNES_HUT_THRESHOLD = 2000
+    SOLVERS = ("auto", "direct", "barnes-hut")
+    INTEGRATORS = ("verlet", "wisdom-holman")
+
+    def __init__(self, G=1.0, softening=0.0, max_step=2.5e-4, solver="auto", theta=0.5, integrator="verlet"):
+        """
+        Initialize a new Physics object, an N-body gravity simulation.
+
+        The state of the bodies is kept as contiguous float64 arrays: positions and velocities with one
+        row per axis (3, N), so every coordinate of all bodies is one contiguous run, and the masses (N,).
+        The bodies are advanced with velocity Verlet, a symplectic integrator, so the energy error stays
+        bounded instead of drifting. For systems dominated by one central body (the first one added), the
+        Wisdom-Holman integrator solves the orbits around it exactly and allows much longer steps.
+        Accelerations are summed over all pairs with vectorized NumPy kernels, or for large body counts
+        approximated with a Barnes-Hut octree in O(N log N).
+
+        Args:
+            G (float, optional): The gravitational constant. Defaults to 1.0.
+            softening (float, optional): The softening length, which keeps close encounters finite. Defaults to 0.0.
+            max_step (float, optional): The longest time step, longer advances are split into substeps. Defaults to 2.5e-4.
+            solver (str, optional): The force solver, "direct", "barnes-hut", or "auto" to use Barnes-Hut from
+                BARNES_HUT_THRESHOLD bodies on. Defaults to "auto".
+            theta (float, optional): The opening angle of the Barnes-Hut solver. Defaults to 0.5.
+            integrator (str, optional): The integrator, "verlet" or "wisdom-holman". Defaults to "verlet".
+        """
+        if solver not in self.SOLVERS:
+            raise Exception(f"Unknown solver: {solver}")
+        if integrator not in self.INTEGRATORS:
+            raise Exception(f"Unknown integrator: {integrator}")
+
+        self.G = G
+        self.softening = softening
+        self.max_step = max_step
+        self.solver = solver
+        self.tree = BarnesHut(theta)
+        self.integrator = integrator
+        self.wisdom_holman = WisdomHolman()
+        self.time = 0.0
+        self.names = []
+        self.positions = np.zeros((3, 0))
+        self.velocities = np.zeros((3, 0))
+        self.masses = np.zeros(0)
+        self.acceleration = None
+        self.scratch = None
+
+    @property
+    def count(self):
+        """
+        int: The number of bodies.
+        """
+        return len(self.masses)
+
+    def add_body(self, name, mass, position, velocity):
+        """
+        Add a body to the simulation.
+
+        Args:
+            name (str): The name of the body.
+            mass (float): The mass of the body.
+            position (array-like): The position (x, y, z).
+            velocity (array-like): The velocity (x, y, z).
+
+        Returns:
+            int: The index of the body in the state arrays.
+        """
+        self.add_bodies(np.array([mass], dtype=np.float64), np.reshape(position, (3, 1)), np.reshape(velocity, (3, 1)), [name])
+        return self.count - 1
+
+    def add_bodies(self, masses, positions, velocities, names=None):
+        """
+        Add many bodies to the simulation at once.
+
+        Args:
+            masses (numpy.ndarray): The masses, shape (N,).
+            positions (numpy.ndarray): The positions, shape (3, N).
+            velocities (numpy.ndarray): The velocities, shape (3, N).
+            names (list, optional): The names of the bodies. Defaults to their indices.
+        """
+        first = self.count
+        self.masses = np.concatenate([self.masses, np.asarray(masses, dtype=np.float64)])
+        self.positions = np.ascontiguousarray(np.concatenate([self.positions, positions], axis=1), dtype=np.float64)
+        self.velocities = np.ascontiguousarray(np.concatenate([self.velocities, velocities], axis=1), dtype=np.float64)
+        self.names += list(names) if names is not None else [str(index) for index in range(first, self.count)]
+        self.acceleration = None
+        self.scratch = None
+
+    def index(self, name):
+        """
+        Get the index of a body.
+
+        Args:
+            name (str): The name of the body.
+
+        Returns:
+            int: The index of the body in the state arrays.
+        """
+        return self.names.index(name)
+
+    def circular_velocity(self, central, position):
+        """
+        Get the velocity of a circular orbit in the XZ plane around a body, in the direction of the
+        kinematic orbits (angle increasing from +X towards +Z).
+
+        Args:
+            central (int): The index of the body being orbited.
+            position (array-like): The position of the orbiting body.
+
+        Returns:
+            numpy.ndarray: The velocity (x, y, z).
+        """
+        offset = np.asarray(position, dtype=np.float64) - self.positions[:, central]
+        distance = math.hypot(offset[0], offset[2])
+        speed = math.sqrt(self.G * self.masses[central] / distance)
+        return self.velocities[:, central] + speed * np.array([-offset[2], 0.0, offset[0]]) / distance
+
+    def center_momentum(self):
+        """
+        Shift the velocities so the total momentum is zero, which keeps the system from drifting away.
+        """
+        self.velocities -= (self.velocities @ self.masses / self.masses.sum())[:, None]
+
+    def pair_blocks(self, count):
+        """
+        Split the bodies into blocks of receiving bodies for the pairwise kernels.
+
+        Args:
+            count (int): The number of bodies.
+
+        Returns:
+            tuple: The block length and the scratch buffers, three arrays of (block, count).
+        """
+        block = max(1, min(count, self.BLOCK_PAIRS // max(count, 1)))
+        if self.scratch is None or self.scratch[0].shape != (block, count):
+            self.scratch = [np.empty((block, count)) for _ in range(3)]
+        return block, self.scratch
+
+    def uses_barnes_hut(self, count=None):
+        """
+        Check which force solver is used for a number of bodies.
+
+        Args:
+            count (int, optional): The number of bodies. Defaults to the number of bodies in the simulation.
+
+        Returns:
+            bool: Whether the accelerations are approximated with the Barnes-Hut octree.
+        """
+        if self.solver == "auto":
+            return (self.count if count is None else count) >= self.BARNES_HUT_THRESHOLD
+        return self.solver == "barnes-hut"
+
+    def accelerations(self, positions=None, out=None, masses=None):
+        """
+        Compute the gravitational acceleration of every body, with the solver chosen by uses_barnes_hut().
+
+        Args:
+            positions (numpy.ndarray, optional): The positions, shape (3, N). Defaults to the current positions.
+            out (numpy.ndarray, optional): The array the accelerations are written to, shape (3, N).
+            masses (numpy.ndarray, optional): The masses, shape (N,), for a subset of the bodies. Defaults to the current masses.
+
+        Returns:
+            numpy.ndarray: The accelerations, shape (3, N).
+        """
+        positions = self.positions if positions is None else positions
+        masses = self.masses if masses is None else masses
+        if self.uses_barnes_hut(len(masses)):
+            return self.tree.accelerations(positions, masses, self.G, self.softening, out)
+        return self.direct_accelerations(positions, out, masses)
+
+    def direct_accelerations(self, positions=None, out=None, masses=None):
+        """
+        Compute the gravitational acceleration of every body by summing over every other body.
+
+        Args:
+            positions (numpy.ndarray, optional): The positions, shape (3, N). Defaults to the current positions.
+            out (numpy.ndarray, optional): The array the accelerations are written to, shape (3, N).
+            masses (numpy.ndarray, optional): The masses, shape (N,), for a subset of the bodies. Defaults to the current masses.
+
+        Returns:
+            numpy.ndarray: The accelerations, shape (3, N).
+        """
+        positions = self.positions if positions is None else positions
+        masses = self.masses if masses is None else masses
+        out = np.empty_like(positions) if out is None else out
+        count = len(masses)
+        gm = self.G * masses
+        softening2 = self.softening * self.softening
+
+        block, (dx, dy, dz) = self.pair_blocks(count)
+        for start in range(0, count, block):
+            stop = min(count, start + block)
+            rows = stop - start
+            bx, by, bz = dx[:rows], dy[:rows], dz[:rows]
+
+            # Separation vectors from every receiving body to every source body
+            np.subtract(positions[0][None, :], positions[0, start:stop, None], out=bx)
+            np.subtract(positions[1][None, :], positions[1, start:stop, None], out=by)
+            np.subtract(positions[2][None, :], positions[2, start:stop, None], out=bz)
+
+            # gm_j / r^3, with the self pairs at an infinite distance so they contribute nothing
+            weights = bx * bx
+            weights += by * by
+            weights += bz * bz
+            weights += softening2
+            weights[np.arange(rows), np.arange(start, stop)] = np.inf
+            weights *= np.sqrt(weights)
+            np.divide(gm[None, :], weights, out=weights)
+
+            out[0, start:stop] = np.einsum("ij,ij->i", weights, bx)
+            out[1, start:stop] = np.einsum("ij,ij->i", weights, by)
+            out[2, start:stop] = np.einsum("ij,ij->i", weights, bz)
+
+        return out
+
+    def step(self, dt):
+        """
+        Advance the simulation by one step of its integrator.
+
+        Args:
+            dt (float): The time step.
+        """
+        if self.integrator == "wisdom-holman":
+            self.wisdom_holman.advance(self, dt, 1)
+            self.acceleration = None
+            return
+
+        if self.acceleration is None:
+            self.acceleration = self.accelerations()
+
+        self.velocities += 0.5 * dt * self.acceleration
+        self.positions += dt * self.velocities
+        self.accelerations(out=self.acceleration)
+        self.velocities += 0.5 * dt * self.acceleration
+        self.time += dt
+
+    def advance(self, duration):
+        """
+        Advance the simulation by a span of time, in as many equal steps as max_step allows.
+
+        Args:
+            duration (float): The time to advance by.
+        """
+        if duration <= 0.0 or self.count == 0:
+            return
+
+        steps = max(1, math.ceil(duration / self.max_step - 1e-9))
+        if self.integrator == "wisdom-holman":
+            # The coordinate changes are done once for all the steps
+            self.wisdom_holman.advance(self, duration / steps, steps)
+            self.acceleration = None
+            return
+
+        for _ in range(steps):
+            self.step(duration / steps)
+
+    def energy(self):
+        """
+        Compute the total energy, kinetic plus potential. It stays nearly constant for a good integrator,
+        so its relative change measures the integration error.
+
+        Returns:
+            float: The total energy.
+        """
+        kinetic = 0.5 * np.sum(self.masses * np.einsum("ij,ij->j", self.velocities, self.velocities))
+
+        potential = 0.0
+        count = self.count
+        softening2 = self.softening * self.softening
+        block, (dx, dy, dz) = self.pair_blocks(count)
+        for start in range(0, count, block):
+            stop = min(count, start + block)
+            rows = stop - start
+            bx, by, bz = dx[:rows], dy[:rows], dz[:rows]
+            np.subtract(self.positions[0][None, :], self.positions[0, start:stop, None], out=bx)
+            np.subtract(self.positions[1][None, :], self.positions[1, start:stop, None], out=by)
+            np.subtract(self.positions[2][None, :], self.positions[2, start:stop, None], out=bz)
+
+            inverse_distance = bx * bx + by * by + bz * bz + softening2
+            inverse_distance[np.arange(rows), np.arange(start, stop)] = np.inf
+            inverse_distance **= -0.5
+            potential -= 0.5 * self.G * (self.masses[start:stop] @ inverse_distance @ self.masses)
+
+        return kinetic + potential
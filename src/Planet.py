@@ -1,34 +1,68 @@
-import numpy as np
-
 class Planet:
-    def __init__(self, name, distance, radius, speed, rotation_speed, diffuse_path, normal_path, atmosphere_thickness=0.0, atmosphere_color=[0.0, 0.0, 0.0], light_color=[0.0, 0.0, 0.0]):
+    def __init__(self, store, index):
         """
-        Initialize a new Planet object.
+        Initialize a new Planet object, a view onto the row of a body in a BodyStore.
+
+        The attributes of the body (distance, radius, speed, rotation_speed, atmosphere_thickness,
+        atmosphere_color, light_color, the orbital elements and the rest of BodyStore.COLUMNS) are read
+        from and written to the columns of the store, so a Planet holds no state of its own.
 
         Args:
-            name (str): The name of the planet.
-            distance (float): The distance of the planet from the sun.
-            radius (float): The radius of the planet.
-            speed (float): The orbital speed of the planet.
-            rotation_speed (float): The rotational speed of the planet.
-            diffuse_path (str): The path to the diffuse texture of the planet.
-            normal_path (str): The path to the normal texture of the planet.
-            atmosphere_thickness (float, optional): The thickness of the planet's atmosphere. Defaults to 0.0.
-            atmosphere_color (list, optional): The color of the planet's atmosphere. Defaults to [0.0, 0.0, 0.0].
-            light_color (list, optional): The color of the planet's light. Defaults to [0.0, 0.0, 0.0].
-        """
-        self.name = name
-        self.distance = distance
-        self.radius = radius
-        self.speed = speed
-        self.rotation_speed = rotation_speed
-        self.diffuse_path = diffuse_path
-        self.normal_path = normal_path
-        self.atmosphere_thickness = atmosphere_thickness
-        self.atmosphere_color = np.array(atmosphere_color, dtype=np.float32)
-        self.angle = 0.0
-        self.rotation_angle = 0.0
-        self.light_color = np.array(light_color, dtype=np.float32)
+            store (BodyStore): The store holding the body.
+            index (int): The row of the body.
+        """
+        object.__setattr__(self, "store", store)
+        object.__setattr__(self, "index", index)
+
+    @property
+    def name(self):
+        """
+        str: The name of the planet.
+        """
+        return self.store.names[self.index]
+
+    @property
+    def diffuse_path(self):
+        """
+        str: The path to the diffuse texture of the planet.
+        """
+        return self.store.diffuse_paths[self.index]
+
+    @property
+    def normal_path(self):
+        """
+        str: The path to the normal texture of the planet.
+        """
+        return self.store.normal_paths[self.index]
+
+    def __getattr__(self, name):
+        """
+        Get an attribute of the planet from its column. Vector attributes are views that write through.
+
+        Args:
+            name (str): The name of the column.
+
+        Returns:
+            The value of the column in the planet's row.
+        """
+        arrays = self.store.arrays
+        if name not in arrays:
+            raise AttributeError(name)
+        value = arrays[name][self.index]
+        return value if value.ndim else value.item()
+
+    def __setattr__(self, name, value):
+        """
+        Set an attribute of the planet in its column.
+
+        Args:
+            name (str): The name of the column.
+            value: The new value.
+        """
+        arrays = self.store.arrays
+        if name not in arrays:
+            raise AttributeError(f"Unknown planet attribute: {name}")
+        arrays[name][self.index] = value
 
     def update(self, animation_time):
         """
@@ -38,4 +72,4 @@ class Planet:
             animation_time (float): The current animation time.
         """
         self.angle = self.speed * animation_time
-        self.rotation_angle = self.rotation_speed * animation_time
\ No newline at end of file
+        self.rotation_angle = self.rotation_speed * animation_time
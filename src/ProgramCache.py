@@ -0,0 +1,86 @@
+import hashlib
+import os
+import struct
+import warnings
+
+from AssetCache import AssetCache
+
+class ProgramCache(AssetCache):
+    # After the common key, which covers the vertex shader, the header stores the binary format (uint32), the
+    # binary size (uint64) and the sha256 of everything else the binary was built from: the fragment shader, the
+    # defines of the variant and the driver. The payload is the linked program binary.
+    MAGIC = b"SSPROG01"
+    FIELDS = struct.Struct("<IQ32s")
+    EXTENSION = ".prog"
+
+    def __init__(self, cache_dir="./cache/programs", rebuild=False):
+        """
+        Initialize a new ProgramCache object, linked shader program binaries from glGetProgramBinary.
+
+        A binary only works with the driver that made it, so the renderer and version strings are part of
+        the key, and a binary the driver rejects anyway is simply compiled again.
+
+        Args:
+            cache_dir (str, optional): The directory the cache files are stored in. Defaults to "./cache/programs".
+            rebuild (bool, optional): Whether to ignore existing cache files and compile every program. Defaults to False.
+        """
+        super().__init__(cache_dir, rebuild)
+
+    def dependencies(self, fragment_shader_path, defines, driver):
+        """
+        Hash what a program depends on besides its vertex shader.
+
+        Args:
+            fragment_shader_path (str): The path to the fragment shader.
+            defines (tuple): The macros defined for the variant.
+            driver (str): The renderer and version of the driver.
+
+        Returns:
+            bytes: The sha256 digest.
+        """
+        digest = hashlib.sha256(self.content_hash(fragment_shader_path))
+        digest.update("\n".join(defines).encode("utf-8"))
+        digest.update(driver.encode("utf-8"))
+        return digest.digest()
+
+    def load(self, vertex_shader_path, variant, dependencies):
+        """
+        Read a program binary if the cache holds one built from the same sources for the same driver.
+
+        Args:
+            vertex_shader_path (str): The path to the vertex shader.
+            variant (str): The name of the variant.
+            dependencies (bytes): The digest from dependencies().
+
+        Returns:
+            tuple: The binary format and the binary, or None if the entry is missing or stale.
+        """
+        path = self.cache_path(vertex_shader_path, variant)
+        fields = self.read_fields(path, vertex_shader_path, os.stat(vertex_shader_path))
+        if fields is None:
+            return None
+
+        binary_format, size, digest = fields
+        if digest != dependencies or os.path.getsize(path) != self.DATA_OFFSET + size:
+            return None
+
+        with open(path, "rb") as f:
+            f.seek(self.DATA_OFFSET)
+            return binary_format, f.read(size)
+
+    def store(self, vertex_shader_path, variant, dependencies, binary_format, binary):
+        """
+        Write a program binary to the cache.
+
+        Args:
+            vertex_shader_path (str): The path to the vertex shader.
+            variant (str): The name of the variant.
+            dependencies (bytes): The digest from dependencies().
+            binary_format (int): The binary format reported by the driver.
+            binary (bytes): The program binary.
+        """
+        path = self.cache_path(vertex_shader_path, variant)
+        try:
+            self.write_entry(path, vertex_shader_path, os.stat(vertex_shader_path), (binary_format, len(binary), dependencies), (binary,))
+        except OSError as e:
+            warnings.warn(f"WARNING: Could not write program cache {path}: {e}")
@@ -0,0 +1,111 @@
+import numpy as np
+
+from Transforms import Transforms
+
+class SceneGraph:
+    def __init__(self, bodies, moving=None):
+        """
+        Initialize a new SceneGraph object, the retained hierarchy of a BodyStore with cached world transforms.
+
+        The parent column links the bodies into a tree (sun, planets, moons and rings). A body is placed at
+        its parent's position plus its own offset, its rotation and scale are its own. The world positions,
+        model matrices and normal matrices of all bodies are kept from frame to frame, and only the bodies
+        marked dirty, together with everything below them, are recomputed by update(). A body that moves
+        with the animation is marked dirty whenever the animation time changes, so a paused scene
+        recomputes nothing.
+
+        The bodies must all have been added before the scene graph is created.
+
+        Args:
+            bodies (BodyStore): The bodies.
+            moving (numpy.ndarray, optional): The rows of bodies moved by something other than their speeds, eg.
+                the physics simulation, which are marked dirty with the animated ones. Defaults to None.
+        """
+        self.bodies = bodies
+        count = len(bodies)
+
+        depths = bodies.depths()
+        self.levels = [np.flatnonzero(depths == depth) for depth in range(depths.max() + 1)]
+        self.animated = np.flatnonzero((bodies.speed != 0.0) | (bodies.rotation_speed != 0.0))
+        if moving is not None:
+            self.animated = np.union1d(self.animated, moving)
+        self.orbiting = bodies.distance > 0.0
+
+        self.local_positions = np.zeros((count, 3), dtype=np.float32)
+        self.world_positions = np.zeros((count, 3), dtype=np.float32)
+        self.models = np.zeros((count, 4, 4), dtype=np.float32)
+        self.normal_matrices = np.zeros((count, 3, 3), dtype=np.float32)
+        self.transforms = Transforms(count)
+
+        self.dirty = np.ones(count, dtype=bool)
+        self.time = None
+
+    def mark_dirty(self, rows):
+        """
+        Mark bodies for recomputing, eg. after changing their columns. Their children follow at the next update.
+
+        Args:
+            rows (numpy.ndarray or int): The rows of the bodies.
+        """
+        self.dirty[rows] = True
+
+    def set_time(self, time):
+        """
+        Set the animation time, marking the animated bodies dirty if it changed.
+
+        Args:
+            time (float): The animation time.
+        """
+        if time != self.time:
+            self.time = time
+            self.dirty[self.animated] = True
+
+    def update(self, local_positions):
+        """
+        Recompute the dirty bodies and their subtrees, one level of the hierarchy at a time so every
+        parent is up to date before its children.
+
+        Args:
+            local_positions (callable): Called with the rows of the dirty bodies, returns their positions
+                relative to their parents, shape (len(rows), 3).
+
+        Returns:
+            numpy.ndarray: The rows that were recomputed, empty if nothing changed.
+        """
+        bodies = self.bodies
+        parents = bodies.parent
+        for rows in self.levels[1:]:
+            self.dirty[rows] |= self.dirty[parents[rows]]
+
+        updated = np.flatnonzero(self.dirty)
+        if len(updated) == 0:
+            return updated
+
+        self.local_positions[updated] = local_positions(updated)
+
+        angles = bodies.angle
+        for level, rows in enumerate(self.levels):
+            rows = rows[self.dirty[rows]]
+            local = self.local_positions[rows]
+
+            # The angle along the orbit, bodies attached to their parent (the ring) turn with it
+            orbiting = self.orbiting[rows]
+            angles[rows[orbiting]] = np.arctan2(local[orbiting, 2], local[orbiting, 0], dtype=np.float64)
+            if level > 0:
+                attached = rows[~orbiting]
+                angles[attached] = angles[parents[attached]]
+                self.world_positions[rows] = self.world_positions[parents[rows]] + local
+            else:
+                angles[rows[~orbiting]] = 0.0
+                self.world_positions[rows] = local
+
+        time = self.time if self.time is not None else 0.0
+        bodies.rotation_angle[updated] = bodies.rotation_speed[updated] * time
+
+        models, normal_matrices = self.transforms.compute(angles[updated] + bodies.rotation_angle[updated], bodies.scale[updated],
+                                                          self.world_positions[updated])
+        self.models[updated] = models
+        self.normal_matrices[updated] = normal_matrices
+
+        self.dirty[:] = False
+        return updated
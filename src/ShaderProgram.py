@@ -0,0 +1,258 @@
+import time
+
+import numpy as np
+
+from OpenGL.GL import *
+from OpenGL.GL.ARB import parallel_shader_compile
+
+class ShaderProgram:
+    # GL uniform type -> (setter, components per element, numpy dtype, is a matrix)
+    UNIFORM_TYPES = {
+        GL_FLOAT: (glUniform1fv, 1, np.float32, False),
+        GL_FLOAT_VEC2: (glUniform2fv, 2, np.float32, False),
+        GL_FLOAT_VEC3: (glUniform3fv, 3, np.float32, False),
+        GL_FLOAT_VEC4: (glUniform4fv, 4, np.float32, False),
+        GL_FLOAT_MAT3: (glUniformMatrix3fv, 9, np.float32, True),
+        GL_FLOAT_MAT4: (glUniformMatrix4fv, 16, np.float32, True),
+        GL_INT: (glUniform1iv, 1, np.int32, False),
+        GL_BOOL: (glUniform1iv, 1, np.int32, False),
+        GL_SAMPLER_2D: (glUniform1iv, 1, np.int32, False),
+        GL_SAMPLER_2D_ARRAY: (glUniform1iv, 1, np.int32, False),
+        GL_SAMPLER_BUFFER: (glUniform1iv, 1, np.int32, False),
+        GL_INT_SAMPLER_BUFFER: (glUniform1iv, 1, np.int32, False),
+        GL_UNSIGNED_INT_SAMPLER_BUFFER: (glUniform1iv, 1, np.int32, False),
+    }
+
+    # Program and texture bindings belong to the GL context, so they are shadowed once for all programs
+    current_program = None
+    active_texture_unit = None
+    texture_bindings = {}
+
+    # GL calls issued and skipped in the current and the last finished frame
+    calls_issued = 0
+    calls_skipped = 0
+    last_frame_calls = (0, 0)
+
+    def __init__(self, program):
+        """
+        Wrap a linked shader program and look up all of its uniforms.
+
+        Args:
+            program (int): The program ID.
+        """
+        self.program = program
+
+        # name -> (location, setter, components, dtype, is a matrix)
+        self.uniforms = {}
+        # name -> last value uploaded
+        self.values = {}
+
+        for index in range(glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)):
+            name, _, uniform_type = glGetActiveUniform(self.program, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            if uniform_type not in self.UNIFORM_TYPES:
+                continue
+
+            # Arrays are reported as "name[0]", their elements are set together from the first location
+            location = glGetUniformLocation(self.program, name)
+            self.uniforms[name.split("[")[0]] = (location,) + self.UNIFORM_TYPES[uniform_type]
+
+    @classmethod
+    def compile_variants(cls, vertex_shader_path, fragment_shader_path, variants, cache=None):
+        """
+        Compile and link a program for every variant of a pair of shaders, the sources with the variant's
+        macros defined after the #version line.
+
+        Every shader and program is handed to the driver before the status of any of them is read, so a
+        driver that compiles on its own threads (ARB_parallel_shader_compile) builds them in parallel instead
+        of one after the other. Programs whose binaries are in the cache are not compiled at all, the others
+        are stored in it. Programs are not validated: validation checks them against the current state, in
+        which every sampler still uses unit 0, and samplers of different types only get their own units once
+        a program is in use.
+
+        Args:
+            vertex_shader_path (str): The path to the vertex shader file.
+            fragment_shader_path (str): The path to the fragment shader file.
+            variants (dict): The macros to define, a tuple of names, by the name of every variant.
+            cache (ProgramCache, optional): The cache of program binaries. Defaults to None.
+
+        Returns:
+            dict: The ShaderProgram of every variant, by its name.
+        """
+        start = time.perf_counter()
+        with open(vertex_shader_path, 'r') as f:
+            vertex_source = f.read()
+        with open(fragment_shader_path, 'r') as f:
+            fragment_source = f.read()
+
+        if cache is not None and glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) == 0:
+            cache = None
+        if parallel_shader_compile.glInitParallelShaderCompileARB():
+            parallel_shader_compile.glMaxShaderCompilerThreadsARB(0xFFFFFFFF)
+        driver = f"{glGetString(GL_RENDERER).decode()} {glGetString(GL_VERSION).decode()}"
+
+        programs = {}
+        pending = []
+        for name, defines in variants.items():
+            dependencies = cache.dependencies(fragment_shader_path, defines, driver) if cache is not None else None
+            cached = cache.load(vertex_shader_path, name, dependencies) if cache is not None else None
+            if cached is not None:
+                # A driver update can make a binary unusable, it is then compiled like a cache miss
+                program = glCreateProgram()
+                glProgramBinary(program, cached[0], cached[1], len(cached[1]))
+                if glGetProgramiv(program, GL_LINK_STATUS):
+                    programs[name] = program
+                    continue
+                glDeleteProgram(program)
+
+            shaders = []
+            program = glCreateProgram()
+            for shader_type, source in ((GL_VERTEX_SHADER, vertex_source), (GL_FRAGMENT_SHADER, fragment_source)):
+                shader = glCreateShader(shader_type)
+                glShaderSource(shader, cls.define(source, defines))
+                glCompileShader(shader)
+                glAttachShader(program, shader)
+                shaders.append(shader)
+            if cache is not None:
+                glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+            glLinkProgram(program)
+            pending.append((name, program, shaders, dependencies))
+
+        # Reading a status waits for that compile or link to finish
+        for name, program, shaders, dependencies in pending:
+            for shader in shaders:
+                if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+                    raise Exception(f"Failed to compile the {name} shader variant: {glGetShaderInfoLog(shader).decode()}")
+            if not glGetProgramiv(program, GL_LINK_STATUS):
+                raise Exception(f"Failed to link the {name} shader variant: {glGetProgramInfoLog(program).decode()}")
+            for shader in shaders:
+                glDetachShader(program, shader)
+                glDeleteShader(shader)
+
+            if cache is not None:
+                size = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+                binary = np.empty(size, dtype=np.uint8)
+                length = np.zeros(1, dtype=np.int32)
+                binary_format = np.zeros(1, dtype=np.uint32)
+                glGetProgramBinary(program, size, length, binary_format, binary)
+                cache.store(vertex_shader_path, name, dependencies, int(binary_format[0]), binary[:length[0]].tobytes())
+            programs[name] = program
+
+        print(f"Shader variants: {len(variants)} programs, {len(pending)} compiled: {1000 * (time.perf_counter() - start):.1f} ms")
+        return {name: cls(programs[name]) for name in variants}
+
+    @staticmethod
+    def define(source, defines):
+        """
+        Define macros in a shader source, right after its #version line. A #line directive keeps the line
+        numbers of the compiler messages those of the file.
+
+        Args:
+            source (str): The shader source.
+            defines (tuple): The names of the macros.
+
+        Returns:
+            str: The source with the macros defined.
+        """
+        version, _, rest = source.partition("\n")
+        return version + "\n" + "".join(f"#define {name}\n" for name in defines) + "#line 2\n" + rest
+
+    def set_all(self, values):
+        """
+        Set several uniforms of this program, see set(). The program must be current.
+
+        Args:
+            values (dict): The values by uniform name.
+        """
+        for name, value in values.items():
+            self.set(name, value)
+
+    def use(self):
+        """
+        Make this the current program.
+        """
+        if ShaderProgram.current_program is self.program:
+            ShaderProgram.calls_skipped += 1
+            return
+        glUseProgram(self.program)
+        ShaderProgram.current_program = self.program
+        ShaderProgram.calls_issued += 1
+
+    def set(self, name, value):
+        """
+        Set a uniform of this program, unless it already holds the same value. The program must be current.
+        Uniforms the program does not use are ignored, like GL does.
+
+        Args:
+            name (str): The name of the uniform (without an array index).
+            value: The value, a scalar, a sequence or a numpy array. Arrays of elements are set all at once.
+        """
+        uniform = self.uniforms.get(name)
+        if uniform is None:
+            ShaderProgram.calls_skipped += 1
+            return
+
+        location, setter, components, dtype, is_matrix = uniform
+        data = np.asarray(value, dtype=dtype).reshape(-1)
+
+        previous = self.values.get(name)
+        if previous is not None and np.array_equal(previous, data):
+            ShaderProgram.calls_skipped += 1
+            return
+
+        if is_matrix:
+            setter(location, data.size // components, GL_FALSE, data)
+        else:
+            setter(location, data.size // components, data)
+        self.values[name] = data.copy()
+        ShaderProgram.calls_issued += 1
+
+    @classmethod
+    def bind_texture(cls, unit, texture, target=GL_TEXTURE_2D):
+        """
+        Bind a texture to a texture unit, unless it is already bound there.
+
+        Args:
+            unit (int): The texture unit index (0 for GL_TEXTURE0).
+            texture (int): The texture ID.
+            target (int, optional): The texture target. Defaults to GL_TEXTURE_2D.
+        """
+        if cls.texture_bindings.get((unit, target)) == texture:
+            cls.calls_skipped += 1
+            return
+
+        if cls.active_texture_unit != unit:
+            glActiveTexture(GL_TEXTURE0 + unit)
+            cls.active_texture_unit = unit
+            cls.calls_issued += 1
+
+        glBindTexture(target, texture)
+        cls.texture_bindings[(unit, target)] = texture
+        cls.calls_issued += 1
+
+    @classmethod
+    def invalidate_bindings(cls):
+        """
+        Forget the shadowed texture and program bindings, after code outside ShaderProgram changed them.
+        """
+        cls.current_program = None
+        cls.active_texture_unit = None
+        cls.texture_bindings = {}
+
+    @classmethod
+    def begin_frame(cls):
+        """
+        Start counting the GL calls of a new frame. The counts of the frame that just finished
+        are kept in last_frame_calls as (issued, skipped).
+        """
+        cls.last_frame_calls = (cls.calls_issued, cls.calls_skipped)
+        cls.calls_issued = 0
+        cls.calls_skipped = 0
+
+    def cleanup(self):
+        """
+        Delete the program.
+        """
+        if ShaderProgram.current_program is self.program:
+            ShaderProgram.current_program = None
+        glDeleteProgram(self.program)
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import numpy as np
+
+class Simulation:
+    # Longest the simulation may fall behind the wall clock before the missed steps are dropped, in seconds
+    MAX_LAG = 0.25
+
+    def __init__(self, rate, animation_step, cloud_step, physics=None, animation_time=0.0, cloud_animation_time=0.0):
+        """
+        Initialize a new Simulation object, which advances the animation at a fixed time step on its own thread.
+
+        After every step the state is published into one of two snapshot buffers, the older one is overwritten
+        and becomes the newest. The renderer interpolates between the two at the current wall clock time,
+        which shows the state of one step ago, so motion stays smooth when the frame rate and the step rate
+        differ. Both sides only hold the lock to copy or blend the snapshots; the physics runs outside it.
+
+        Args:
+            rate (float): The number of steps per second of wall clock time.
+            animation_step (float): The animation time advanced per step.
+            cloud_step (float): The cloud animation time advanced per step.
+            physics (Physics, optional): The gravity simulation advanced with the animation. Defaults to None.
+            animation_time (float, optional): The animation time to start from. Defaults to 0.0.
+            cloud_animation_time (float, optional): The cloud animation time to start from. Defaults to 0.0.
+        """
+        self.interval = 1.0 / rate
+        self.animation_step = animation_step
+        self.cloud_step = cloud_step
+        self.physics = physics
+        self.animation_time = animation_time
+        self.cloud_animation_time = cloud_animation_time
+        self.running = True
+        self.steps = 0
+        self.dropped_steps = 0
+
+        # Both snapshots, each the wall clock time, animation time and cloud animation time, and the positions
+        body_count = physics.count if physics is not None else 0
+        self.clocks = np.zeros((2, 3))
+        self.positions = np.zeros((2, 3, body_count))
+        self.current = 0
+        self.lock = threading.Lock()
+
+        now = time.perf_counter()
+        self.publish(now - self.interval)
+        self.publish(now)
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Start the simulation thread.
+        """
+        self.thread = threading.Thread(target=self.run, name="Simulation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the simulation thread and wait for it to finish its step.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """
+        The loop of the simulation thread: step whenever the wall clock passes the next step time.
+        """
+        next_step = time.perf_counter() + self.interval
+        while not self.stop_event.is_set():
+            wait = next_step - time.perf_counter()
+            if wait > 0.0:
+                self.stop_event.wait(wait)
+                continue
+
+            self.step()
+            self.publish(next_step)
+            next_step += self.interval
+
+            # Drop the steps that cannot be caught up with instead of spiralling further behind
+            lag = time.perf_counter() - next_step
+            if lag > self.MAX_LAG:
+                dropped = int(lag / self.interval)
+                self.dropped_steps += dropped
+                next_step += dropped * self.interval
+
+    def step(self):
+        """
+        Advance the state by one fixed step, if the animation is running.
+        """
+        if not self.running:
+            return
+
+        self.animation_time += self.animation_step
+        self.cloud_animation_time += self.cloud_step
+        if self.physics is not None:
+            self.physics.advance(self.animation_step)
+        self.steps += 1
+
+    def publish(self, wall_time):
+        """
+        Copy the state into the older snapshot, which then becomes the newest.
+
+        Args:
+            wall_time (float): The wall clock time of the state, from time.perf_counter().
+        """
+        with self.lock:
+            back = 1 - self.current
+            self.clocks[back] = (wall_time, self.animation_time, self.cloud_animation_time)
+            if self.physics is not None:
+                self.positions[back] = self.physics.positions
+            self.current = back
+
+    def interpolate(self, wall_time=None):
+        """
+        Get the state at a wall clock time, one step behind, blended linearly between the two snapshots.
+
+        Args:
+            wall_time (float, optional): The wall clock time, from time.perf_counter(). Defaults to now.
+
+        Returns:
+            tuple: The animation time, the cloud animation time and the positions of the physics bodies,
+                shape (3, N), or None without physics.
+        """
+        wall_time = time.perf_counter() if wall_time is None else wall_time
+        with self.lock:
+            previous, current = 1 - self.current, self.current
+            span = self.clocks[current, 0] - self.clocks[previous, 0]
+            alpha = min(max((wall_time - self.clocks[current, 0]) / span, 0.0), 1.0) if span > 0.0 else 1.0
+
+            animation_time, cloud_animation_time = self.clocks[previous, 1:] + alpha * (self.clocks[current, 1:] - self.clocks[previous, 1:])
+            positions = None
+            if self.physics is not None:
+                positions = self.positions[previous] + alpha * (self.positions[current] - self.positions[previous])
+
+        return float(animation_time), float(cloud_animation_time), positions
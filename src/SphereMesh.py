@@ -0,0 +1,93 @@
+import numpy as np
+
+class SphereMesh:
+    # The faces of the cube the sphere is made from are laid out in the texture as a cross, 4 wide and 3 high
+    LAYOUT = (4, 3)
+
+    def __init__(self, vertices, indices):
+        """
+        Initialize a new SphereMesh object, a generator of the sphere at any number of subdivisions per face.
+
+        The sphere model is a cube whose faces are square grids pushed out onto the sphere, with the texture
+        coordinates of every face spaced evenly over its cell of the cross layout. The grids are recovered
+        from the model: every triangle belongs to the cell its texture coordinates fall in, and the texture
+        coordinates of a vertex give its place in the grid of that face. A sphere with other subdivisions
+        samples the same grids, so the textures land where they do on the model. Subdivisions that divide
+        the model's reuse its vertices exactly, others are interpolated between them and put back onto the
+        sphere.
+
+        Args:
+            vertices (numpy.ndarray): The vertices of the sphere model, in the layout of Geometry.
+            indices (numpy.ndarray): The triangle indices of the sphere model.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 8)
+        triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        positions, uvs, normals = vertices[:, :3], vertices[:, 3:5], vertices[:, 5:]
+        self.radius = float(np.linalg.norm(positions, axis=1).mean())
+
+        origin = uvs.min(axis=0)
+        cell_size = (uvs.max(axis=0) - origin) / self.LAYOUT
+        cells = np.floor((uvs[triangles].mean(axis=1) - origin) / cell_size).astype(np.int64)
+        cells = np.minimum(cells, np.array(self.LAYOUT) - 1)
+        cells = cells[:, 0] + self.LAYOUT[0] * cells[:, 1]
+
+        # The grids of positions and normals and the texture coordinates of the corners of every face
+        self.faces = []
+        for cell in np.unique(cells):
+            face_vertices = np.unique(triangles[cells == cell])
+            size = int(round(np.sqrt(len(face_vertices)))) - 1
+            if (size + 1) ** 2 != len(face_vertices):
+                raise Exception("The sphere model is not made of square grids")
+
+            low, high = uvs[face_vertices].min(axis=0), uvs[face_vertices].max(axis=0)
+            grid = np.rint((uvs[face_vertices] - low) / (high - low) * size).astype(np.int64)
+            grid_vertices = np.zeros((size + 1, size + 1, 6))
+            grid_vertices[grid[:, 0], grid[:, 1]] = np.hstack((positions[face_vertices], normals[face_vertices]))
+            self.faces.append((grid_vertices, low, high))
+
+        self.subdivisions = len(self.faces[0][0]) - 1
+
+    def build(self, subdivisions):
+        """
+        Build the sphere with a number of subdivisions per face edge.
+
+        Args:
+            subdivisions (int): The number of quads along every edge of a face, each split into two triangles.
+
+        Returns:
+            tuple: The float32 vertices, in the layout of Geometry, and the uint32 indices.
+        """
+        steps = np.linspace(0.0, 1.0, subdivisions + 1)
+        s, t = np.meshgrid(steps, steps, indexing="ij")
+
+        # The quads of one face, split along their shorter diagonal below
+        i, j = np.meshgrid(np.arange(subdivisions), np.arange(subdivisions), indexing="ij")
+        corner = (i * (subdivisions + 1) + j).reshape(-1)
+        quads = np.stack([corner, corner + subdivisions + 1, corner + subdivisions + 2, corner + 1], axis=1)
+
+        vertices = []
+        indices = []
+        for grid_vertices, low, high in self.faces:
+            # Bilinear interpolation of the model's grid
+            x = s * self.subdivisions
+            y = t * self.subdivisions
+            x0 = np.minimum(np.floor(x).astype(np.int64), self.subdivisions - 1)
+            y0 = np.minimum(np.floor(y).astype(np.int64), self.subdivisions - 1)
+            fx, fy = (x - x0)[..., None], (y - y0)[..., None]
+            sampled = ((1.0 - fx) * (1.0 - fy) * grid_vertices[x0, y0] + fx * (1.0 - fy) * grid_vertices[x0 + 1, y0] +
+                       (1.0 - fx) * fy * grid_vertices[x0, y0 + 1] + fx * fy * grid_vertices[x0 + 1, y0 + 1]).reshape(-1, 6)
+            positions = sampled[:, :3] * (self.radius / np.linalg.norm(sampled[:, :3], axis=1, keepdims=True))
+            normals = sampled[:, 3:] / np.linalg.norm(sampled[:, 3:], axis=1, keepdims=True)
+            uvs = low + np.stack([s, t], axis=-1).reshape(-1, 2) * (high - low)
+
+            # Counter-clockwise in texture space, which faces outwards
+            main = (np.linalg.norm(positions[quads[:, 0]] - positions[quads[:, 2]], axis=1) <=
+                    np.linalg.norm(positions[quads[:, 1]] - positions[quads[:, 3]], axis=1))
+            triangles = np.where(main[:, None],
+                                 np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=1),
+                                 np.concatenate([quads[:, [0, 1, 3]], quads[:, [1, 2, 3]]], axis=1))
+
+            indices.append(triangles.reshape(-1) + sum(len(face) for face in vertices))
+            vertices.append(np.hstack((positions, uvs, normals)))
+
+        return np.vstack(vertices).astype(np.float32).reshape(-1), np.concatenate(indices).astype(np.uint32)
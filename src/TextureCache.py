@@ -0,0 +1,177 @@
+import argparse
+import os
+import struct
+import warnings
+
+import numpy as np
+from PIL import Image
+
+from AssetCache import AssetCache
+
+class TextureCache(AssetCache):
+    # After the common key, the header stores the width, height and channel count of level 0
+    # and the number of mip levels (uint32 each). The payload is every mip level from the largest
+    # to a 1x1 texel, each level tightly packed with the top row first like the source image.
+    # Level i is max(1, width >> i) by max(1, height >> i), matching the sizes GL expects.
+    MAGIC = b"SSTEX001"
+    FIELDS = struct.Struct("<IIII")
+    EXTENSION = ".tex"
+    MODES = {3: "RGB", 4: "RGBA"}
+
+    def __init__(self, cache_dir="./cache/textures", max_size=0, rebuild=False):
+        """
+        Initialize a new TextureCache object.
+
+        Args:
+            cache_dir (str, optional): The directory the cache files are stored in. Defaults to "./cache/textures".
+            max_size (int, optional): Cap on the width and height of level 0. Larger images are halved until they fit,
+                which drops their top mip levels. 0 keeps the full resolution. Defaults to 0.
+            rebuild (bool, optional): Whether to ignore existing cache files and rebuild every entry. Defaults to False.
+        """
+        super().__init__(cache_dir, rebuild)
+        self.max_size = max_size
+
+    def cache_path(self, filename):
+        """
+        Get the cache file used for a source file. Entries built with a resolution cap are stored separately.
+
+        Args:
+            filename (str): The path to the source image file.
+
+        Returns:
+            str: The path to the cache file.
+        """
+        path = super().cache_path(filename)
+        if self.max_size:
+            root, extension = os.path.splitext(path)
+            path = f"{root}-max{self.max_size}{extension}"
+        return path
+
+    def load(self, filename):
+        """
+        Load every mip level of a texture, building the cache entry from the source image when it is stale.
+
+        Args:
+            filename (str): The path to the source image file.
+
+        Returns:
+            tuple: The width and height of level 0, the image mode ('RGB' or 'RGBA') and the list of levels.
+                Cache hits are read only memory maps.
+        """
+        path = self.cache_path(filename)
+        stat = os.stat(filename)
+
+        cached = self.read(path, filename, stat)
+        if cached is not None:
+            return cached
+
+        width, height, mode, levels = self.build(filename)
+
+        try:
+            self.write_entry(path, filename, stat, (width, height, len(mode), len(levels)), levels)
+        except OSError as e:
+            warnings.warn(f"WARNING: Could not write texture cache {path}: {e}")
+
+        return width, height, mode, levels
+
+    def read(self, path, filename, stat):
+        """
+        Memory map a cache file if it is still valid for its source.
+
+        Args:
+            path (str): The path to the cache file.
+            filename (str): The path to the source image file.
+            stat (os.stat_result): The current stat of the source file.
+
+        Returns:
+            tuple: The width, height, mode and mapped levels, or None if the entry is missing or stale.
+        """
+        fields = self.read_fields(path, filename, stat)
+        if fields is None:
+            return None
+
+        width, height, channels, level_count = fields
+        sizes = self.level_sizes(width, height)
+        if channels not in self.MODES or level_count != len(sizes):
+            return None
+
+        level_bytes = [w * h * channels for w, h in sizes]
+        if os.path.getsize(path) != self.DATA_OFFSET + sum(level_bytes):
+            return None
+
+        data = np.memmap(path, dtype=np.uint8, mode="r", offset=self.DATA_OFFSET, shape=(sum(level_bytes),))
+        offsets = np.cumsum([0] + level_bytes)
+        levels = [data[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+        return width, height, self.MODES[channels], levels
+
+    def build(self, filename):
+        """
+        Decode a source image and bake its full mip chain with a box filter.
+
+        Args:
+            filename (str): The path to the source image file.
+
+        Returns:
+            tuple: The width and height of level 0, the image mode and the list of levels as bytes.
+        """
+        with Image.open(filename) as image:
+            if image.mode not in self.MODES.values():
+                raise Exception(f"Unsupported image mode: {image.mode}")
+
+            width, height = image.size
+            if self.max_size:
+                while max(width, height) > self.max_size:
+                    width, height = max(1, width // 2), max(1, height // 2)
+
+            level = image if (width, height) == image.size else image.resize((width, height), Image.BOX)
+            levels = [level.tobytes()]
+            for w, h in self.level_sizes(width, height)[1:]:
+                level = level.resize((w, h), Image.BOX)
+                levels.append(level.tobytes())
+
+            return width, height, image.mode, levels
+
+    @staticmethod
+    def level_sizes(width, height):
+        """
+        Get the size of every mip level of a texture.
+
+        Args:
+            width (int): The width of level 0.
+            height (int): The height of level 0.
+
+        Returns:
+            list: The (width, height) of each level, down to 1x1.
+        """
+        sizes = [(width, height)]
+        while sizes[-1] != (1, 1):
+            w, h = sizes[-1]
+            sizes.append((max(1, w // 2), max(1, h // 2)))
+        return sizes
+
+def main():
+    """
+    Build the texture cache for every PNG image under the given paths.
+    """
+    parser = argparse.ArgumentParser(description="Bake GPU-ready textures with their mip chains into ./cache/textures")
+    parser.add_argument("paths", nargs="*", default=["./resources"], help="image files or directories to search for PNG images")
+    parser.add_argument("--max-size", type=int, default=0, help="cap the texture width and height, 0 keeps the full resolution")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild entries even if they are up to date")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.lower().endswith(".png")]
+        else:
+            files.append(path)
+
+    cache = TextureCache(max_size=args.max_size, rebuild=args.rebuild)
+    for filename in files:
+        width, height, mode, levels = cache.load(filename)
+        print(f"{filename}: {width}x{height} {mode}, {len(levels)} levels -> {cache.cache_path(filename)}")
+
+if __name__ == "__main__":
+    main()
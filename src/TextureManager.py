@@ -0,0 +1,495 @@
+import os
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from OpenGL.GL import *
+from PIL import Image
+
+class StreamingTexture:
+    def __init__(self, key, future):
+        """
+        Initialize a new StreamingTexture object, the streaming state of one texture.
+
+        Args:
+            key (str): The normalized path the texture is cached under.
+            future (concurrent.futures.Future): The background decode of the texture.
+        """
+        self.key = key
+        self.future = future
+        self.start = time.perf_counter()
+        self.decoded = None
+        self.base_level = None
+        self.priority = 0.0
+        self.uploaded_bytes = 0
+
+class TextureManager:
+    # Levels up to this many texels are uploaded as soon as a streamed texture is decoded
+    STREAMING_RESIDENT_TEXELS = 64 * 64
+    STREAMING_PBO_COUNT = 3
+
+    def __init__(self, cache=None, max_workers=None, streaming=False, upload_budget=4 << 20):
+        """
+        Initialize a new TextureManager object.
+
+        Textures are cached by their normalized path, so every file is decoded and uploaded at most once
+        no matter how many objects use it.
+
+        In streaming mode load() returns straight away with a 1x1 placeholder. Once the baked mip chain has
+        been mapped in the background, the smallest levels are uploaded and update() then uploads the larger
+        levels through pixel buffer objects, a few per frame, preferring the textures that are largest on screen.
+
+        Args:
+            cache (TextureCache, optional): The on-disk cache of baked mip chains. Without one, images are decoded
+                from the source files and their mipmaps are generated by GL. Defaults to None.
+            max_workers (int, optional): The number of threads used to decode prefetched images. Defaults to the number of CPUs.
+            streaming (bool, optional): Whether to stream the textures in over several frames. Defaults to False.
+            upload_budget (int, optional): The number of bytes streamed per frame. Defaults to 4 MiB.
+        """
+        self.cache = cache
+        self.textures = {}
+        self.arrays = {}
+        self.stats = {}
+        self.pending = {}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None
+        self.streaming = streaming
+        self.upload_budget = upload_budget
+        self.streams = {}
+        self.pbos = []
+        self.next_pbo = 0
+
+    def prefetch(self, paths):
+        """
+        Start decoding images on a thread pool. This does not need a GL context, so it can run
+        while the window, shaders and geometry are being created.
+
+        Args:
+            paths (iterable): The paths to the image files.
+        """
+        for path in paths:
+            key = os.path.normpath(path)
+            if key in self.textures or key in self.pending:
+                continue
+            self.pending[key] = self.submit(path)
+
+    def submit(self, path):
+        """
+        Decode an image on the thread pool.
+
+        Args:
+            path (str): The path to the image file.
+
+        Returns:
+            concurrent.futures.Future: The pending result of decode().
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="texture-decode")
+        return self.executor.submit(self.decode, path)
+
+    def upload_pending(self):
+        """
+        Upload every prefetched image in the order the decodes complete. Must be called on the GL thread.
+        Images that failed to decode stay pending, so the error is raised by the load() that asks for them.
+        In streaming mode this does nothing, update() uploads the images instead.
+        """
+        if self.streaming:
+            return
+
+        futures = {future: key for key, future in self.pending.items()}
+        for future in as_completed(futures):
+            if future.exception() is None:
+                key = futures[future]
+                del self.pending[key]
+                self.upload(key, future.result())
+        self.shutdown_executor()
+
+    def load(self, path):
+        """
+        Get the texture for an image file, uploading it on first use.
+
+        Args:
+            path (str): The path to the image file.
+
+        Returns:
+            int: The texture ID.
+        """
+        key = os.path.normpath(path)
+        texture = self.textures.get(key)
+        if texture is not None:
+            return texture
+
+        future = self.pending.pop(key, None)
+
+        if self.streaming:
+            texture = self.create_texture()
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 1, 1, 0, GL_RGBA, GL_UNSIGNED_BYTE, bytes((128, 128, 128, 255)))
+            self.textures[key] = texture
+            self.streams[texture] = StreamingTexture(key, future or self.submit(path))
+            return texture
+
+        self.shutdown_executor()
+        decoded = future.result() if future is not None else self.decode(path)
+        return self.upload(key, decoded)
+
+    def load_array(self, paths):
+        """
+        Pack images into the layers of one 2D array texture, so the objects using them can share a single
+        binding. Layers must have one size, so images that differ from the most common size are resampled
+        to it. A baked mip level of the right size is used as it is instead of resampling level 0.
+
+        Args:
+            paths (list): The paths to the image files, in layer order. Repeated paths share a layer.
+
+        Returns:
+            tuple: The texture ID and the layer of each path.
+        """
+        keys = [os.path.normpath(path) for path in paths]
+        unique_keys = list(dict.fromkeys(keys))
+        layers = [unique_keys.index(key) for key in keys]
+
+        texture = self.arrays.get(tuple(unique_keys))
+        if texture is not None:
+            return texture, layers
+
+        decoded = []
+        for key in unique_keys:
+            future = self.pending.pop(key, None)
+            decoded.append(future.result() if future is not None else self.decode(key))
+        self.shutdown_executor()
+
+        start = time.perf_counter()
+        sizes = [(width, height) for _, width, height, _, _ in decoded]
+        width, height = max(set(sizes), key=lambda size: (sizes.count(size), size))
+
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, texture)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA, width, height, len(decoded), 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        for layer, (_, w, h, color_format, levels) in enumerate(decoded):
+            data = self.resample(w, h, color_format, levels, width, height)
+            glTexSubImage3D(GL_TEXTURE_2D_ARRAY, 0, 0, 0, layer, width, height, 1, GL_RGBA, GL_UNSIGNED_BYTE, data)
+        glGenerateMipmap(GL_TEXTURE_2D_ARRAY)
+
+        self.arrays[tuple(unique_keys)] = texture
+        decode_time = sum(d[0] for d in decoded)
+        self.stats[f"array of {len(decoded)} layers ({width}x{height})"] = (decode_time + time.perf_counter() - start, width * height * 4 * len(decoded))
+
+        return texture, layers
+
+    def resample(self, width, height, color_format, levels, target_width, target_height):
+        """
+        Get the RGBA pixels of an image at another size.
+
+        Args:
+            width (int): The width of level 0.
+            height (int): The height of level 0.
+            color_format (int): The GL color format of the levels.
+            levels (list): The mip levels of the image.
+            target_width (int): The width to resample to.
+            target_height (int): The height to resample to.
+
+        Returns:
+            bytes-like: The tightly packed RGBA pixels, top row first.
+        """
+        mode = 'RGBA' if color_format == GL_RGBA else 'RGB'
+
+        for level, data in enumerate(levels):
+            if (max(1, width >> level), max(1, height >> level)) == (target_width, target_height) and mode == 'RGBA':
+                return data
+
+        image = Image.frombuffer(mode, (width, height), bytes(levels[0]), 'raw', mode, 0, 1).convert('RGBA')
+        return image.resize((target_width, target_height), Image.BILINEAR).tobytes()
+
+    def decode(self, path):
+        """
+        Decode an image file, or map its baked mip chain from the texture cache. Safe to call from any thread.
+
+        Args:
+            path (str): The path to the image file.
+
+        Returns:
+            tuple: The decode time in seconds, the width, the height, the GL color format and the list of mip levels.
+                A single level means the mipmaps still have to be generated.
+        """
+        start = time.perf_counter()
+
+        if self.cache is not None:
+            width, height, mode, levels = self.cache.load(path)
+        else:
+            with Image.open(path) as image:
+                # The raw decoded bytes are handed to glTexImage2D as they are, without building any
+                # per-pixel Python objects or an intermediate numpy array
+                width, height = image.size
+                mode = image.mode
+                levels = [image.tobytes()]
+
+        # Determine the color format based on the number of channels
+        if mode == 'RGB':
+            color_format = GL_RGB
+        elif mode == 'RGBA':
+            color_format = GL_RGBA
+        else:
+            raise Exception(f"Unsupported image mode: {mode}")
+
+        return time.perf_counter() - start, width, height, color_format, levels
+
+    def upload(self, key, decoded):
+        """
+        Upload a decoded image to a new texture. Must be called on the GL thread.
+
+        Args:
+            key (str): The normalized path the texture is cached under.
+            decoded (tuple): The result of decode().
+
+        Returns:
+            int: The texture ID.
+        """
+        decode_time, width, height, color_format, levels = decoded
+        start = time.perf_counter()
+
+        texture = self.create_texture()
+        for level, data in enumerate(levels):
+            glTexImage2D(GL_TEXTURE_2D, level, color_format, max(1, width >> level), max(1, height >> level), 0, color_format, GL_UNSIGNED_BYTE, data)
+
+        if len(levels) > 1:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+        else:
+            glGenerateMipmap(GL_TEXTURE_2D)
+
+        self.textures[key] = texture
+        self.stats[key] = (decode_time + time.perf_counter() - start, sum(len(data) for data in levels))
+
+        return texture
+
+    def create_texture(self):
+        """
+        Create a texture and leave it bound to GL_TEXTURE_2D, ready for its image data.
+
+        Returns:
+            int: The texture ID.
+        """
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+
+        # Set the texture wrapping and filtering parameters
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+
+        # Rows are tightly packed, which matters for RGB images whose width is not a multiple of 4
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+        return texture
+
+    def prioritize(self, texture, screen_radius):
+        """
+        Report how large a streamed texture is on screen this frame. Textures that are not reported keep
+        streaming, after every texture that was.
+
+        Args:
+            texture (int): The texture ID.
+            screen_radius (float): The projected radius, in pixels, of an object using the texture.
+        """
+        stream = self.streams.get(texture)
+        if stream is not None:
+            stream.priority = max(stream.priority, screen_radius)
+
+    def update(self):
+        """
+        Advance texture streaming by one frame. Must be called on the GL thread.
+
+        Textures whose mip chain has been mapped get their storage allocated and their smallest levels
+        uploaded. The per-frame budget is then spent on the next larger level of the textures with the
+        largest on-screen size relative to their current resolution.
+
+        Returns:
+            bool: Whether any texture or buffer bindings were changed.
+        """
+        if not self.streams:
+            return False
+
+        for texture, stream in list(self.streams.items()):
+            if stream.decoded is None and stream.future.done():
+                stream.future, future = None, stream.future
+                try:
+                    stream.decoded = future.result()
+                except Exception as e:
+                    print(f"Error loading texture: {str(e)}")
+                    del self.streams[texture]
+                    continue
+                self.allocate(texture, stream)
+
+        # Order by on-screen pixels per resident texel, so every upload goes where it is most visible
+        queue = []
+        for texture, stream in self.streams.items():
+            if stream.base_level is not None:
+                heapq.heappush(queue, (self.streaming_order(stream), texture))
+
+        budget = self.upload_budget
+        while queue and budget > 0:
+            _, texture = heapq.heappop(queue)
+            stream = self.streams[texture]
+            budget -= self.upload_level(texture, stream, stream.base_level - 1)
+
+            if stream.base_level == 0:
+                self.finish(texture, stream)
+            else:
+                heapq.heappush(queue, (self.streaming_order(stream), texture))
+
+        for stream in self.streams.values():
+            stream.priority = 0.0
+
+        if not self.streams:
+            self.shutdown_executor()
+            self.report()
+
+        return True
+
+    def streaming_order(self, stream):
+        """
+        Get the sort key of a streaming texture, lower keys are uploaded first.
+
+        Args:
+            stream (StreamingTexture): The streaming state of the texture.
+
+        Returns:
+            float: The negated on-screen size per texel of the current base level.
+        """
+        width = max(1, stream.decoded[1] >> stream.base_level)
+        return -(stream.priority + 1.0) / width
+
+    def allocate(self, texture, stream):
+        """
+        Allocate every level of a decoded streaming texture and upload its smallest levels directly.
+
+        Args:
+            texture (int): The texture ID.
+            stream (StreamingTexture): The streaming state of the texture.
+        """
+        _, width, height, color_format, levels = stream.decoded
+        glBindTexture(GL_TEXTURE_2D, texture)
+
+        # Allocate storage for the whole chain, the larger levels are filled in by later frames
+        stream.base_level = len(levels)
+        for level, data in reversed(list(enumerate(levels))):
+            w, h = max(1, width >> level), max(1, height >> level)
+            resident = w * h <= self.STREAMING_RESIDENT_TEXELS or len(levels) == 1
+            glTexImage2D(GL_TEXTURE_2D, level, color_format, w, h, 0, color_format, GL_UNSIGNED_BYTE, data if resident else None)
+            if resident and stream.base_level == level + 1:
+                stream.base_level = level
+                stream.uploaded_bytes += len(data)
+
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, stream.base_level)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+
+        if len(levels) == 1:
+            glGenerateMipmap(GL_TEXTURE_2D)
+        if stream.base_level == 0:
+            self.finish(texture, stream)
+
+    def upload_level(self, texture, stream, level):
+        """
+        Upload one mip level of a streaming texture through a pixel buffer object and make it the base level.
+
+        Args:
+            texture (int): The texture ID.
+            stream (StreamingTexture): The streaming state of the texture.
+            level (int): The mip level to upload.
+
+        Returns:
+            int: The number of bytes uploaded.
+        """
+        _, width, height, color_format, levels = stream.decoded
+        source = np.frombuffer(levels[level], dtype=np.uint8)
+
+        if not self.pbos:
+            self.pbos = list(np.atleast_1d(glGenBuffers(self.STREAMING_PBO_COUNT)))
+        pbo = self.pbos[self.next_pbo]
+        self.next_pbo = (self.next_pbo + 1) % len(self.pbos)
+
+        # Orphan the buffer so the driver does not wait for the transfer that last used it,
+        # then copy the level in and let GL pull it from the buffer asynchronously
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, source.nbytes, None, GL_STREAM_DRAW)
+        pointer = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, source.nbytes, GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        ctypes.memmove(pointer, source.ctypes.data, source.nbytes)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexSubImage2D(GL_TEXTURE_2D, level, 0, 0, max(1, width >> level), max(1, height >> level), color_format, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, level)
+        stream.base_level = level
+        stream.uploaded_bytes += source.nbytes
+
+        return source.nbytes
+
+    def finish(self, texture, stream):
+        """
+        Stop streaming a texture whose full mip chain is resident.
+
+        Args:
+            texture (int): The texture ID.
+            stream (StreamingTexture): The streaming state of the texture.
+        """
+        self.stats[stream.key] = (time.perf_counter() - stream.start, stream.uploaded_bytes)
+        stream.decoded = None
+        del self.streams[texture]
+
+    def report(self):
+        """
+        Print the load time (decode and upload) and the number of bytes uploaded for every texture.
+        While textures are still streaming, the report is left until the last one is resident.
+        """
+        if self.streams:
+            return
+
+        total_time = 0.0
+        total_bytes = 0
+        for path, (seconds, nbytes) in self.stats.items():
+            print(f"Texture {path}: {seconds * 1000.0:.1f} ms, {nbytes / (1 << 20):.2f} MiB")
+            total_time += seconds
+            total_bytes += nbytes
+        print(f"Loaded {len(self.stats)} textures: {total_time * 1000.0:.1f} ms, {total_bytes / (1 << 20):.2f} MiB")
+
+    def shutdown_executor(self):
+        """
+        Stop the decode threads once nothing is left to decode.
+        """
+        decoding = any(stream.future is not None for stream in self.streams.values())
+        if self.executor is not None and not self.pending and not decoding:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def cleanup(self):
+        """
+        Delete every texture owned by the manager.
+        """
+        for future in self.pending.values():
+            future.cancel()
+        for stream in self.streams.values():
+            if stream.future is not None:
+                stream.future.cancel()
+                stream.future = None
+        self.pending.clear()
+        self.streams.clear()
+        self.shutdown_executor()
+
+        if self.pbos:
+            glDeleteBuffers(len(self.pbos), self.pbos)
+        self.pbos = []
+
+        if self.textures or self.arrays:
+            glDeleteTextures(list(self.textures.values()) + list(self.arrays.values()))
+        self.textures.clear()
+        self.arrays.clear()
+        self.stats.clear()
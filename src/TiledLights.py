@@ -0,0 +1,138 @@
+import numpy as np
+
+from OpenGL.GL import *
+
+class TiledLights:
+    # Width and height of a screen tile in pixels
+    TILE_SIZE = 32
+    # The attenuation of the emissive bodies' light, 1 / (1 + a * d + b * d^2), and their intensity, see simple.frag
+    ATTENUATION = (0.1, 0.01)
+    EMISSIVE_INTENSITY = 0.5
+    # A light is left out where its intensity falls below this, which sets its range
+    CUTOFF = 1.0 / 4096.0
+
+    def __init__(self, width, height, tile_size=TILE_SIZE):
+        """
+        Create the buffer textures of the lights and of the per-tile light lists.
+
+        The screen is split into tiles of tile_size pixels and every frame each light is assigned to the tiles
+        its sphere of influence covers on screen, so a fragment only evaluates the lights of its tile. The
+        light buffer texture holds two RGBA32F texels per light: its position and range, then its color. The
+        tile buffer texture holds R32I values: the offset and count of every tile's entries, row by row from
+        the bottom left tile, followed by the entries themselves, which are light indices.
+
+        Args:
+            width (int): The width of the screen.
+            height (int): The height of the screen.
+            tile_size (int, optional): The width and height of a tile in pixels. Defaults to TILE_SIZE.
+        """
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.tile_counts = (-(-width // tile_size), -(-height // tile_size))
+        self.entry_count = 0
+        self.previous = None
+
+        self.buffers = glGenBuffers(2)
+        self.textures = glGenTextures(2)
+        self.light_texture, self.tile_texture = self.textures
+        for buffer, texture, internal_format in zip(self.buffers, self.textures, (GL_RGBA32F, GL_R32I)):
+            glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+            glBufferData(GL_TEXTURE_BUFFER, 16, None, GL_STREAM_DRAW)
+            glBindTexture(GL_TEXTURE_BUFFER, texture)
+            glTexBuffer(GL_TEXTURE_BUFFER, internal_format, buffer)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    @classmethod
+    def ranges(cls, colors):
+        """
+        Get the distance at which the intensity of every light falls to CUTOFF.
+
+        Args:
+            colors (numpy.ndarray): The colors of the lights, shape (N, 3).
+
+        Returns:
+            numpy.ndarray: The ranges, 0 for lights that are below the cutoff everywhere.
+        """
+        linear, quadratic = cls.ATTENUATION
+        # Solve EMISSIVE_INTENSITY * color / (1 + linear * d + quadratic * d^2) = CUTOFF for d
+        constant = 1.0 - cls.EMISSIVE_INTENSITY * np.asarray(colors).max(axis=1) / cls.CUTOFF
+        discriminant = linear * linear - 4.0 * quadratic * constant
+        return np.where(constant < 0.0, (np.sqrt(np.maximum(discriminant, 0.0)) - linear) / (2.0 * quadratic), 0.0)
+
+    def update(self, positions, ranges, colors, view_matrix, projection):
+        """
+        Assign the lights to the tiles and upload the lights and the tile lists. Nothing is done if neither
+        the lights nor the camera changed since the last call.
+
+        Every light's sphere of influence is bounded on screen by the box it projects to, taking the
+        nearest and farthest depth of the sphere for each side, so a light may be listed for a few tiles it
+        does not reach but is never missing from one it does. Lights entirely behind the camera are left out,
+        ones reaching past the near plane cover the whole screen.
+
+        Args:
+            positions (numpy.ndarray): The positions of the lights in world space, shape (N, 3).
+            ranges (numpy.ndarray): The ranges of the lights, shape (N,).
+            colors (numpy.ndarray): The colors of the lights, shape (N, 3).
+            view_matrix (numpy.ndarray): The view matrix.
+            projection (numpy.ndarray): The projection matrix.
+        """
+        state = (np.asarray(positions).tobytes(), np.asarray(view_matrix).tobytes(), np.asarray(projection).tobytes())
+        if state == self.previous:
+            return
+        self.previous = state
+
+        count = len(positions)
+        lights = np.zeros((count, 2, 4), dtype=np.float32)
+        lights[:, 0, :3] = positions
+        lights[:, 0, 3] = ranges
+        lights[:, 1, :3] = colors
+
+        # The view space centers, the camera looks down -Z, so the depths of a sphere are -z - r to -z + r
+        centers = (np.hstack((positions, np.ones((count, 1)))) @ view_matrix)[:, :3]
+        near_plane = projection[3, 2] / (projection[2, 2] - 1.0)
+        nearest = np.maximum(-centers[:, 2] - ranges, near_plane)
+        farthest = -centers[:, 2] + ranges
+        in_front = farthest > near_plane
+        past_near = -centers[:, 2] - ranges <= near_plane
+
+        # The box on screen in tiles, from the extremes of each side at the nearest and farthest depth
+        bounds = []
+        for axis, scale, size, tiles in ((0, projection[0, 0], self.width, self.tile_counts[0]),
+                                         (1, projection[1, 1], self.height, self.tile_counts[1])):
+            low, high = centers[:, axis] - ranges, centers[:, axis] + ranges
+            low = np.minimum(low / nearest, low / farthest) * scale
+            high = np.maximum(high / nearest, high / farthest) * scale
+            low = np.where(past_near, -1.0, low)
+            high = np.where(past_near, 1.0, high)
+            first = np.floor((low * 0.5 + 0.5) * size / self.tile_size)
+            last = np.floor((high * 0.5 + 0.5) * size / self.tile_size)
+            bounds.append((np.clip(first, 0, tiles - 1), np.clip(last, 0, tiles - 1), (high >= -1.0) & (low <= 1.0)))
+
+        (first_x, last_x, on_x), (first_y, last_y, on_y) = bounds
+        listed = in_front & on_x & on_y & (ranges > 0.0)
+        tile_x, tile_y = np.arange(self.tile_counts[0]), np.arange(self.tile_counts[1])
+        covers_x = (tile_x[:, None] >= first_x) & (tile_x[:, None] <= last_x) & listed
+        covers_y = (tile_y[:, None] >= first_y) & (tile_y[:, None] <= last_y)
+        covers = (covers_y[:, None, :] & covers_x[None, :, :]).reshape(-1, count)
+
+        # The tile headers, then the light indices of every tile in tile order
+        tile_count = len(covers)
+        tiles, entries = np.nonzero(covers)
+        counts = np.bincount(tiles, minlength=tile_count)
+        offsets = 2 * tile_count + np.concatenate(([0], np.cumsum(counts)[:-1]))
+        tile_data = np.concatenate((np.stack((offsets, counts), axis=1).reshape(-1), entries)).astype(np.int32)
+        self.entry_count = len(entries)
+
+        for buffer, data in zip(self.buffers, (lights, tile_data)):
+            glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+            glBufferData(GL_TEXTURE_BUFFER, max(data.nbytes, 16), data if data.nbytes else None, GL_STREAM_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def cleanup(self):
+        """
+        Delete the textures and the buffers.
+        """
+        glDeleteTextures(2, self.textures)
+        glDeleteBuffers(2, self.buffers)
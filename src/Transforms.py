@@ -0,0 +1,71 @@
+import numpy as np
+
+class Transforms:
+    def __init__(self, capacity=16):
+        """
+        Initialize a new Transforms object, the model and normal matrices of a batch of bodies.
+
+        Every body is rotated about the Y axis, scaled and then translated, like the pyrr chain
+        Ry(angle) * S(scale) * T(translation). The matrices are row-major with the translation in the
+        last row, the layout the shaders expect. They are computed for all bodies at once and written
+        into buffers that are reused from frame to frame.
+
+        Args:
+            capacity (int, optional): The number of bodies to allocate the buffers for. They grow as needed. Defaults to 16.
+        """
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        Allocate the output buffers.
+
+        Args:
+            capacity (int): The number of bodies.
+        """
+        self.capacity = capacity
+        self.cos = np.empty(capacity, dtype=np.float32)
+        self.sin = np.empty(capacity, dtype=np.float32)
+        self.column_norms = np.empty((capacity, 3), dtype=np.float32)
+
+        # Entries that are the same for every rotation about Y are set once
+        self.models = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.models[:, 3, 3] = 1.0
+        self.normal_matrices = np.zeros((capacity, 3, 3), dtype=np.float32)
+
+    def compute(self, angles, scales, translations):
+        """
+        Compute the model and normal matrices of a batch of bodies.
+
+        The upper 3x3 of a model matrix is A = R * S, so its inverse transpose has the closed form
+        R * S^-1 = A * S^-2: every column of A divided by its squared length. No general inverse is needed.
+
+        Args:
+            angles (numpy.ndarray): The rotation of each body about the Y axis, in radians, shape (N,).
+            scales (numpy.ndarray): The scale of each body along X, Y and Z, shape (N, 3).
+            translations (numpy.ndarray): The position of each body, shape (N, 3).
+
+        Returns:
+            tuple: The model matrices (N, 4, 4) and normal matrices (N, 3, 3), as views of the output
+                buffers that stay valid until the next call.
+        """
+        count = len(angles)
+        if count > self.capacity:
+            self.allocate(max(count, 2 * self.capacity))
+
+        cos = np.cos(angles, out=self.cos[:count])
+        sin = np.sin(angles, out=self.sin[:count])
+
+        models = self.models[:count]
+        np.multiply(cos, scales[:, 0], out=models[:, 0, 0])
+        np.multiply(sin, scales[:, 2], out=models[:, 0, 2])
+        models[:, 1, 1] = scales[:, 1]
+        np.multiply(sin, scales[:, 0], out=models[:, 2, 0])
+        np.negative(models[:, 2, 0], out=models[:, 2, 0])
+        np.multiply(cos, scales[:, 2], out=models[:, 2, 2])
+        models[:, 3, :3] = translations
+
+        rotation_scale = models[:, :3, :3]
+        column_norms = np.einsum("nij,nij->nj", rotation_scale, rotation_scale, out=self.column_norms[:count])
+        normal_matrices = np.divide(rotation_scale, column_norms[:, None, :], out=self.normal_matrices[:count])
+
+        return models, normal_matrices
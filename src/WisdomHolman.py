@@ -0,0 +1,154 @@
+import numpy as np
+
+class WisdomHolman:
+    # Iteration cap and relative tolerance of the Kepler equation solver
+    KEPLER_ITERATIONS = 30
+    KEPLER_TOLERANCE = 1e-14
+
+    def __init__(self, central=0):
+        """
+        Initialize a new WisdomHolman object, a mixed-variable symplectic integrator.
+
+        The bodies are split into one dominant central body and the bodies orbiting it. In democratic
+        heliocentric coordinates (positions relative to the central body, barycentric velocities) the
+        Hamiltonian separates into three parts that are each solved exactly:
+          - Kepler: every body orbits the central body on its own two-body orbit, advanced analytically,
+          - interaction: the bodies pull on each other, applied as velocity kicks,
+          - jump: the central body moves opposite to the total momentum of the others.
+        The Keplerian motion is solved exactly, so the step is limited by the interactions only and can be
+        a sizable fraction of the shortest orbital period, with a bounded energy error. Close encounters
+        between the orbiting bodies are not treated specially.
+
+        Args:
+            central (int, optional): The index of the central body. Defaults to 0.
+        """
+        self.central = central
+
+    def advance(self, physics, dt, steps):
+        """
+        Advance a simulation by a number of steps. Each step is a kick and jump for half the step,
+        a Kepler drift for the full step, and another jump and kick.
+
+        Args:
+            physics (Physics): The simulation, its state is read and written in barycentric coordinates.
+            dt (float): The time step.
+            steps (int): The number of steps.
+        """
+        masses = physics.masses
+        others = np.arange(physics.count) != self.central
+        central_mass = masses[self.central]
+        other_masses = masses[others]
+        total_mass = masses.sum()
+        mu = physics.G * central_mass
+
+        # To democratic heliocentric coordinates
+        center_of_mass = physics.positions @ masses / total_mass
+        center_velocity = physics.velocities @ masses / total_mass
+        positions = physics.positions[:, others] - physics.positions[:, self.central, None]
+        velocities = physics.velocities[:, others] - center_velocity[:, None]
+        accelerations = physics.accelerations(positions, None, other_masses)
+
+        # The closing kick of a step and the opening kick of the next use the same positions
+        for _ in range(steps):
+            velocities += 0.5 * dt * accelerations
+            positions += (0.5 * dt / central_mass) * (velocities @ other_masses)[:, None]
+            self.kepler_drift(positions, velocities, mu, dt)
+            positions += (0.5 * dt / central_mass) * (velocities @ other_masses)[:, None]
+            physics.accelerations(positions, accelerations, other_masses)
+            velocities += 0.5 * dt * accelerations
+
+        # Back to barycentric coordinates
+        center_of_mass += steps * dt * center_velocity
+        central_position = center_of_mass - positions @ other_masses / total_mass
+        physics.positions[:, self.central] = central_position
+        physics.positions[:, others] = positions + central_position[:, None]
+        physics.velocities[:, self.central] = center_velocity - velocities @ other_masses / central_mass
+        physics.velocities[:, others] = velocities + center_velocity[:, None]
+        physics.time += steps * dt
+
+    @staticmethod
+    def stumpff(z):
+        """
+        Evaluate the Stumpff functions C(z) and S(z) of the universal Kepler equation.
+
+        Args:
+            z (numpy.ndarray): The arguments, alpha * chi^2.
+
+        Returns:
+            tuple: C(z) and S(z).
+        """
+        c = np.empty_like(z)
+        s = np.empty_like(z)
+
+        elliptic = z > 1e-6
+        root = np.sqrt(z[elliptic])
+        c[elliptic] = (1.0 - np.cos(root)) / z[elliptic]
+        s[elliptic] = (root - np.sin(root)) / root ** 3
+
+        hyperbolic = z < -1e-6
+        root = np.sqrt(-z[hyperbolic])
+        c[hyperbolic] = (np.cosh(root) - 1.0) / -z[hyperbolic]
+        s[hyperbolic] = (np.sinh(root) - root) / root ** 3
+
+        # Near-parabolic, from the series expansions
+        parabolic = ~(elliptic | hyperbolic)
+        c[parabolic] = 0.5 - z[parabolic] / 24.0
+        s[parabolic] = 1.0 / 6.0 - z[parabolic] / 120.0
+
+        return c, s
+
+    def kepler_drift(self, positions, velocities, mu, dt):
+        """
+        Advance bodies along their two-body orbits around a fixed center, in place. The universal variable
+        formulation covers elliptic, parabolic and hyperbolic orbits alike; the Kepler equation is solved
+        for all bodies at once with Laguerre-Conway iterations, which converge from a rough first guess.
+
+        Args:
+            positions (numpy.ndarray): The positions relative to the center, shape (3, N).
+            velocities (numpy.ndarray): The velocities, shape (3, N).
+            mu (float): G times the mass of the center.
+            dt (float): The time to advance by.
+        """
+        sqrt_mu = np.sqrt(mu)
+        r0 = np.sqrt(np.einsum("ij,ij->j", positions, positions))
+        rv0 = np.einsum("ij,ij->j", positions, velocities) / sqrt_mu
+        alpha = 2.0 / r0 - np.einsum("ij,ij->j", velocities, velocities) / mu
+
+        # Whole periods of bound orbits change nothing, so only the remainder is solved for
+        dt = np.full(len(r0), dt)
+        bound = alpha > 0.0
+        period = 2.0 * np.pi / (sqrt_mu * alpha[bound] ** 1.5)
+        dt[bound] = np.fmod(dt[bound], period)
+
+        chi = sqrt_mu * dt * np.where(bound, alpha, 1.0 / r0)
+        target = sqrt_mu * dt
+        for _ in range(self.KEPLER_ITERATIONS):
+            z = alpha * chi * chi
+            c, s = self.stumpff(z)
+            chi2 = chi * chi
+            f = rv0 * chi2 * c + (1.0 - alpha * r0) * chi2 * chi * s + r0 * chi - target
+            df = rv0 * chi * (1.0 - z * s) + (1.0 - alpha * r0) * chi2 * c + r0
+            ddf = rv0 * (1.0 - z * c) + (1.0 - alpha * r0) * chi * (1.0 - z * s)
+
+            # Laguerre-Conway step with n = 5
+            root = np.sqrt(np.abs(16.0 * df * df - 20.0 * f * ddf))
+            delta = 5.0 * f / (df + np.copysign(root, df))
+            chi -= delta
+            if np.all(np.abs(delta) <= self.KEPLER_TOLERANCE * np.maximum(np.abs(chi), 1.0)):
+                break
+
+        z = alpha * chi * chi
+        c, s = self.stumpff(z)
+        chi2 = chi * chi
+
+        # Lagrange f and g coefficients
+        f = 1.0 - chi2 / r0 * c
+        g = dt - chi2 * chi / sqrt_mu * s
+        new_positions = f * positions + g * velocities
+        r = np.sqrt(np.einsum("ij,ij->j", new_positions, new_positions))
+        df = sqrt_mu / (r * r0) * (z * chi * s - chi)
+        dg = 1.0 - chi2 / r * c
+
+        velocities *= dg
+        velocities += df * positions
+        positions[:] = new_positions
@@ -0,0 +1,101 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from Physics import Physics
+
+def make_system(count, seed=0):
+    """
+    Build a test system: a sun and count - 1 light bodies on circular orbits at random radii and inclinations.
+
+    Args:
+        count (int): The number of bodies, including the sun.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Physics: The simulation.
+    """
+    rng = np.random.default_rng(seed)
+    physics = Physics()
+    sun_mass = 100.0 * 17.0 ** 3
+    physics.add_body("Sun", sun_mass, (0.0, 0.0, 0.0), (0.0, 0.0, 0.0))
+
+    others = count - 1
+    radius = rng.uniform(9.0, 80.0, others)
+    angle = rng.uniform(0.0, 2.0 * math.pi, others)
+    inclination = rng.normal(0.0, 0.05, others)
+    direction = np.array([np.cos(angle) * np.cos(inclination), np.sin(inclination), np.sin(angle) * np.cos(inclination)])
+    tangent = np.array([-np.sin(angle), np.zeros(others), np.cos(angle)])
+
+    positions = radius * direction
+    velocities = np.sqrt(sun_mass / radius) * tangent
+    masses = sun_mass * 10.0 ** rng.uniform(-8.0, -5.0, others)
+    physics.add_bodies(masses, positions, velocities)
+    physics.center_momentum()
+
+    return physics
+
+def measure(physics, dt, min_time):
+    """
+    Step a simulation until at least min_time seconds have passed.
+
+    Args:
+        physics (Physics): The simulation.
+        dt (float): The time step.
+        min_time (float): The minimum wall clock time to measure over, in seconds.
+
+    Returns:
+        tuple: The number of steps and the elapsed wall clock time in seconds.
+    """
+    physics.step(dt)
+    steps = 0
+    start = time.perf_counter()
+    while steps == 0 or time.perf_counter() - start < min_time:
+        physics.step(dt)
+        steps += 1
+    return steps, time.perf_counter() - start
+
+def force_error(physics):
+    """
+    Compare the accelerations of a simulation's solver with direct summation.
+
+    Args:
+        physics (Physics): The simulation.
+
+    Returns:
+        tuple: The median and 99th percentile of the relative acceleration error.
+    """
+    exact = physics.direct_accelerations()
+    error = np.linalg.norm(physics.accelerations() - exact, axis=0) / np.linalg.norm(exact, axis=0)
+    return np.median(error), np.percentile(error, 99)
+
+def main():
+    """
+    Print the throughput of the gravity engine, in body-steps per second, for a range of body counts.
+    The Barnes-Hut solver is also measured for its accuracy against direct summation.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the N-body gravity engine")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000, 10000], help="the body counts to measure")
+    parser.add_argument("--solvers", nargs="+", default=["direct", "barnes-hut"], choices=Physics.SOLVERS, help="the force solvers to measure")
+    parser.add_argument("--theta", type=float, default=0.5, help="the opening angle of the Barnes-Hut solver")
+    parser.add_argument("--dt", type=float, default=2.5e-4, help="the time step")
+    parser.add_argument("--min-time", type=float, default=1.0, help="the minimum measuring time per count, in seconds")
+    args = parser.parse_args()
+
+    print(f"{'bodies':>8} {'solver':>10} {'steps':>8} {'ms/step':>10} {'body-steps/s':>14} {'energy error':>14} {'force error (median/p99)':>26}")
+    for count in args.counts:
+        for solver in args.solvers:
+            physics = make_system(count)
+            physics.solver = solver
+            physics.tree.theta = args.theta
+
+            median, p99 = force_error(physics) if physics.uses_barnes_hut() else (0.0, 0.0)
+            energy = physics.energy()
+            steps, elapsed = measure(physics, args.dt, args.min_time)
+            error = abs((physics.energy() - energy) / energy)
+            print(f"{count:>8} {solver:>10} {steps:>8} {elapsed / steps * 1000.0:>10.3f} {count * steps / elapsed:>14.3e} {error:>14.2e} {median:>12.2e} / {p99:.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+import argparse
+import os
+import time
 import pygame as pg
-from GLWindow import OpenGLWindow
 
 def handle_keydown_event(event, keys, window):
     """
@@ -27,12 +29,103 @@ def handle_keyup_event(event, keys):
     if event.key in keys:
         keys[event.key] = False
 
+def parse_args():
+    """
+    Parse the command-line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Solar system simulation")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="ignore the cached assets in ./cache and rebuild them from the source files")
+    parser.add_argument("--max-texture-size", type=int, default=0,
+                        help="cap the texture width and height for low-memory deployments, 0 keeps the full resolution")
+    parser.add_argument("--stream-textures", action="store_true",
+                        help="start with placeholder textures and stream the full resolution levels in over the first frames")
+    parser.add_argument("--texture-upload-budget", type=float, default=4.0,
+                        help="the number of MiB of texture data streamed per frame")
+    parser.add_argument("--no-instancing", action="store_true",
+                        help="draw every body with its own uniforms instead of as instances of the sphere")
+    parser.add_argument("--texture-arrays", action="store_true",
+                        help="pack the planet maps into array textures that are bound once per frame")
+    parser.add_argument("--physics", action="store_true",
+                        help="move the planets with an N-body gravity simulation instead of on fixed Kepler orbits")
+    parser.add_argument("--integrator", choices=["verlet", "wisdom-holman"], default="verlet",
+                        help="the integrator of the gravity simulation, wisdom-holman takes much longer steps")
+    parser.add_argument("--time-warp", type=float, default=None,
+                        help="run the animation this many times faster than real time, eg. 1e6")
+    parser.add_argument("--ephemeris", default=None,
+                        help="interpolate the planet positions from an ephemeris table built with src/Ephemeris.py")
+    parser.add_argument("--sim-rate", type=float, default=None,
+                        help="advance the animation on its own thread at this many fixed steps per second, eg. 240")
+    parser.add_argument("--no-lod", action="store_true",
+                        help="draw every body with the full sphere model instead of the level of detail its size on screen needs")
+    parser.add_argument("--gpu-orbits", action="store_true",
+                        help="upload the orbits once and place the bodies in the vertex shader from the animation time")
+    parser.add_argument("--headless", nargs="?", const="egl", choices=["egl", "osmesa"], default=None,
+                        help="render offscreen without a display, through EGL (the default) or OSMesa")
+    parser.add_argument("--frames", type=int, default=600,
+                        help="the number of frames to render when headless")
+    parser.add_argument("--width", type=int, default=800, help="the width of the window or frames")
+    parser.add_argument("--height", type=int, default=600, help="the height of the window or frames")
+    return parser.parse_args()
+
+def run_headless(window, frames):
+    """
+    Render a number of frames offscreen, as fast as they can be drawn and read back.
+
+    Args:
+        window (OpenGLWindow): The headless OpenGL window.
+        frames (int): The number of frames to render.
+
+    Returns:
+        int: The number of frames read back.
+    """
+    read_back = 0
+    triangles = 0
+    drawn = 0
+    culled = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        if window.render() is not None:
+            read_back += 1
+        triangles += window.triangle_count
+        drawn += window.drawn_count
+        culled += window.culled_count
+    read_back += len(window.context.flush())
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {read_back} frames in {elapsed:.2f} s ({read_back / elapsed:.1f} frames per second), "
+          f"{triangles / max(frames, 1):.0f} triangles per frame, "
+          f"{drawn / max(frames, 1):.1f} bodies drawn and {culled / max(frames, 1):.1f} culled per frame")
+    return read_back
+
 def main():
     """
     The main function to run the solar system simulation.
     """
-    window = OpenGLWindow()
-    window.initGL()
+    args = parse_args()
+
+    # PyOpenGL picks its platform when it is first imported, so a headless backend has to be chosen before that
+    if args.headless is not None:
+        os.environ["PYOPENGL_PLATFORM"] = args.headless
+        if args.headless == "egl":
+            os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+    from GLWindow import OpenGLWindow
+
+    window = OpenGLWindow(rebuild_cache=args.rebuild_cache, max_texture_size=args.max_texture_size,
+                          stream_textures=args.stream_textures,
+                          texture_upload_budget=int(args.texture_upload_budget * (1 << 20)),
+                          instancing=not args.no_instancing, texture_arrays=args.texture_arrays,
+                          physics=args.physics, integrator=args.integrator, time_warp=args.time_warp,
+                          ephemeris=args.ephemeris, sim_rate=args.sim_rate, headless=args.headless,
+                          lod=not args.no_lod, gpu_orbits=args.gpu_orbits)
+    window.initGL(args.width, args.height)
+
+    if args.headless is not None:
+        run_headless(window, args.frames)
+        window.cleanup()
+        return
 
     # Dictionary to map keys to their state
     keys = {